@@ -1,26 +1,29 @@
+import argparse
 import asyncio
-from bleak import BleakClient, BleakScanner
+import os
+import sys
+from bleak import BleakScanner
 from Crypto.Cipher import AES
 import base64
 
+# The framed notification reader is shared with verifier.py at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ble_framing import FrameReader, aes_packet_trailer
+from transport import BleTransport, SerialTransport, characteristic_uuid, default_baudrate, forward_notifications
+
 # Target Device Name
 target_name = "MeuNovoNome"
-characteristic_uuid = "0000ffe1-0000-1000-8000-00805f9b34fb"  # UUID of the BLE module characteristic
 
-class MyDelegate:
+class MyDelegate(FrameReader):
     def __init__(self):
-        self.notification_data = b""
+        super().__init__()
         self.hmac = None 
         self.message = None
         
-    # Function to handle BLE notifications
+    # Function to handle BLE notifications: only buffers the chunk, the packet
+    # is decoded and printed once it is complete
     def handle_notification(self, characteristic, data):
-        self.notification_data += data
-        print(f"Notification received: {data}")
-        if data.decode('utf-8', errors='ignore'):
-            print(f"Notification as string: {data.decode('utf-8', errors='ignore')}")
-        else:
-            print("Notification as string is empty")
+        self.feed(data)
 
 # Asynchronous function to scan for available devices and connect to the desired device  
 async def scan_for_device(name):
@@ -31,30 +34,36 @@ async def scan_for_device(name):
             return device.address
     return None
 
-async def main():
-    device_address = await scan_for_device(target_name)
-    if not device_address:
-        print("Device not found")
-        return
+# serial_port: port of a prover wired to the gateway, instead of a BLE device
+async def main(serial_port=None, baudrate=default_baudrate):
+    if serial_port:
+        device_address = serial_port
+        transport = SerialTransport(serial_port, baudrate)
+    else:
+        device_address = await scan_for_device(target_name)
+        if not device_address:
+            print("Device not found")
+            return
+        transport = BleTransport(device_address)
 
     try:
-        async with BleakClient(device_address) as client:
+        async with transport:
             print(f"Conecting to the device {device_address}...")
 
             delegate = MyDelegate()
 
-            async def notification_handler(characteristic, data):
-                delegate.handle_notification(characteristic, data)
-
-            await client.start_notify(characteristic_uuid, notification_handler)
+            # Deliver everything the prover sends to the delegate
+            forwarder = asyncio.create_task(forward_notifications(transport, delegate.handle_notification))
 
-            print(f"Notifications enabled for the characteristic: {characteristic_uuid}")
+            if not serial_port:
+                print(f"Notifications enabled for the characteristic: {characteristic_uuid}")
 
-            # Wait until all notifications are received. Must receive both the hash and the message
-            await asyncio.sleep(6.0)
+            # Wait until the whole packet is received. Must receive both the hash and the message
+            received_data = await delegate.wait_for_frame(aes_packet_trailer, timeout=6.0)
+            if received_data is None:
+                print(f"Incomplete data received: {delegate.notification_data}")
 
             # Process the received data
-            received_data = delegate.notification_data
             if received_data:
                 received_str = received_data
                 cipher_time = received_str[:5].decode('utf-8', errors='ignore')
@@ -100,10 +109,16 @@ async def main():
                 else:
                     print("Dispositivos não autenticados")
 
-            await client.stop_notify(characteristic_uuid)
+            forwarder.cancel()
 
     except Exception as e:
         print(f"Error connecting or communicating with the device: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="AES verifier for the BLE provers")
+    parser.add_argument("--serial", metavar="PORT",
+                        help="read the packet from a prover wired to this serial port instead of BLE")
+    parser.add_argument("--baudrate", type=int, default=default_baudrate,
+                        help="baud rate of the serial port")
+    args = parser.parse_args()
+    asyncio.run(main(args.serial, args.baudrate))
@@ -0,0 +1,204 @@
+# Connectionless authentication: enrolled provers broadcast a proof in the
+# manufacturer data of their BLE advertisements and the gateway verifies it from
+# the scanner callbacks, without connecting. A prover is enrolled once over a
+# connection (device_registry.py) and afterwards only advertises, so a gateway
+# is no longer limited by the few connections of its adapter.
+#
+# Manufacturer data of company manufacturer_id (71 bytes):
+#   version (1) | device ID (1) | counter (4, big-endian) | R (33, SEC1 compressed) | response (32)
+# It does not fit in a legacy advertisement (31 bytes in all), so the prover
+# needs extended advertising (Bluetooth 5). The challenge hashes the counter
+# after the coordinates, as bytes (as with capability H):
+#   σ = SHA-256(G_x || Qd_x || R_x || counter)
+# so a captured advertisement cannot be replayed under a newer counter.
+#
+# The prover repeats an advertisement until its next proof, so the scanner sees
+# each one many times: repeats are dropped by an exact set of recent payloads
+# before anything else, and a proof is only accepted if its counter is newer
+# than the last one accepted from the device.
+from collections import Counter, OrderedDict, namedtuple
+import asyncio
+import time
+import ec_jacobian
+from batch_verify import Proof
+from challenge import challenge_from_midstate, hash_mode_binary, initial_midstate
+from device_registry import DeviceRegistry
+from packet_validation import (reject_framing, reject_length, reject_unknown_device, reject_response_range,
+                               reject_off_curve)
+from verification import reject_invalid_proof
+from verify_pool import verify_proof_in_worker
+
+# Bluetooth SIG company identifier of the manufacturer data (0xFFFF is reserved
+# for tests and internal use)
+manufacturer_id = 0xFFFF
+
+# First byte of the manufacturer data
+advertisement_version = 1
+
+# Size of the manufacturer data and of its counter
+advertisement_size = 71
+counter_size = 4
+
+# Reasons an advertised proof is rejected, besides those of packet_validation
+reject_stale = "stale"  # counter not newer than the last accepted one of the device
+reject_busy = "busy"    # too many proofs waiting for the verification pool
+advertisement_rejections = (reject_framing, reject_length, reject_unknown_device, reject_stale,
+                            reject_response_range, reject_off_curve, reject_busy, reject_invalid_proof)
+
+# Recent payloads remembered to drop repeated advertisements
+default_seen_size = 65536
+
+# Proofs submitted to the verification pool and not verified yet
+default_max_in_flight = 1024
+
+# Enrolled prover as seen by the advertisement verifier: its ID, its public key
+# (x, y) and the SHA-256 midstate of G_x || Qd_x in binary mode
+AdvertisingDevice = namedtuple("AdvertisingDevice", ["device_id", "public_key", "midstate"])
+
+
+# Manufacturer data of a proof; commitment is the 33-byte compressed R
+def encode_advertisement(device_id, counter, commitment, response):
+    return (bytes([advertisement_version, device_id]) + counter.to_bytes(counter_size, "big")
+            + bytes(commitment) + response.to_bytes(32, "big"))
+
+
+# Challenge of an advertised proof: the counter is hashed after R_x
+def advertisement_challenge(midstate, commitment_x, counter):
+    return challenge_from_midstate(midstate, commitment_x, hash_mode_binary, counter.to_bytes(counter_size, "big"))
+
+
+# Verifies the advertised proofs of the provers of registry. With a
+# verify_pool.VerificationPool the curve math runs in its workers; without one
+# it runs in the calling process. detection_callback is the callback of a
+# BleakScanner (or of prover_emulator.AdvertisementFeed).
+class AdvertisementVerifier:
+    def __init__(self, registry, pool=None, seen_size=default_seen_size, max_in_flight=default_max_in_flight):
+        self.registry = registry
+        self.pool = pool
+        self.seen_size = seen_size
+        self.max_in_flight = max_in_flight
+        self._seen = OrderedDict()
+        self._devices = {}      # Address -> (record, AdvertisingDevice)
+        self.counters = {}      # Address -> counter of the last accepted proof
+        self.authenticated = Counter()  # Address -> proofs accepted
+        self.last_authenticated = {}    # Address -> time.time() of the last accepted proof
+        self.rejections = Counter()
+        self.duplicates = 0
+        self.accepted = 0
+        self.in_flight = 0
+        self._tasks = set()
+
+    def reject(self, reason):
+        self.rejections[reason] += 1
+        return None
+
+    # The enrolled prover of an address, built from its registry record on first use
+    def _device(self, address):
+        record = self.registry.get(address)
+        if record is None:
+            return None
+        cached = self._devices.get(address)
+        if cached is not None and cached[0] is record:
+            return cached[1]
+        public_key = DeviceRegistry.public_key(record)
+        device = AdvertisingDevice(record["device_id"], public_key, initial_midstate(public_key[0], hash_mode_binary))
+        self._devices[address] = (record, device)
+        self.counters.setdefault(address, record.get("advertisement_counter", -1))
+        return device
+
+    # Checks of an advertisement, cheapest first. Returns (device, counter,
+    # Proof), or None when it is rejected.
+    def screen(self, address, data):
+        if len(data) != advertisement_size:
+            return self.reject(reject_length)
+        if data[0] != advertisement_version:
+            return self.reject(reject_framing)
+        device = self._device(address)
+        if device is None or data[1] != device.device_id:
+            return self.reject(reject_unknown_device)
+        counter = int.from_bytes(data[2:6], "big")
+        if counter <= self.counters[address]:
+            return self.reject(reject_stale)
+        response = int.from_bytes(data[39:71], "big")
+        if not 0 < response < ec_jacobian.n:
+            return self.reject(reject_response_range)
+        commitment = ec_jacobian.decompress(bytes(data[6:39]))
+        if commitment is None:
+            return self.reject(reject_off_curve)
+
+        challenge = advertisement_challenge(device.midstate, bytes(data[7:39]), counter)
+        return device, counter, Proof(commitment, response, challenge, device.public_key)
+
+    # Handles the manufacturer data of one advertisement. Without a pool the
+    # result (True / False, None if screened out) is returned; with a pool the
+    # verification is scheduled and its task returned. The one-byte device ID
+    # is not unique among thousands of provers, so the key tables of the workers
+    # are looked up by public key instead.
+    def receive(self, address, data):
+        seen_key = (address, bytes(data))
+        if seen_key in self._seen:
+            self.duplicates += 1
+            return None
+        # A proof turned away while the pool is behind is not remembered, so the
+        # next repeat of the advertisement brings it back
+        if self.pool is not None and self.in_flight >= self.max_in_flight:
+            return self.reject(reject_busy)
+        self._seen[seen_key] = None
+        if len(self._seen) > self.seen_size:
+            self._seen.popitem(last=False)
+
+        screened = self.screen(address, data)
+        if screened is None:
+            return None
+        device, counter, proof = screened
+        if self.pool is None:
+            return self._record(address, counter, verify_proof_in_worker(proof))
+        self.in_flight += 1
+        task = asyncio.ensure_future(self._verify_in_pool(address, counter, proof))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _verify_in_pool(self, address, counter, proof):
+        try:
+            ok = await self.pool.verify(address, proof)
+        finally:
+            self.in_flight -= 1
+        return self._record(address, counter, ok)
+
+    def _record(self, address, counter, ok):
+        if not ok:
+            self.reject(reject_invalid_proof)
+            return False
+        if counter > self.counters[address]:
+            self.counters[address] = counter
+        self.accepted += 1
+        self.authenticated[address] += 1
+        self.last_authenticated[address] = time.time()
+        return True
+
+    # Same signature as the detection_callback of BleakScanner
+    def detection_callback(self, device, advertisement_data):
+        data = advertisement_data.manufacturer_data.get(manufacturer_id)
+        if data is not None:
+            self.receive(device.address, data)
+
+    # Waits for the proofs still in the pool
+    async def drain(self):
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    # Keeps the last accepted counters in the registry, so proofs advertised
+    # before a restart of the gateway are still stale after it
+    def save_counters(self):
+        for address, counter in self.counters.items():
+            if counter >= 0:
+                self.registry.update(address, advertisement_counter=counter)
+        self.registry.save()
+
+    # Counters of the verifier, used for reporting
+    def stats(self):
+        stats = {reason: self.rejections[reason] for reason in advertisement_rejections}
+        stats.update(accepted=self.accepted, duplicates=self.duplicates, devices=len(self.authenticated),
+                     in_flight=self.in_flight)
+        return stats
@@ -0,0 +1,91 @@
+# Batch verification of NIZKP proofs.
+#
+# A proof is valid when πG = R + σQd (R is the commitment, π the response, σ the
+# challenge hash and Qd the prover's key). For N proofs and random 128-bit
+# coefficients a_i, the batch is accepted when
+#
+#     (sum a_i π_i) G - sum a_i R_i - sum (a_i σ_i) Qd_i = O
+#
+# which costs one fixed-base multiplication plus one multi-scalar multiplication
+# over the commitments and keys, instead of 2N full multiplications. A forged
+# proof makes the sum non-zero except with probability about 2^-128. When a
+# batch fails it is split in halves to find the bad proofs.
+import secrets
+from collections import namedtuple
+import ec_jacobian
+from ec_msm import msm
+from fixed_base import fixed_base_multiply
+
+# commitment and public_key are affine (x, y) pairs; response and challenge are ints
+Proof = namedtuple("Proof", ["commitment", "response", "challenge", "public_key"])
+
+# Size of the random coefficients of the linear combination
+coefficient_bits = 128
+
+# Batches up to this size are checked one proof at a time while bisecting
+single_check_size = 2
+
+
+# Checks the points and the response of a proof without any scalar multiplication
+def is_well_formed(proof):
+    return (0 < proof.response < ec_jacobian.n
+            and ec_jacobian.is_on_curve(*proof.commitment)
+            and ec_jacobian.is_on_curve(*proof.public_key))
+
+
+# Verifies a single proof: πG - σQd must be the commitment
+def verify_single(proof):
+    if not is_well_formed(proof):
+        return False
+    P = msm([proof.response, -proof.challenge], [(ec_jacobian.Gx, ec_jacobian.Gy), proof.public_key])
+    return ec_jacobian.to_affine(P) == tuple(proof.commitment)
+
+
+# Checks the random linear combination of a group of well-formed proofs
+def _combination_holds(proofs):
+    g_scalar = 0
+    key_scalars = {}
+    scalars = []
+    points = []
+    for proof in proofs:
+        a = secrets.randbits(coefficient_bits) | 1
+        g_scalar += a * proof.response
+        scalars.append(-a)
+        points.append(tuple(proof.commitment))
+        # Proofs of the same device share a single term for their key
+        key = tuple(proof.public_key)
+        key_scalars[key] = key_scalars.get(key, 0) + a * proof.challenge
+
+    for key, scalar in key_scalars.items():
+        scalars.append(-scalar)
+        points.append(key)
+
+    total = ec_jacobian.add(fixed_base_multiply(g_scalar), msm(scalars, points))
+    return ec_jacobian.is_infinity(total)
+
+
+# Fills results[i] for the proofs at the given indexes, bisecting failed groups
+def _verify_group(proofs, indexes, results):
+    if len(indexes) <= single_check_size:
+        for i in indexes:
+            results[i] = verify_single(proofs[i])
+        return
+
+    if _combination_holds([proofs[i] for i in indexes]):
+        for i in indexes:
+            results[i] = True
+        return
+
+    half = len(indexes) // 2
+    _verify_group(proofs, indexes[:half], results)
+    _verify_group(proofs, indexes[half:], results)
+
+
+# Verifies many proofs together. Returns one boolean per proof, in order.
+def verify_batch(proofs):
+    results = [False] * len(proofs)
+
+    # Malformed proofs are rejected up front so they never spoil a batch
+    candidates = [i for i, proof in enumerate(proofs) if is_well_formed(proof)]
+    _verify_group(proofs, candidates, results)
+    return results
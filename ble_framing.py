@@ -0,0 +1,274 @@
+import asyncio
+import binascii
+import re
+from collections import namedtuple
+
+# Every sketch in this repository terminates its packets with ';'
+frame_delimiter = b';'
+
+# Trailers that follow the delimiter, one per kind of frame.
+# send() always ends with println(';'), so the shortest trailer is the line end.
+line_trailer = rb'\r\n'
+# nizkp_algorithm.ino: build_pac() prints the packet time with println(total, 3)
+nizkp_packet_trailer = rb'\r\n\d+\.\d{3}\r\n'
+# hmac_algorithm_final.ino: build_pac() prints the packet time with print(total)
+hmac_packet_trailer = rb'\r\n\d+\.\d{2}'
+# aes_algorithm.ino: build_pac() prints the packet time with dtostrf(total, 6, 6)
+aes_packet_trailer = rb'\r\n\s*\d+\.\d{6}'
+
+
+# Protocol v2 (binary), negotiated with "R2": the device answers "RAV2;" or "R1V2;"
+# and then sends the key, the proof packet and its time as binary frames:
+#   SOF (0xA5) | version (2) | type | length (2 bytes, big-endian) | payload | CRC16
+# The CRC16 is CRC-CCITT/XMODEM (_crc_xmodem_update on the AVR) over version,
+# type, length and payload, big-endian. Devices that do not answer V2 keep
+# sending ASCII hex (protocol 1).
+# Optional features are offered as letters after the version ("R2C") and the
+# device confirms the ones it uses after its version ("RAV2C;").
+frame_sof = 0xA5
+protocol_v1 = 1
+protocol_v2 = 2
+# Capability: public key and commitment as SEC1 compressed points (33 bytes)
+capability_compressed = 'C'
+# Capability: I carries the fingerprint of the verifier key ("I10F<16 hex>") and
+# the prover answers after its key whether it already stores it ("RF1;" / "RF0;"),
+# so K is only sent when the key changed
+capability_identity = 'F'
+# Capability: the challenge hashes the 32 bytes of each coordinate instead of
+# their 64 hex digits (opt-in, not offered by default)
+capability_binary_challenge = 'H'
+# Capability: the prover answers K with "RS1;" once the verifier key is stored,
+# so the verifier knows when the next command can be sent instead of pausing
+capability_key_ack = 'A'
+# Capabilities offered by default
+default_capabilities = capability_compressed + capability_identity + capability_key_ack
+registration_answer = re.compile(rb'V(\d)([A-Z]*);')
+frame_header_size = 5
+frame_crc_size = 2
+# First two bytes of every protocol v2 frame
+binary_frame_start = bytes([frame_sof, protocol_v2])
+# Frame types
+frame_public_key = ord('K')  # 64-byte public key, answer to I
+frame_proof = ord('P')       # 113-byte proof packet, answer to D
+frame_time = ord('T')        # time to build and send the proof packet, in ms (4 bytes)
+
+# Returns the protocol and the capabilities confirmed in the answer to R;
+# devices that do not negotiate answer without them (protocol 1, none)
+def parse_registration_answer(frame):
+    match = registration_answer.search(frame or b"")
+    if match is None:
+        return protocol_v1, ""
+    return int(match.group(1)), match.group(2).decode()
+
+
+# Frame of protocol v2: payload is a memoryview of the received data; preamble
+# is whatever text arrived before the frame (e.g. the key generation time)
+BinaryFrame = namedtuple("BinaryFrame", ["type", "payload", "preamble"])
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0)
+
+
+# Builds a protocol v2 frame
+def encode_frame(frame_type, payload):
+    body = bytes([protocol_v2, frame_type]) + len(payload).to_bytes(2, "big") + bytes(payload)
+    return bytes([frame_sof]) + body + crc16(body).to_bytes(2, "big")
+
+
+# Largest amount of pending data kept by a FrameReader. The longest frame of the
+# sketches (the NIZKP packet with its trailer) is under 256 bytes, so this only
+# fills up when a delimiter never arrives.
+default_max_buffer = 4096
+
+# What FrameReader.feed does when the buffer is full:
+# drop the oldest data and keep receiving (the next complete frame still parses)
+overflow_drop_oldest = "drop_oldest"
+# keep the oldest data and drop what arrives until a frame is consumed or reset()
+overflow_drop_newest = "drop_newest"
+
+
+# Class that accumulates the BLE notifications and wakes up whoever is waiting
+# for a frame as soon as the delimiter and its trailer have been received.
+# Chunks are appended to one bytearray and scanned only once for the delimiter;
+# a complete frame is handed over as the bytearray itself, without copying it.
+class FrameReader:
+    def __init__(self, max_buffer=default_max_buffer, overflow=overflow_drop_oldest):
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.dropped_bytes = 0  # Bytes lost to overflows
+        self.crc_errors = 0     # Protocol v2 frames discarded because of their CRC
+        self.skipped_frames = 0  # Complete answers discarded because nobody expected them
+        self._buffer = bytearray()
+        self._scanned = 0            # The delimiter is not in _buffer[:_scanned]
+        self._delimiter_pos = None   # Position of the first delimiter, once found
+        self._arrived = asyncio.Event()
+
+    # Pending data, for diagnostics (a copy); assigning to it replaces the buffer
+    @property
+    def notification_data(self):
+        return bytes(self._buffer)
+
+    @notification_data.setter
+    def notification_data(self, data):
+        self.reset()
+        self.feed(data)
+
+    # Function called from the notification callback with every chunk
+    def feed(self, data):
+        free = self.max_buffer - len(self._buffer)
+        if len(data) > free:
+            if self.overflow == overflow_drop_newest:
+                self.dropped_bytes += len(data) - free
+                data = memoryview(data)[:free]
+            else:
+                excess = min(len(data) - free, len(self._buffer))
+                self._discard(excess)
+                self.dropped_bytes += excess
+                if len(data) > self.max_buffer:
+                    self.dropped_bytes += len(data) - self.max_buffer
+                    data = memoryview(data)[-self.max_buffer:]
+        if data:
+            self._buffer += data
+            self._arrived.set()
+
+    # Discard everything received so far
+    def reset(self):
+        self._buffer = bytearray()
+        self._scanned = 0
+        self._delimiter_pos = None
+        self._arrived.clear()
+
+    # Removes the first count bytes of the buffer
+    def _discard(self, count):
+        del self._buffer[:count]
+        self._scanned = max(0, self._scanned - count)
+        if self._delimiter_pos is not None:
+            self._delimiter_pos -= count
+            if self._delimiter_pos < 0:
+                self._delimiter_pos = None
+                self._scanned = 0
+
+    # Returns the end position of the first complete frame, or None
+    def find_frame_end(self, trailer=line_trailer):
+        if self._delimiter_pos is None:
+            # Only the bytes received since the last call are searched
+            delimiter_pos = self._buffer.find(frame_delimiter, self._scanned)
+            if delimiter_pos == -1:
+                self._scanned = max(0, len(self._buffer) - len(frame_delimiter) + 1)
+                return None
+            self._delimiter_pos = delimiter_pos
+        frame_end = self._delimiter_pos + len(frame_delimiter)
+        # Compiled patterns match in place, without slicing the buffer
+        match = re.compile(trailer).match(self._buffer, frame_end)
+        if match is None:
+            return None
+        return match.end()
+
+    # Takes the first frame_end bytes out of the buffer. The frame keeps the
+    # storage of the buffer; only the (usually empty) rest is copied.
+    def _take_frame(self, frame_end):
+        frame = self._buffer
+        self._buffer = frame[frame_end:]
+        del frame[frame_end:]
+        self._scanned = 0
+        self._delimiter_pos = None
+        return frame
+
+    # Calls scan() until it returns something other than None, waiting for new
+    # data between calls. Returns None when the deadline expires first.
+    async def _poll(self, scan, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            result = scan()
+            if result is not None:
+                return result
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    # Takes the first complete frame out of the buffer, or returns None
+    def _next_frame(self, trailer):
+        frame_end = self.find_frame_end(trailer)
+        if frame_end is None:
+            return None
+        return self._take_frame(frame_end)
+
+    # Waits until a complete frame has been received or the deadline expires.
+    # The frame (everything received up to the end of its trailer) is removed
+    # from the buffer and returned as a bytearray; on timeout None is returned
+    # and the partial data is kept in the buffer.
+    async def wait_for_frame(self, trailer=line_trailer, timeout=10.0):
+        return await self._poll(lambda: self._next_frame(trailer), timeout)
+
+    # Takes the first frame whose content matches pattern out of the buffer,
+    # discarding the complete frames before it; None if it has not arrived. A
+    # protocol v2 frame left at the head of the buffer is discarded as well: its
+    # payload may hold a ';' with no trailer after it, which would stop the scan.
+    def _next_answer(self, pattern, trailer):
+        while True:
+            if self._buffer.startswith(binary_frame_start):
+                found = self.find_binary_frame()
+                if found is not None and found[0] == 0:
+                    self._take_frame(found[1])
+                    self.skipped_frames += 1
+                    continue
+            line_end = self.find_frame_end(line_trailer)
+            if line_end is None:
+                return None
+            if pattern.search(self._buffer, 0, self._delimiter_pos + len(frame_delimiter)) is not None:
+                return self._next_frame(trailer)
+            self._take_frame(line_end)
+            self.skipped_frames += 1
+
+    # Same as wait_for_frame, for the first frame whose content (up to its
+    # delimiter) matches pattern, a compiled regular expression. Complete frames
+    # before it that do not match are discarded and counted in skipped_frames.
+    async def wait_for_answer(self, pattern, trailer=line_trailer, timeout=10.0):
+        return await self._poll(lambda: self._next_answer(pattern, trailer), timeout)
+
+    # Returns (start, end) of the first valid protocol v2 frame, or None.
+    # Start bytes whose frame fails the CRC are skipped.
+    def find_binary_frame(self):
+        sof = binary_frame_start
+        start = self._buffer.find(sof)
+        while start != -1:
+            if len(self._buffer) - start < frame_header_size:
+                return None
+            length = int.from_bytes(self._buffer[start + 3:start + 5], "big")
+            end = start + frame_header_size + length + frame_crc_size
+            if frame_header_size + length + frame_crc_size > self.max_buffer:
+                start = self._buffer.find(sof, start + 1)
+                continue
+            if len(self._buffer) < end:
+                return None
+            with memoryview(self._buffer) as view:
+                crc = crc16(view[start + 1:end - frame_crc_size])
+            if crc == int.from_bytes(self._buffer[end - frame_crc_size:end], "big"):
+                return start, end
+            self.crc_errors += 1
+            start = self._buffer.find(sof, start + 1)
+        return None
+
+    # Takes the first valid protocol v2 frame out of the buffer, or returns None
+    def _next_binary_frame(self):
+        found = self.find_binary_frame()
+        if found is None:
+            return None
+        start, end = found
+        frame = self._take_frame(end)
+        payload = memoryview(frame)[start + frame_header_size:end - frame_crc_size]
+        return BinaryFrame(frame[start + 2], payload, bytes(frame[:start]))
+
+    # Same as wait_for_frame, for a protocol v2 frame. Returns a BinaryFrame
+    # whose payload is a view of the received data, or None on timeout.
+    async def wait_for_binary_frame(self, timeout=10.0):
+        return await self._poll(self._next_binary_frame, timeout)
@@ -0,0 +1,85 @@
+# Fiat-Shamir challenge σ = SHA-256(G_x || Qd_x || R_x) of the NIZKP. G_x and Qd_x
+# are the same for every proof of a device, so the hash state after them (the
+# midstate) is kept per device and copied for each proof: only R_x is hashed.
+from collections import OrderedDict
+import hashlib
+from ec_jacobian import Gx
+
+# What is hashed. "hex": the uppercase hex digits of the three coordinates
+# (192 bytes), as calc_challenge() in the sketch has always done. "binary": the
+# 32 big-endian bytes of each coordinate (96 bytes), negotiated with capability H.
+hash_mode_hex = "hex"
+hash_mode_binary = "binary"
+
+# Devices whose midstate is kept
+default_max_devices = 1024
+
+
+def encode_coordinate(value, mode):
+    if mode == hash_mode_binary:
+        return value.to_bytes(32, "big")
+    return f"{value:064X}".encode()
+
+
+# SHA-256 state after G_x || Qd_x
+def initial_midstate(public_key_x, mode=hash_mode_hex):
+    return hashlib.sha256(encode_coordinate(Gx, mode) + encode_coordinate(public_key_x, mode))
+
+
+# Challenge as an integer from the midstate of a device; commitment_x is the x
+# coordinate of R as an integer or as its 32 big-endian bytes. suffix is hashed
+# after R_x (the counter of an advertised proof, advertisement.py).
+def challenge_from_midstate(midstate, commitment_x, mode=hash_mode_hex, suffix=b""):
+    if isinstance(commitment_x, int):
+        commitment_x = encode_coordinate(commitment_x, mode)
+    elif mode != hash_mode_binary:
+        commitment_x = commitment_x.hex().upper().encode()
+    hasher = midstate.copy()
+    hasher.update(commitment_x)
+    if suffix:
+        hasher.update(suffix)
+    return int.from_bytes(hasher.digest(), "big")
+
+
+class ChallengeEngine:
+    def __init__(self, max_devices=default_max_devices):
+        self.max_devices = max_devices
+        self._midstates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Hash state after G_x || Qd_x, built on first use for each key and mode
+    def midstate(self, public_key_x, mode=hash_mode_hex):
+        key = (public_key_x, mode)
+        state = self._midstates.get(key)
+        if state is not None:
+            self._midstates.move_to_end(key)
+            self.hits += 1
+            return state
+
+        self.misses += 1
+        state = initial_midstate(public_key_x, mode)
+        self._midstates[key] = state
+        if len(self._midstates) > self.max_devices:
+            self._midstates.popitem(last=False)
+        return state
+
+    # Challenge of a proof as an integer; commitment_x is the x coordinate of R
+    # as an integer or as its 32 big-endian bytes. The cached midstate is looked
+    # up inline: per proof only R_x is hashed (hex: 2 SHA-256 blocks instead of 4).
+    def challenge(self, public_key_x, commitment_x, mode=hash_mode_hex):
+        key = (public_key_x, mode)
+        state = self._midstates.get(key)
+        if state is None:
+            state = self.midstate(public_key_x, mode)
+        else:
+            self._midstates.move_to_end(key)
+            self.hits += 1
+        return challenge_from_midstate(state, commitment_x, mode)
+
+    def __len__(self):
+        return len(self._midstates)
+
+    # Counters of the engine, used for reporting
+    def stats(self):
+        return {"devices": len(self._midstates), "hits": self.hits, "misses": self.misses}
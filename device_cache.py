@@ -0,0 +1,119 @@
+from collections import OrderedDict
+import sys
+from functools import lru_cache
+import ec_jacobian
+from ec_msm import WnafTable
+
+# Width of the wNAF representation used for the prover key Qd. The table holds
+# the 2^(window_bits - 2) odd multiples Qd, 3Qd, 5Qd, ... and their negations.
+window_bits = 6
+
+# Default memory cap of the cache, in bytes
+default_cache_bytes = 4 * 1024 * 1024
+
+
+
+# Checks that (x, y) is a valid affine point of the curve
+def is_valid_public_key(x, y):
+    if x is None or y is None:
+        return False
+    return ec_jacobian.is_on_curve(x, y)
+
+
+# Public key of a prover that sends it compressed (33 bytes). Devices send the
+# same key on every enrollment, so the square root is computed once per key.
+@lru_cache(maxsize=1024)
+def decompress_public_key(data):
+    return ec_jacobian.decompress(data)
+
+
+# Builds every table a verification may use for a device: the odd multiples
+# of Qd and φ(Qd) and of their negations (ec_msm.glv_split)
+def build_tables(entry):
+    endomorphism = entry.endomorphism()
+    return [entry, entry.negated(), endomorphism, endomorphism.negated()]
+
+
+# Memory taken by the fully built tables of a device: the point lists, their
+# tuples and the coordinates, each object counted once (tables share some)
+def table_size(entry):
+    seen = set()
+    size = 0
+    for table in build_tables(entry):
+        for points in (table.positive, table.negative):
+            if id(points) in seen:
+                continue
+            seen.add(id(points))
+            size += sys.getsizeof(points)
+            for point in points:
+                size += sys.getsizeof(point)
+                for coordinate in point:
+                    if id(coordinate) not in seen:
+                        seen.add(id(coordinate))
+                        size += sys.getsizeof(coordinate)
+    return size
+
+
+# Bounded LRU cache of validated prover keys Qd and their WnafTable, keyed by
+# device ID (or by the public key itself when the ID is not known)
+class DeviceTableCache:
+    def __init__(self, max_bytes=default_cache_bytes, window_bits=window_bits):
+        self.max_bytes = max_bytes
+        self.window_bits = window_bits
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the table of the key (x, y), building it on a miss. Returns None if
+    # the key is not a valid point of the curve.
+    def get(self, x, y, device_id=None):
+        key = device_id if device_id is not None else (x, y)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.x == x and entry.y == y:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if entry is not None:
+            # The device was enrolled again with a new key
+            self._remove(key)
+
+        if not is_valid_public_key(x, y):
+            return None
+
+        entry = WnafTable(x, y, self.window_bits)
+        self._entries[key] = entry
+        self.current_bytes += table_size(entry)
+
+        # Evict the least recently used devices, always keeping the new entry
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    # Removes the entry of a device, e.g. when it is enrolled again
+    def invalidate(self, key):
+        if key in self._entries:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.current_bytes -= table_size(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Counters of the cache, used for reporting
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
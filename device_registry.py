@@ -0,0 +1,96 @@
+import json
+import os
+import time
+
+# File where the enrolled provers are kept between runs
+registry_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "device_registry.json")
+
+# Version of the file format
+registry_version = 1
+
+# IDs are sent to the prover as two decimal digits (I00 .. I99)
+device_id_count = 100
+
+
+# Durable record of the enrolled provers, keyed by address (BLE address or serial
+# port): the ID given with I, the public key received in the answer and the wire
+# format negotiated with R. A known prover can go straight to D.
+# With path=None the registry only lives in memory (e.g. for emulated provers).
+class DeviceRegistry:
+    def __init__(self, path=registry_path):
+        self.path = path
+        self.devices = {}
+        if path is not None:
+            self.load()
+
+    # Reads the file; a missing or unreadable file is an empty registry
+    def load(self):
+        try:
+            with open(self.path, "r") as registry_file:
+                data = json.load(registry_file)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == registry_version:
+            self.devices = data.get("devices", {})
+
+    # Writes the file. The temporary file keeps a half-written registry from
+    # replacing the previous one.
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as registry_file:
+            json.dump({"version": registry_version, "devices": self.devices}, registry_file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # Record of a prover, or None if it was never enrolled
+    def get(self, address):
+        return self.devices.get(address)
+
+    # Records a prover after a successful enrollment. verifier_key is the
+    # fingerprint of the verifier key the prover stores.
+    def enroll(self, address, device_id, public_key, protocol, capabilities, verifier_key=None):
+        self.devices[address] = {
+            "device_id": device_id,
+            "public_key": f"{public_key[0]:064X}{public_key[1]:064X}",
+            "protocol": protocol,
+            "capabilities": capabilities,
+            "verifier_key": verifier_key,
+            "enrolled_at": time.time(),
+        }
+
+    # Changes fields of the record of a prover (e.g. the verifier key after K)
+    def update(self, address, **fields):
+        if address in self.devices:
+            self.devices[address].update(fields)
+
+    # Removes a prover whose proof no longer matches its record
+    def forget(self, address):
+        self.devices.pop(address, None)
+
+    # Public key of a record as integers (x, y)
+    @staticmethod
+    def public_key(record):
+        key = record["public_key"]
+        return int(key[:64], 16), int(key[64:], 16)
+
+    # IDs for the given provers: enrolled ones keep theirs, the others get the
+    # next free IDs counting from first_device_id
+    def assign_device_ids(self, addresses, first_device_id=10):
+        used = {record["device_id"] for address, record in self.devices.items() if address in addresses}
+        ids = []
+        candidate = first_device_id
+        for address in addresses:
+            record = self.devices.get(address)
+            if record is not None:
+                ids.append(record["device_id"])
+                continue
+            for _ in range(device_id_count):
+                if candidate % device_id_count not in used:
+                    break
+                candidate += 1
+            device_id = candidate % device_id_count
+            used.add(device_id)
+            ids.append(device_id)
+            candidate += 1
+        return ids
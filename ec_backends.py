@@ -0,0 +1,456 @@
+# Interchangeable elliptic-curve arithmetic for the verification of the proofs.
+#
+# Every backend decodes points, multiplies and adds them and compares them, with
+# its own point type (None is the point at infinity everywhere):
+#  - native:    the Jacobian, wNAF and GLV code of this repository (pure Python ints)
+#  - gmpy2:     the same code with the coordinates held as gmpy2.mpz
+#  - ecdsa:     python-ecdsa's PointJacobi
+#  - coincurve: libsecp256k1 through coincurve
+#  - micro-ecc: the prover's micro-ecc built for the host and loaded with ctypes
+# Backends whose library is not installed are skipped. select_backend() runs a
+# short self-benchmark of the available ones and keeps the fastest; without it
+# the native backend is used. micro-ecc is built on first use, so it is only
+# measured or used when it is named.
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import time
+import ec_jacobian
+from ec_msm import WnafTable, msm
+from fixed_base import generator_wnaf_table, generator_wnaf_bits
+
+# Width of the wNAF table of a prover key (as in device_cache)
+key_window_bits = 6
+
+# Shortest time spent measuring each backend in select_backend()
+benchmark_time = 0.05
+
+# Fixed proof used by the self-benchmark: private key, random value and challenge
+_benchmark_private_key = 0x1D2C3B4A5968778695A4B3C2D1E0F1E2D3C4B5A69788796A5B4C3D2E1F0A1B2C
+_benchmark_nonce = 0x3C4B5A69788796A5B4C3D2E1F0E1D2C3B4A5968778695A4B3C2D1E0F1A2B3C4D
+_benchmark_challenge = 0x6F5E4D3C2B1A09F8E7D6C5B4A39281706F5E4D3C2B1A09F8E7D6C5B4A3928170
+
+# Backend used by verification.py when none is given
+_selected = None
+
+
+def _to_bytes(scalar):
+    return (scalar % ec_jacobian.n).to_bytes(32, "big")
+
+
+class EcBackend(ABC):
+    name = None
+    # Measured by select_backend() when no names are given
+    auto_select = True
+
+    # True when the library of the backend can be imported
+    @classmethod
+    def available(cls):
+        return True
+
+    # Point from 64 bytes (x || y), 65 bytes (SEC1 uncompressed) or 33 bytes
+    # (SEC1 compressed); None if it is not a point of the curve
+    def decode_point(self, data):
+        data = bytes(data)
+        if len(data) == 33:
+            point = ec_jacobian.decompress(data)
+            return self.point(*point) if point is not None else None
+        if len(data) == 65 and data[0] == 4:
+            data = data[1:]
+        if len(data) != 64:
+            return None
+        return self.point(int.from_bytes(data[:32], "big"), int.from_bytes(data[32:], "big"))
+
+    # Point from affine coordinates; None if it is not a point of the curve
+    @abstractmethod
+    def point(self, x, y):
+        pass
+
+    @abstractmethod
+    def generator(self):
+        pass
+
+    @abstractmethod
+    def multiply(self, scalar, point):
+        pass
+
+    # a * P + b * Q
+    def double_multiply(self, a, P, b, Q):
+        return self.add(self.multiply(a, P), self.multiply(b, Q))
+
+    @abstractmethod
+    def add(self, P, Q):
+        pass
+
+    @abstractmethod
+    def equal(self, P, Q):
+        pass
+
+    # Form of a prover key that is kept and reused for all its proofs
+    def prepare_public_key(self, x, y):
+        return self.point(x, y)
+
+    # A proof holds when πG - σQd is the commitment R (an affine (x, y) pair)
+    def verify(self, response, challenge, commitment, public_key):
+        R = self.point(*commitment)
+        if R is None or public_key is None:
+            return False
+        return self.equal(self.double_multiply(response, self.generator(), -challenge, public_key), R)
+
+
+# The arithmetic of ec_jacobian / ec_msm. Points are affine (x, y) tuples; the
+# prepared keys are WnafTables, so πG - σQd is one Strauss multiplication.
+class NativeBackend(EcBackend):
+    name = "native"
+
+    def coordinate(self, value):
+        return value
+
+    def point(self, x, y):
+        if not ec_jacobian.is_on_curve(x, y):
+            return None
+        return (self.coordinate(x), self.coordinate(y))
+
+    def generator(self):
+        return (self.coordinate(ec_jacobian.Gx), self.coordinate(ec_jacobian.Gy))
+
+    def generator_table(self):
+        return generator_wnaf_table()
+
+    def _affine(self, point):
+        if ec_jacobian.is_infinity(point):
+            return None
+        return ec_jacobian.to_affine(point)
+
+    def multiply(self, scalar, point):
+        if point is None:
+            return None
+        return self._affine(msm([scalar], [(point.x, point.y) if isinstance(point, WnafTable) else point],
+                                [point if isinstance(point, WnafTable) else None]))
+
+    def double_multiply(self, a, P, b, Q):
+        terms = [(scalar, point) for scalar, point in ((a, P), (b, Q)) if point is not None]
+        points = [(point.x, point.y) if isinstance(point, WnafTable) else point for _, point in terms]
+        tables = [point if isinstance(point, WnafTable)
+                  else self.generator_table() if point == self.generator() else None
+                  for _, point in terms]
+        return self._affine(msm([scalar for scalar, _ in terms], points, tables))
+
+    def add(self, P, Q):
+        if P is None:
+            return Q
+        if Q is None:
+            return P
+        return self._affine(ec_jacobian.add_affine(ec_jacobian.from_affine(*P), *Q))
+
+    def equal(self, P, Q):
+        return P == Q
+
+    def prepare_public_key(self, x, y):
+        if not ec_jacobian.is_on_curve(x, y):
+            return None
+        return WnafTable(self.coordinate(x), self.coordinate(y), key_window_bits)
+
+    def verify(self, response, challenge, commitment, public_key):
+        if public_key is None:
+            return False
+        P = msm([response, -challenge], [self.generator(), (public_key.x, public_key.y)],
+                [self.generator_table(), public_key])
+        return self._affine(P) == tuple(commitment)
+
+
+# The native arithmetic on gmpy2.mpz coordinates: the field products and
+# reductions run in GMP instead of Python ints
+class Gmpy2Backend(NativeBackend):
+    name = "gmpy2"
+
+    def __init__(self):
+        import gmpy2
+        self.mpz = gmpy2.mpz
+        self._generator_table = None
+
+    @classmethod
+    def available(cls):
+        try:
+            import gmpy2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def coordinate(self, value):
+        return self.mpz(value)
+
+    def generator_table(self):
+        if self._generator_table is None:
+            self._generator_table = WnafTable(self.mpz(ec_jacobian.Gx), self.mpz(ec_jacobian.Gy),
+                                              generator_wnaf_bits)
+        return self._generator_table
+
+
+# python-ecdsa, the library the verifier used originally
+class EcdsaBackend(EcBackend):
+    name = "ecdsa"
+
+    def __init__(self):
+        from ecdsa import SECP256k1
+        from ecdsa.ellipticcurve import INFINITY, PointJacobi
+        self.curve = SECP256k1.curve
+        self._generator = SECP256k1.generator
+        self._infinity = INFINITY
+        self._point_class = PointJacobi
+
+    @classmethod
+    def available(cls):
+        try:
+            import ecdsa  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _result(self, point):
+        return None if point == self._infinity else point
+
+    def point(self, x, y):
+        if not self.curve.contains_point(x, y):
+            return None
+        return self._point_class(self.curve, x, y, 1, ec_jacobian.n)
+
+    def generator(self):
+        return self._generator
+
+    def multiply(self, scalar, point):
+        if point is None:
+            return None
+        return self._result(point * (scalar % ec_jacobian.n))
+
+    def double_multiply(self, a, P, b, Q):
+        if P is None or Q is None:
+            return self.multiply(a, P) if Q is None else self.multiply(b, Q)
+        return self._result(P.mul_add(a % ec_jacobian.n, Q, b % ec_jacobian.n))
+
+    def add(self, P, Q):
+        if P is None:
+            return Q
+        if Q is None:
+            return P
+        return self._result(P + Q)
+
+    def equal(self, P, Q):
+        if P is None or Q is None:
+            return P is Q
+        return P == Q
+
+
+# libsecp256k1 through coincurve. Points are coincurve.PublicKey, which cannot
+# hold the point at infinity (None here).
+class CoincurveBackend(EcBackend):
+    name = "coincurve"
+
+    def __init__(self):
+        from coincurve import PublicKey
+        self._public_key = PublicKey
+        self._generator = PublicKey.from_secret(_to_bytes(1))
+
+    @classmethod
+    def available(cls):
+        try:
+            import coincurve  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def decode_point(self, data):
+        data = bytes(data)
+        if len(data) == 64:
+            data = b"\x04" + data
+        try:
+            return self._public_key(data)
+        except ValueError:
+            return None
+
+    def point(self, x, y):
+        return self.decode_point(x.to_bytes(32, "big") + y.to_bytes(32, "big"))
+
+    def generator(self):
+        return self._generator
+
+    def multiply(self, scalar, point):
+        if point is None or scalar % ec_jacobian.n == 0:
+            return None
+        if point is self._generator:
+            return self._public_key.from_secret(_to_bytes(scalar))
+        return point.multiply(_to_bytes(scalar))
+
+    def add(self, P, Q):
+        if P is None:
+            return Q
+        if Q is None:
+            return P
+        try:
+            return self._public_key.combine_keys([P, Q])
+        except ValueError:
+            # P = -Q
+            return None
+
+    def equal(self, P, Q):
+        if P is None or Q is None:
+            return P is Q
+        return P.format(compressed=False) == Q.format(compressed=False)
+
+    # R + σQd == πG, so no negation is needed and πG uses the generator tables
+    # of libsecp256k1
+    def verify(self, response, challenge, commitment, public_key):
+        R = self.point(*commitment)
+        if R is None or public_key is None:
+            return False
+        return self.equal(self.add(R, self.multiply(challenge, public_key)), self.multiply(response, self._generator))
+
+
+# micro-ecc, the library of the prover, built for the host word size
+# (micro_ecc.py). Points are 64-byte uECC native buffers (x || y, little-endian).
+# micro-ecc has no public point addition, so R + σQd is added in Python.
+class MicroEccBackend(EcBackend):
+    name = "micro-ecc"
+    # available() may run the C compiler, so the backend is only used when it
+    # is asked for by name
+    auto_select = False
+
+    def __init__(self):
+        import micro_ecc
+        self.uecc = micro_ecc.MicroEcc(micro_ecc.word_size_host)
+
+    @classmethod
+    def available(cls):
+        import micro_ecc
+        return micro_ecc.available(micro_ecc.word_size_host)
+
+    def _native(self, x, y):
+        return x.to_bytes(32, "little") + y.to_bytes(32, "little")
+
+    def _affine(self, point):
+        return int.from_bytes(point[:32], "little"), int.from_bytes(point[32:], "little")
+
+    def point(self, x, y):
+        if not ec_jacobian.is_on_curve(x, y):
+            return None
+        return self._native(x, y)
+
+    def generator(self):
+        return self.uecc.G
+
+    def _negate(self, point):
+        x, y = self._affine(point)
+        return self._native(x, ec_jacobian.p - y)
+
+    # The co-Z ladder of uECC_point_mult() meets the point at infinity for the
+    # scalars 1, n - 2 and n - 1, so those are computed from n - scalar
+    def multiply(self, scalar, point):
+        scalar %= ec_jacobian.n
+        if point is None or scalar == 0:
+            return None
+        if scalar == 1:
+            return point
+        if scalar >= ec_jacobian.n - 2:
+            return self._negate(self.multiply(ec_jacobian.n - scalar, point))
+        return self.uecc.point_mult(point, scalar.to_bytes(32, "little"))
+
+    def add(self, P, Q):
+        if P is None:
+            return Q
+        if Q is None:
+            return P
+        P = ec_jacobian.add_affine(ec_jacobian.from_affine(*self._affine(P)), *self._affine(Q))
+        if ec_jacobian.is_infinity(P):
+            return None
+        return self._native(*ec_jacobian.to_affine(P))
+
+    def equal(self, P, Q):
+        return P == Q
+
+    # R + σQd == πG, so no negation is needed
+    def verify(self, response, challenge, commitment, public_key):
+        R = self.point(*commitment)
+        if R is None or public_key is None:
+            return False
+        return self.equal(self.add(R, self.multiply(challenge, public_key)), self.multiply(response, self.uecc.G))
+
+
+# Backends in order of preference when they are equally fast
+backend_classes = OrderedDict((cls.name, cls) for cls in
+                              (CoincurveBackend, Gmpy2Backend, NativeBackend, MicroEccBackend, EcdsaBackend))
+
+
+# Names of the backends whose libraries are installed
+def available_backends():
+    return [name for name, cls in backend_classes.items() if cls.available()]
+
+
+# Instance of a backend by name (ValueError if unknown or not installed)
+def create_backend(name):
+    cls = backend_classes.get(name)
+    if cls is None:
+        raise ValueError(f"unknown elliptic-curve backend: {name}")
+    if not cls.available():
+        raise ValueError(f"the library of the {name} backend is not installed")
+    return cls()
+
+
+# Seconds per verification of the fixed proof, or None if the backend gets the
+# valid or the forged proof wrong
+def benchmark_backend(backend, min_time=benchmark_time):
+    d, w, sigma = _benchmark_private_key, _benchmark_nonce, _benchmark_challenge
+    # The wNAF table of G, which verification builds anyway: the comb table of
+    # fixed_base.py is not loaded for the benchmark
+    G = (ec_jacobian.Gx, ec_jacobian.Gy)
+    Qx, Qy = ec_jacobian.to_affine(msm([d], [G], [generator_wnaf_table()]))
+    R = ec_jacobian.to_affine(msm([w], [G], [generator_wnaf_table()]))
+    response = (w + sigma * d) % ec_jacobian.n
+    key = backend.prepare_public_key(Qx, Qy)
+    if not backend.verify(response, sigma, R, key) or backend.verify(response + 1, sigma, R, key):
+        return None
+
+    rounds = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        backend.verify(response, sigma, R, key)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / rounds
+
+
+# Measures the available backends (or the given names) and keeps the fastest
+# as the default. Returns (backend, {name: seconds per verification or None}).
+def select_backend(names=None, min_time=benchmark_time):
+    global _selected
+    if not names:
+        names = [name for name, cls in backend_classes.items() if cls.auto_select and cls.available()]
+    timings = {}
+    best, best_time = None, None
+    for name in names:
+        try:
+            backend = create_backend(name)
+            seconds = benchmark_backend(backend, min_time)
+        except Exception:
+            seconds = None
+        timings[name] = seconds
+        if seconds is not None and (best_time is None or seconds < best_time):
+            best, best_time = backend, seconds
+    if best is None:
+        best = NativeBackend()
+    _selected = best
+    return best, timings
+
+
+# Makes the named backend the default without measuring it
+def use_backend(name):
+    global _selected
+    _selected = create_backend(name)
+    return _selected
+
+
+# Backend chosen by select_backend() / use_backend(), or the native one
+def default_backend():
+    global _selected
+    if _selected is None:
+        _selected = NativeBackend()
+    return _selected
@@ -0,0 +1,36 @@
+# GLV endomorphism of SECP256k1. The map φ(x, y) = (βx, y) is the same as
+# multiplying by λ, so k * P can be written as k1 * P + k2 * φ(P) with k1 and k2
+# of about 128 bits each; evaluated jointly, this needs half the doublings.
+import ec_jacobian
+
+# β is a cube root of unity modulo p and λ the matching one modulo n:
+# λ * (x, y) = (β * x, y) for every point of the curve
+beta = 0x7AE96A2B657C07106E64479EAC3434E99CF0497512F58995C1396C28719501EE
+lam = 0x5363AD4CC05C30E0A5261C028812645A122E22EA20816678DF02967C1B23BD72
+
+# Short basis of the lattice {(a, b) : a + b * λ = 0 mod n}
+a1 = 0x3086D221A7D46BCDE86C90E49284EB15
+b1 = -0xE4437ED6010E88286F547FA90ABFE4C3
+a2 = 0x114CA50F7A8E2F3F657C1108D9D44CFD8
+b2 = a1
+
+
+# Applies the endomorphism to an affine point
+def endomorphism(x, y):
+    return (beta * x % ec_jacobian.p, y)
+
+
+# Division of a by n rounded to the nearest integer
+def _round_div(a, n):
+    return (2 * a + n) // (2 * n)
+
+
+# Splits k into (k1, k2) with k = k1 + k2 * λ (mod n); k1 and k2 may be negative
+def decompose(k):
+    n = ec_jacobian.n
+    k %= n
+    c1 = _round_div(b2 * k, n)
+    c2 = _round_div(-b1 * k, n)
+    k1 = k - c1 * a1 - c2 * a2
+    k2 = -c1 * b1 - c2 * b2
+    return k1, k2
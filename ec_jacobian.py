@@ -0,0 +1,170 @@
+# Point arithmetic of SECP256k1 (y^2 = x^3 + 7) in Jacobian coordinates on plain
+# Python ints. A point (X, Y, Z) represents the affine point (X / Z^2, Y / Z^3), so
+# additions and doublings need no modular inversion; the only inversion is paid
+# when a result is converted back to affine coordinates.
+
+# Parameters of the SECP256k1 curve
+p = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+n = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+b = 7
+Gx = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
+Gy = 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
+
+# Point at infinity (any point with Z = 0)
+infinity = (1, 1, 0)
+
+
+# Checks that the affine point (x, y) is on the curve
+def is_on_curve(x, y):
+    if not (0 <= x < p and 0 <= y < p):
+        return False
+    return (y * y - x * x * x - b) % p == 0
+
+
+def is_infinity(point):
+    return point[2] == 0
+
+
+def from_affine(x, y):
+    return (x, y, 1)
+
+
+def negate(point):
+    X, Y, Z = point
+    return (X, (-Y) % p, Z)
+
+
+# Doubles a point (dbl-2009-l, for curves with a = 0)
+def double(point):
+    X1, Y1, Z1 = point
+    if Z1 == 0 or Y1 == 0:
+        return infinity
+
+    A = X1 * X1 % p
+    B = Y1 * Y1 % p
+    C = B * B % p
+    D = 2 * ((X1 + B) * (X1 + B) - A - C) % p
+    E = 3 * A % p
+    X3 = (E * E - 2 * D) % p
+    Y3 = (E * (D - X3) - 8 * C) % p
+    Z3 = 2 * Y1 * Z1 % p
+    return (X3, Y3, Z3)
+
+
+# Adds two points in Jacobian coordinates
+def add(point1, point2):
+    X1, Y1, Z1 = point1
+    X2, Y2, Z2 = point2
+    if Z1 == 0:
+        return point2
+    if Z2 == 0:
+        return point1
+
+    Z1Z1 = Z1 * Z1 % p
+    Z2Z2 = Z2 * Z2 % p
+    U1 = X1 * Z2Z2 % p
+    U2 = X2 * Z1Z1 % p
+    S1 = Y1 * Z2 * Z2Z2 % p
+    S2 = Y2 * Z1 * Z1Z1 % p
+    H = (U2 - U1) % p
+    r = (S2 - S1) % p
+    if H == 0:
+        # Same x: either the same point or opposite points
+        if r == 0:
+            return double(point1)
+        return infinity
+
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - S1 * HHH) % p
+    Z3 = Z1 * Z2 * H % p
+    return (X3, Y3, Z3)
+
+
+# Adds an affine point (x2, y2) to a point in Jacobian coordinates (mixed addition)
+def add_affine(point1, x2, y2):
+    X1, Y1, Z1 = point1
+    if Z1 == 0:
+        return (x2, y2, 1)
+
+    Z1Z1 = Z1 * Z1 % p
+    U2 = x2 * Z1Z1 % p
+    S2 = y2 * Z1 * Z1Z1 % p
+    H = (U2 - X1) % p
+    r = (S2 - Y1) % p
+    if H == 0:
+        if r == 0:
+            return double(point1)
+        return infinity
+
+    HH = H * H % p
+    HHH = H * HH % p
+    V = X1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - Y1 * HHH) % p
+    Z3 = Z1 * H % p
+    return (X3, Y3, Z3)
+
+
+# Converts a point to affine coordinates; returns None for the point at infinity
+def to_affine(point):
+    X, Y, Z = point
+    if Z == 0:
+        return None
+    if Z == 1:
+        return (X, Y)
+    z_inv = pow(Z, -1, p)
+    z_inv2 = z_inv * z_inv % p
+    return (X * z_inv2 % p, Y * z_inv2 * z_inv % p)
+
+
+# Converts many points to affine coordinates with a single modular inversion
+# (Montgomery's trick). Points at infinity are returned as None.
+def batch_to_affine(points):
+    # prefix[i] is the product of the Z coordinates of the first i finite points
+    prefix = [1]
+    for X, Y, Z in points:
+        if Z != 0:
+            prefix.append(prefix[-1] * Z % p)
+
+    inverse = pow(prefix[-1], -1, p) if len(prefix) > 1 else 1
+
+    result = [None] * len(points)
+    k = len(prefix) - 1
+    for i in range(len(points) - 1, -1, -1):
+        X, Y, Z = points[i]
+        if Z == 0:
+            continue
+        k -= 1
+        # Inverse of this Z alone, then remove it from the running inverse
+        z_inv = inverse * prefix[k] % p
+        inverse = inverse * Z % p
+        z_inv2 = z_inv * z_inv % p
+        result[i] = (X * z_inv2 % p, Y * z_inv2 * z_inv % p)
+    return result
+
+
+# SEC1 compressed encoding of an affine point: 0x02 or 0x03 (parity of y)
+# followed by the 32 bytes of x
+def compress(x, y):
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+
+
+# Recovers the affine point of a SEC1 compressed encoding; returns None if the
+# encoding is malformed or x is not the abscissa of a point of the curve.
+# Since p = 3 mod 4, the square root of a is a^((p + 1) / 4).
+def decompress(data):
+    if len(data) != 33 or data[0] not in (2, 3):
+        return None
+    x = int.from_bytes(data[1:], "big")
+    if x >= p:
+        return None
+    a = (x * x * x + b) % p
+    y = pow(a, (p + 1) // 4, p)
+    if y * y % p != a:
+        return None
+    if y & 1 != data[0] & 1:
+        y = p - y
+    return (x, y)
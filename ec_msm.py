@@ -0,0 +1,167 @@
+# Multi-scalar multiplication: sum(scalars[i] * points[i]) computed as a single
+# operation. Small sums use Strauss/Shamir interleaving (one shared chain of
+# doublings for every term); large sums use Pippenger's bucket method, whose cost
+# per term shrinks as the number of terms grows.
+import ec_jacobian
+import ec_glv
+
+# Default wNAF width for points that do not come with a precomputed table
+window_bits = 5
+
+# From this many terms on, Pippenger is cheaper than Strauss
+pippenger_threshold = 96
+
+
+# Function that returns the width-w NAF digits of scalar, least significant first
+def wnaf(scalar, width=window_bits):
+    digits = []
+    window = 1 << width
+    while scalar:
+        if scalar & 1:
+            digit = scalar & (window - 1)
+            if digit >= window >> 1:
+                digit -= window
+            scalar -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        scalar >>= 1
+    return digits
+
+
+# Affine point (x, y) together with its odd multiples P, 3P, 5P, ... and their
+# negations, as used by wNAF multiplication
+class WnafTable:
+    def __init__(self, x, y, window_bits=window_bits, positive=None):
+        self.x = x
+        self.y = y
+        self.window_bits = window_bits
+
+        if positive is None:
+            # Odd multiples converted to affine form with a single inversion, so
+            # every addition during the multiplication is a mixed one
+            base = ec_jacobian.from_affine(x, y)
+            double = ec_jacobian.double(base)
+            multiples = [base]
+            for _ in range((1 << (window_bits - 2)) - 1):
+                multiples.append(ec_jacobian.add(multiples[-1], double))
+            positive = ec_jacobian.batch_to_affine(multiples)
+        self.positive = positive
+        self.negative = [(mx, (-my) % ec_jacobian.p) for mx, my in positive]
+        self._negated = None
+        self._endomorphism = None
+
+    # Table of -P: the same points with the two lists swapped
+    def negated(self):
+        if self._negated is None:
+            self._negated = WnafTable(self.x, (-self.y) % ec_jacobian.p, self.window_bits, self.negative)
+            self._negated._negated = self
+        return self._negated
+
+    # Table of φ(P): the odd multiples of φ(P) are φ of the odd multiples of P,
+    # so no point additions are needed
+    def endomorphism(self):
+        if self._endomorphism is None:
+            x, y = ec_glv.endomorphism(self.x, self.y)
+            self._endomorphism = WnafTable(x, y, self.window_bits,
+                                           [ec_glv.endomorphism(mx, my) for mx, my in self.positive])
+        return self._endomorphism
+
+    # Calculates scalar * P with the precomputed table, in Jacobian coordinates
+    def multiply(self, scalar):
+        return strauss([scalar], [self])
+
+
+# Replaces every term k * P by k1 * P + k2 * φ(P), with k1 and k2 of about 128
+# bits; negative halves use the table of the negated point
+def glv_split(scalars, tables):
+    split_scalars = []
+    split_tables = []
+    for scalar, table in zip(scalars, tables):
+        k1, k2 = ec_glv.decompose(scalar)
+        for k, half in ((k1, table), (k2, table.endomorphism())):
+            if k < 0:
+                k, half = -k, half.negated()
+            split_scalars.append(k)
+            split_tables.append(half)
+    return split_scalars, split_tables
+
+
+# Strauss/Shamir: all the terms share the same chain of doublings, each one only
+# adds its own wNAF digits. With use_glv every term is first split in two halves
+# of about 128 bits, which halves the length of the chain.
+def strauss(scalars, tables, use_glv=True):
+    scalars = [scalar % ec_jacobian.n for scalar in scalars]
+    if use_glv:
+        scalars, tables = glv_split(scalars, tables)
+
+    digit_lists = [wnaf(scalar, table.window_bits) for scalar, table in zip(scalars, tables)]
+    length = max((len(digits) for digits in digit_lists), default=0)
+
+    result = ec_jacobian.infinity
+    for bit in range(length - 1, -1, -1):
+        result = ec_jacobian.double(result)
+        for digits, table in zip(digit_lists, tables):
+            if bit < len(digits):
+                digit = digits[bit]
+                if digit > 0:
+                    mx, my = table.positive[digit >> 1]
+                    result = ec_jacobian.add_affine(result, mx, my)
+                elif digit < 0:
+                    mx, my = table.negative[(-digit) >> 1]
+                    result = ec_jacobian.add_affine(result, mx, my)
+    return result
+
+
+# Window width for Pippenger's method, roughly log2 of the number of terms
+def pippenger_window(count):
+    return max(3, min(16, count.bit_length() - 3))
+
+
+# Pippenger's bucket method: for each window of the scalars, points are added to
+# the bucket of their digit and the buckets are combined with a running sum
+def pippenger(scalars, points):
+    scalars = [scalar % ec_jacobian.n for scalar in scalars]
+    width = pippenger_window(len(points))
+    mask = (1 << width) - 1
+    bits = max(scalar.bit_length() for scalar in scalars)
+    windows = (bits + width - 1) // width
+
+    result = ec_jacobian.infinity
+    for window in range(windows - 1, -1, -1):
+        for _ in range(width):
+            result = ec_jacobian.double(result)
+
+        shift = window * width
+        buckets = [ec_jacobian.infinity] * mask
+        for scalar, (x, y) in zip(scalars, points):
+            digit = (scalar >> shift) & mask
+            if digit:
+                buckets[digit - 1] = ec_jacobian.add_affine(buckets[digit - 1], x, y)
+
+        # sum(j * bucket[j]) = bucket[top] + (bucket[top] + bucket[top - 1]) + ...
+        running = ec_jacobian.infinity
+        window_sum = ec_jacobian.infinity
+        for bucket in reversed(buckets):
+            running = ec_jacobian.add(running, bucket)
+            window_sum = ec_jacobian.add(window_sum, running)
+        result = ec_jacobian.add(result, window_sum)
+    return result
+
+
+# Calculates sum(scalars[i] * points[i]) in Jacobian coordinates. points are affine
+# (x, y) pairs; tables optionally gives a precomputed WnafTable for some of them
+# (None for the others), which is only used by the Strauss path.
+def msm(scalars, points, tables=None):
+    terms = [(scalar % ec_jacobian.n, point, table)
+             for scalar, point, table in zip(scalars, points, tables or [None] * len(points))]
+    terms = [term for term in terms if term[0]]
+    if not terms:
+        return ec_jacobian.infinity
+
+    if len(terms) < pippenger_threshold:
+        return strauss([scalar for scalar, _, _ in terms],
+                       [table if table is not None else WnafTable(point[0], point[1])
+                        for _, point, table in terms])
+
+    return pippenger([scalar for scalar, _, _ in terms], [point for _, point, _ in terms])
@@ -0,0 +1,134 @@
+import os
+import ec_jacobian
+from ec_msm import WnafTable
+from ec_jacobian import Gx, Gy
+
+# Order of the generator point G
+order = ec_jacobian.n
+
+# Width (in bits) of each window of the scalar. With 8 bits a 256-bit scalar has
+# 32 windows, so kG costs at most 32 point additions and no doublings.
+# Single proofs are verified with the wNAF table of G (ec_msm.msm); the comb
+# table is used where G is multiplied alone: key generation, the batch
+# verification sum and the backend benchmark. It is loaded on first use.
+window_bits = 8
+
+# File where the precomputed table of G is kept between runs
+table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generator_table.bin")
+
+# Header of the table file: magic, window width and the table is 64-byte points (x || y)
+table_magic = b"NIZKPGT1"
+
+# Width of the wNAF table of G used when G is one term of a multi-scalar sum
+generator_wnaf_bits = 8
+
+# Tables loaded in memory, built on first use
+_generator_table = None
+_generator_wnaf_table = None
+
+
+# Number of windows needed to cover a scalar modulo the order of G
+def window_count(window_bits=window_bits):
+    return (order.bit_length() + window_bits - 1) // window_bits
+
+
+# Builds table[i][j - 1] = j * 2^(window_bits * i) * G, for j in 1 .. 2^window_bits - 1,
+# as a list of rows of affine (x, y) integer pairs
+def build_generator_table(window_bits=window_bits):
+    table = []
+    base = ec_jacobian.from_affine(Gx, Gy)
+    for _ in range(window_count(window_bits)):
+        row = []
+        point = base
+        for _ in range((1 << window_bits) - 1):
+            row.append(point)
+            point = ec_jacobian.add(point, base)
+        # One inversion per row instead of one per point
+        table.append(ec_jacobian.batch_to_affine(row))
+        # Next row starts at 2^window_bits times the current base
+        base = point
+    return table
+
+
+# Writes the table to disk. The temporary file (one per process, as several
+# workers may build the table at once) keeps a half-written table from being loaded
+def save_generator_table(table, path=table_path, window_bits=window_bits):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as table_file:
+        table_file.write(table_magic + bytes([window_bits]))
+        for row in table:
+            for x, y in row:
+                table_file.write(x.to_bytes(32, "big") + y.to_bytes(32, "big"))
+    os.replace(tmp_path, path)
+
+
+# Reads the table from disk. Returns None if the file is missing, truncated or
+# was built with a different window width.
+def read_generator_table(path=table_path, window_bits=window_bits):
+    try:
+        with open(path, "rb") as table_file:
+            data = table_file.read()
+    except OSError:
+        return None
+
+    header = table_magic + bytes([window_bits])
+    row_size = (1 << window_bits) - 1
+    expected = len(header) + window_count(window_bits) * row_size * 64
+    if not data.startswith(header) or len(data) != expected:
+        return None
+
+    table = []
+    pos = len(header)
+    for _ in range(window_count(window_bits)):
+        row = []
+        for _ in range(row_size):
+            x = int.from_bytes(data[pos:pos + 32], "big")
+            y = int.from_bytes(data[pos + 32:pos + 64], "big")
+            row.append((x, y))
+            pos += 64
+        table.append(row)
+
+    # The first entry must be G itself
+    if table[0][0] != (Gx, Gy):
+        return None
+    return table
+
+
+# Loads the table of G from disk, building and saving it if it is not there yet
+def load_generator_table(path=table_path):
+    global _generator_table
+    if _generator_table is None:
+        table = read_generator_table(path)
+        if table is None:
+            table = build_generator_table()
+            try:
+                save_generator_table(table, path)
+            except OSError as e:
+                print(f"Could not save the table of G to {path}: {e}")
+        _generator_table = table
+    return _generator_table
+
+
+# Calculates scalar * G using only the (mixed) additions of the precomputed table.
+# The result is in Jacobian coordinates.
+def fixed_base_multiply(scalar):
+    table = load_generator_table()
+    scalar = scalar % order
+    mask = (1 << window_bits) - 1
+
+    result = ec_jacobian.infinity
+    for row in table:
+        digit = scalar & mask
+        if digit:
+            x, y = row[digit - 1]
+            result = ec_jacobian.add_affine(result, x, y)
+        scalar >>= window_bits
+    return result
+
+
+# Odd multiples of G for the Strauss path of ec_msm.msm (64 points, built in memory)
+def generator_wnaf_table():
+    global _generator_wnaf_table
+    if _generator_wnaf_table is None:
+        _generator_wnaf_table = WnafTable(Gx, Gy, generator_wnaf_bits)
+    return _generator_wnaf_table
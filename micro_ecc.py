@@ -0,0 +1,182 @@
+# micro-ecc (libraries/micro-ecc) built as a shared library for this host and
+# loaded with ctypes, so the Python side runs the same C code as the prover.
+#
+# Two builds are kept in build/:
+#  - word size 1 (uECC_word_t is uint8_t, as on the ATmega328P). The emulator
+#    uses it as a bit-exact prover: the same uECC_make_key, uECC_compress,
+#    uECC_vli_modMult and uECC_vli_modAdd calls as generate_pacNIZKP(), on the
+#    same little-endian byte arrays.
+#  - the native word size of the host, much faster, for the micro-ecc backend of
+#    the verifier (ec_backends.py).
+# Integers in uECC native format are passed as 32 little-endian bytes, which is
+# the layout of both builds on a little-endian host.
+import ctypes
+import os
+import subprocess
+import sys
+
+source_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libraries", "micro-ecc")
+build_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build")
+
+# Word size of the AVR build; None lets types.h pick the one of the host
+word_size_avr = 1
+word_size_host = None
+
+# Bytes of a secp256k1 scalar / coordinate
+coordinate_size = 32
+
+# Libraries loaded so far, by word size
+_libraries = {}
+
+
+def library_path(word_size):
+    return os.path.join(build_dir, f"libuecc-w{word_size or 'host'}.so")
+
+
+# Compiles uECC.c with the VLI API (the sketch uses uECC_vli_modMult/modAdd).
+# Raises OSError when there is no compiler or the build fails.
+def build_library(word_size, path=None):
+    path = path or library_path(word_size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    command = [os.environ.get("CC", "cc"), "-O2", "-shared", "-fPIC", "-std=c99",
+               "-DuECC_ENABLE_VLI_API=1", "-DuECC_PLATFORM=uECC_arch_other"]
+    if word_size is not None:
+        command.append(f"-DuECC_WORD_SIZE={word_size}")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    command += ["-o", tmp_path, os.path.join(source_dir, "uECC.c")]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError as e:
+        raise OSError(f"no C compiler to build micro-ecc: {e}")
+    if result.returncode != 0:
+        raise OSError(f"micro-ecc build failed: {result.stderr.strip()}")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _declare(lib):
+    u8p = ctypes.c_char_p
+    curve = ctypes.c_void_p
+    lib.uECC_secp256k1.restype = curve
+    lib.uECC_secp256k1.argtypes = []
+    for name in ("uECC_make_key", "uECC_compute_public_key"):
+        getattr(lib, name).restype = ctypes.c_int
+        getattr(lib, name).argtypes = [u8p, u8p, curve]
+    for name in ("uECC_compress", "uECC_decompress"):
+        getattr(lib, name).restype = None
+        getattr(lib, name).argtypes = [u8p, u8p, curve]
+    for name in ("uECC_valid_public_key", "uECC_valid_point"):
+        getattr(lib, name).restype = ctypes.c_int
+        getattr(lib, name).argtypes = [u8p, curve]
+    for name in ("uECC_vli_modMult", "uECC_vli_modAdd"):
+        getattr(lib, name).restype = None
+        getattr(lib, name).argtypes = [u8p, u8p, u8p, u8p, ctypes.c_int8]
+    lib.uECC_point_mult.restype = None
+    lib.uECC_point_mult.argtypes = [u8p, u8p, u8p, curve]
+    for name in ("uECC_curve_n", "uECC_curve_G"):
+        getattr(lib, name).restype = ctypes.c_void_p
+        getattr(lib, name).argtypes = [curve]
+    lib.uECC_curve_num_words.restype = ctypes.c_uint
+    lib.uECC_curve_num_words.argtypes = [curve]
+
+
+# Loads the library of a word size, building it first if it is missing or
+# older than uECC.c
+def load_library(word_size=word_size_avr):
+    lib = _libraries.get(word_size)
+    if lib is not None:
+        return lib
+    if sys.byteorder != "little" and word_size != 1:
+        raise OSError("the micro-ecc binding needs a little-endian host for words larger than a byte")
+    path = library_path(word_size)
+    source = os.path.join(source_dir, "uECC.c")
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+        build_library(word_size, path)
+    lib = ctypes.CDLL(path)
+    _declare(lib)
+    _libraries[word_size] = lib
+    return lib
+
+
+# True when the library can be built (or is already built) and loaded
+def available(word_size=word_size_avr):
+    try:
+        load_library(word_size)
+    except OSError:
+        return False
+    return True
+
+
+def reverse(data):
+    return bytes(data[::-1])
+
+
+class MicroEcc:
+    def __init__(self, word_size=word_size_avr):
+        self.word_size = word_size
+        self.lib = load_library(word_size)
+        self.curve = self.lib.uECC_secp256k1()
+        self.num_words = self.lib.uECC_curve_num_words(self.curve)
+        # uECC_curve_n() and uECC_curve_G() in native format
+        self.n = ctypes.string_at(self.lib.uECC_curve_n(self.curve), coordinate_size)
+        self.G = ctypes.string_at(self.lib.uECC_curve_G(self.curve), 2 * coordinate_size)
+
+    # uECC_make_key(): (64-byte public key, 32-byte private key), big-endian
+    def make_key(self):
+        public_key = ctypes.create_string_buffer(2 * coordinate_size)
+        private_key = ctypes.create_string_buffer(coordinate_size)
+        if not self.lib.uECC_make_key(public_key, private_key, self.curve):
+            raise OSError("uECC_make_key failed")
+        return public_key.raw, private_key.raw
+
+    # uECC_compute_public_key(); None for an invalid private key
+    def compute_public_key(self, private_key):
+        public_key = ctypes.create_string_buffer(2 * coordinate_size)
+        if not self.lib.uECC_compute_public_key(bytes(private_key), public_key, self.curve):
+            return None
+        return public_key.raw
+
+    def compress(self, public_key):
+        compressed = ctypes.create_string_buffer(coordinate_size + 1)
+        self.lib.uECC_compress(bytes(public_key), compressed, self.curve)
+        return compressed.raw
+
+    def decompress(self, compressed):
+        public_key = ctypes.create_string_buffer(2 * coordinate_size)
+        self.lib.uECC_decompress(bytes(compressed), public_key, self.curve)
+        return public_key.raw
+
+    def valid_public_key(self, public_key):
+        return bool(self.lib.uECC_valid_public_key(bytes(public_key), self.curve))
+
+    # uECC_vli_modMult / uECC_vli_modAdd on native integers
+    def vli_mod_mult(self, left, right, mod):
+        result = ctypes.create_string_buffer(coordinate_size)
+        self.lib.uECC_vli_modMult(result, bytes(left), bytes(right), bytes(mod), self.num_words)
+        return result.raw
+
+    def vli_mod_add(self, left, right, mod):
+        result = ctypes.create_string_buffer(coordinate_size)
+        self.lib.uECC_vli_modAdd(result, bytes(left), bytes(right), bytes(mod), self.num_words)
+        return result.raw
+
+    # uECC_point_mult() on a native point (x || y, each little-endian) and a
+    # native scalar in [2, n - 3] (its ladder fails for 1, n - 2 and n - 1)
+    def point_mult(self, point, scalar):
+        result = ctypes.create_string_buffer(2 * coordinate_size)
+        self.lib.uECC_point_mult(result, bytes(point), bytes(scalar), self.curve)
+        return result.raw
+
+    def valid_point(self, point):
+        return bool(self.lib.uECC_valid_point(bytes(point), self.curve))
+
+    # x coordinate of G as calc_challenge() reads it: gx[i] = G[31 - i]
+    def generator_x(self):
+        return reverse(self.G[:coordinate_size])
+
+    # calc_mult_mod() and calc_add_mod(): the response (witness + hash * priK)
+    # mod n from the big-endian hash, private key and witness, returned big-endian
+    def nizkp_response(self, challenge_hash, private_key, witness):
+        multip = self.vli_mod_mult(reverse(challenge_hash), reverse(private_key), self.n)
+        answer = self.vli_mod_add(reverse(witness), multip, self.n)
+        return reverse(answer)
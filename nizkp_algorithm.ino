@@ -6,9 +6,48 @@
 #include <SoftwareSerial.h>
 #include <AESLib.h>
 #include <SHA256.h>
+#include <util/crc16.h>
 
 SoftwareSerial bluetooth(6, 7);  // RX, TX
 
+// Set to 0 to keep the registration across resets: the verifier can then resume
+// a known device with D, without R / I / K and without generating a new key pair
+#define RESET_REGISTRATION_AT_BOOT 1
+
+// Baud rate of the link to the verifier. The HM-10 bridge runs at 9600; a board
+// wired straight to the gateway (verifier.py --serial) can use up to 57600.
+#define LINK_BAUD 9600
+
+// Protocol v2: the verifier asks for it with "R2" and the key, the packet and its
+// time are then sent as binary frames instead of ASCII hex:
+// SOF | version | type | length (2 bytes) | payload | CRC16 (XMODEM, over version..payload)
+#define FRAME_SOF 0xA5
+#define PROTOCOL_V1 1
+#define PROTOCOL_V2 2
+#define FRAME_PUBLIC_KEY 'K'
+#define FRAME_PROOF 'P'
+#define FRAME_TIME 'T'
+// Optional feature offered after the version ("R2C"): the public key and the
+// committed point are sent as 33-byte SEC1 compressed points
+#define CAPABILITY_COMPRESSED 'C'
+// Optional feature "F": I carries the fingerprint of the verifier key
+// ("I10F<16 hex>") and the answer tells whether it is the stored one ("RF1;"),
+// so the verifier only sends K when its key changed
+#define CAPABILITY_IDENTITY 'F'
+#define FINGERPRINT_SIZE 8
+// Optional feature "H": the challenge hashes the 32 bytes of each coordinate
+// (96 bytes) instead of their hex digits (192 bytes)
+#define CAPABILITY_BINARY_CHALLENGE 'H'
+// Optional feature "A": K is answered with "RS1;" once the verifier key is
+// stored, so the verifier does not have to pause after it
+#define CAPABILITY_KEY_ACK 'A'
+
+uint8_t protocol = PROTOCOL_V1;  // Wire format negotiated with the last R
+bool compressed = false;         // Compressed points, negotiated with the last R
+bool identity_check = false;     // Verifier key fingerprint in I, negotiated with the last R
+bool binary_challenge = false;   // Challenge over raw coordinates, negotiated with the last R
+bool key_ack = false;            // K is acknowledged, negotiated with the last R
+
 //*****************************************************************************************************
 /*int memoryTest() {
   int byteCounter = 0;  // initialize a counter
@@ -89,6 +128,28 @@ void send(uint8_t *seq, uint8_t len, String operation) {
   bluetooth.println(';');
 }
 
+void send_byte(uint8_t value, uint16_t *crc) {
+  bluetooth.write(value);
+  *crc = _crc_xmodem_update(*crc, value);
+}
+
+// Protocol v2 frame. Pauses after the same number of characters as the hex send()
+void send_frame(uint8_t type, uint8_t *payload, uint8_t len) {
+  uint16_t crc = 0;
+  bluetooth.write(FRAME_SOF);
+  send_byte(PROTOCOL_V2, &crc);
+  send_byte(type, &crc);
+  send_byte(0, &crc);
+  send_byte(len, &crc);
+  for (uint8_t posn = 0; posn < len; ++posn) {
+    send_byte(payload[posn], &crc);
+    if (posn % 36 == 0)
+      delay(500);
+  }
+  bluetooth.write(crc >> 8);
+  bluetooth.write(crc & 0xFF);
+}
+
 void reverse(uECC_word_t *array, uint8_t len) {
   int8_t aux;
   for (uint8_t i = 0; i < len / 2; i++) {
@@ -174,21 +235,64 @@ void processAdmPublicKey(String data) {
   EEPROM.put(97, pub_key_adm);
 }
 
-void initialAction() {
+//Wire format asked for after R or D: "2" for the binary format and "C" for
+//compressed points. Returns the confirmation sent in the answer to R ("V2C"),
+//empty for a plain "R".
+String negotiate(const char *request) {
+  bool negotiated = (request[1] == '1' || request[1] == '2');
+  protocol = (request[1] == '2') ? PROTOCOL_V2 : PROTOCOL_V1;
+  compressed = negotiated && strchr(request + 2, CAPABILITY_COMPRESSED) != NULL;
+  identity_check = negotiated && strchr(request + 2, CAPABILITY_IDENTITY) != NULL;
+  binary_challenge = negotiated && strchr(request + 2, CAPABILITY_BINARY_CHALLENGE) != NULL;
+  key_ack = negotiated && strchr(request + 2, CAPABILITY_KEY_ACK) != NULL;
+  String suffix = "";
+  if (negotiated) {
+    suffix = String('V') + String(protocol);
+    if (compressed)
+      suffix += CAPABILITY_COMPRESSED;
+    if (identity_check)
+      suffix += CAPABILITY_IDENTITY;
+    if (binary_challenge)
+      suffix += CAPABILITY_BINARY_CHALLENGE;
+    if (key_ack)
+      suffix += CAPABILITY_KEY_ACK;
+  }
+  return suffix;
+}
+
+void initialAction(const char *request) {
   uint8_t reg;
   EEPROM.get(340, reg);
 
+  String suffix = negotiate(request);
+
   if (reg == 0) {
     //Sending acceptance information
-    send(F("RA"));
+    send(String(F("RA")) + suffix);
     generateKeyPair();
   } else
-    send(F("R1"));  //Device is already registered
+    send(String(F("R1")) + suffix);  //Device is already registered
+}
+
+//Compares the fingerprint sent by the verifier (first bytes of the SHA-256 of
+//its public key, in hex) with the administrator key stored at position 97
+bool adm_key_matches(String fingerprint) {
+  uint8_t pub_key_adm[64];
+  uint8_t hash[32];
+  SHA256 hasher;
+
+  EEPROM.get(97, pub_key_adm);
+  hasher.reset();
+  hasher.update(pub_key_adm, 64);
+  hasher.finalize(hash, 32);
+
+  return fingerprint.equals(decToHex(hash, FINGERPRINT_SIZE));
 }
 
 void defineIdentification(String data) {
   char id_char[3];
   uint8_t pub_key[64];
+  uint8_t key_len = 64;
   uint8_t id;
 
   //Registering the device's ID
@@ -198,7 +302,27 @@ void defineIdentification(String data) {
 
   //Retrieving and sending the device's public key
   EEPROM.get(33, pub_key);
-  send(pub_key, 64, F("RK\n"));
+  if (compressed) {
+    //The compressed key (33 bytes) overwrites the start of the buffer
+    uint8_t point[64];
+    memcpy(point, pub_key, 64);
+    uECC_compress(point, pub_key, uECC_secp256k1());
+    key_len = 33;
+  }
+  if (protocol == PROTOCOL_V2)
+    send_frame(FRAME_PUBLIC_KEY, pub_key, key_len);
+  else
+    send(pub_key, key_len, F("RK\n"));
+
+  //"I10F<fingerprint>": tell whether the stored administrator key is the
+  //verifier's; if it is, the registration is complete without K
+  if (identity_check && data.charAt(2) == CAPABILITY_IDENTITY) {
+    if (adm_key_matches(data.substring(3, 3 + 2 * FINGERPRINT_SIZE))) {
+      EEPROM.put(340, 1);
+      send(F("RF1"));
+    } else
+      send(F("RF0"));
+  }
 }
 
 void generate_shared_point() {
@@ -227,6 +351,22 @@ void calc_challenge(uECC_word_t *hash, const uECC_word_t *G) {
   EEPROM.get(33, pub_key);
   EEPROM.get(195, commit);
 
+  // Binary challenge: the coordinates are hashed as they are, no hex conversion
+  if (binary_challenge) {
+    uint8_t gx[32];
+    for (int i = 0; i < 32; i++)
+      gx[i] = G[31 - i];
+    hasher.reset();
+    hasher.update(gx, 32);
+    hasher.update(pub_key, 32);
+    hasher.update(commit, 32);
+    hasher.finalize(hash, 32);
+
+    Serial.print(F("hash: "));
+    print_hex(hash, 32);
+    return;
+  }
+
   // Retrieves the x-coordinate of the generator point G
   for (int i = 0; i < 32; i++) {
     tmp[0] = G[31 - i];
@@ -289,6 +429,8 @@ void build_pac() {
   uint8_t pac[113];
   uint8_t buffer[64];
   uint8_t id;
+  //The committed point takes 64 bytes, or 33 when compressed
+  uint8_t point_len = compressed ? 33 : 64;
 
   unsigned long start;
   unsigned long stop;
@@ -303,33 +445,45 @@ void build_pac() {
 
   //Shared Point
   EEPROM.get(195, buffer);
-  for (uint8_t i = 0; i < 64; i++)
-    pac[i] = buffer[i];
+  if (compressed)
+    uECC_compress(buffer, pac, uECC_secp256k1());
+  else
+    for (uint8_t i = 0; i < 64; i++)
+      pac[i] = buffer[i];
 
   //Answer to the challenge
   EEPROM.get(259, buffer);
   for (uint8_t i = 0; i < 32; i++){
-    pac[i + 64] = buffer[i];
+    pac[i + point_len] = buffer[i];
   }
 
   //device ID
   EEPROM.get(194, id);
-  pac[96] = id;
+  pac[point_len + 32] = id;
 
   // Clear text message (DATA)
   EEPROM.get(323, buffer);
   for (uint8_t i = 0; i < 16; i++){
-    pac[i + 97] = buffer[i];
+    pac[i + point_len + 33] = buffer[i];
     
   }
 
-  send(pac, 113, F("PA"));
+  if (protocol == PROTOCOL_V2)
+    send_frame(FRAME_PROOF, pac, point_len + 49);
+  else
+    send(pac, point_len + 49, F("PA"));
 
   stop = millis();
   total = (stop - start) / 1000.00;
   Serial.println(total, 3);
 
-  bluetooth.println(total, 3);
+  if (protocol == PROTOCOL_V2) {
+    //Time in milliseconds, big-endian
+    unsigned long elapsed = stop - start;
+    uint8_t time_ms[4] = { (uint8_t)(elapsed >> 24), (uint8_t)(elapsed >> 16), (uint8_t)(elapsed >> 8), (uint8_t)elapsed };
+    send_frame(FRAME_TIME, time_ms, 4);
+  } else
+    bluetooth.println(total, 3);
  // Signals the end of packet assembly and transmission to the verifier
   digitalWrite(3, LOW);
 }
@@ -394,9 +548,11 @@ void generate_pacNIZKP() {
   pinMode(2, OUTPUT);
   pinMode(3, OUTPUT);
   Serial.begin(9600);
-  bluetooth.begin(9600);
+  bluetooth.begin(LINK_BAUD);
   uECC_set_rng(&RNG);
+#if RESET_REGISTRATION_AT_BOOT
   EEPROM.put(340, 0);
+#endif
   Serial.println(F("Ready "));
 }
 
@@ -409,12 +565,12 @@ void loop() {
     switch (data[0]) {
       case 'R':  //Registration request
         begin = millis();
-        initialAction();
+        initialAction(data);
         free(data);
         break;
       case 'I':            //Establishment of identification
         start = millis();  //Start of parameter change
-        defineIdentification(String(data).substring(1, 3));
+        defineIdentification(String(data).substring(1));
         free(data);
         break;
       case 'K':  //Receiving the public key from the administrator device
@@ -425,6 +581,8 @@ void loop() {
         Serial.println(total, 3);
         //generate_shared_secret();
         EEPROM.put(340, 1);
+        if (key_ack)
+          send(F("RS1"));
         free(data);
         end = millis();
         time = (end - begin) / 1000.00;
@@ -432,6 +590,9 @@ void loop() {
         Serial.println(time, 3);
         break;
       case 'D':  //Generation and transmission of NIZKP
+        //A resumed session skips R and gives the wire format here ("D2C")
+        if (data[1] != '\0')
+          negotiate(data);
         free(data);
         begin = millis();
         generate_pacNIZKP();
@@ -0,0 +1,96 @@
+# Checks a proof packet has to pass before any elliptic-curve math, cheapest
+# first: size, device ID, range of the response, replay and commitment on the
+# curve. A rejected packet costs a few microseconds instead of the two scalar
+# multiplications of calculate_P, and each reason has its own counter.
+from collections import Counter, namedtuple
+import ec_jacobian
+from replay_filter import ReplayFilter
+
+# Sizes of the proof packet: commitment (64 bytes, or 33 compressed), response
+# (32), device ID (1) and data (16)
+packet_sizes = (113, 82)
+packet_tail_size = 49
+
+# Reasons a packet is rejected
+reject_framing = "framing"              # not a proof frame, or not hex
+reject_length = "length"                # not one of packet_sizes
+reject_unknown_device = "unknown_device"  # other device ID, or no key for the device
+reject_response_range = "response_range"  # response not in [1, n)
+reject_replay = "replay"                # commitment already seen for the device
+reject_off_curve = "off_curve"          # commitment not a point of the curve
+rejection_reasons = (reject_framing, reject_length, reject_unknown_device,
+                     reject_response_range, reject_replay, reject_off_curve)
+
+# Parts of a packet that passed the checks. commitment is the affine point,
+# commitment_x the bytes of its x coordinate as they are hashed.
+CheckedPacket = namedtuple("CheckedPacket", ["commitment", "commitment_x", "response", "device_id", "data"])
+
+
+# Runs the checks on a packet without counting anything. Returns
+# (CheckedPacket, None), or (None, reason) when the packet is rejected. With a
+# replay_filter, the commitment of an accepted packet is added to it.
+def screen_packet(packet_bytes, device_id, public_key_x, replay_filter=None):
+    size = len(packet_bytes)
+    if size not in packet_sizes:
+        return None, reject_length
+
+    split = size - packet_tail_size
+    packet_device_id = packet_bytes[split + 32]
+    if packet_device_id != device_id or public_key_x is None:
+        return None, reject_unknown_device
+
+    response = int.from_bytes(packet_bytes[split:split + 32], 'big')
+    if not 0 < response < ec_jacobian.n:
+        return None, reject_response_range
+
+    commitment = packet_bytes[:split]
+    commitment_x = bytes(commitment[1:] if split == 33 else commitment[:32])
+    replay_key = (packet_device_id, commitment_x)
+    if replay_filter is not None and replay_filter.seen(replay_key):
+        return None, reject_replay
+
+    if split == 33:
+        point = ec_jacobian.decompress(bytes(commitment))
+    else:
+        point = (int.from_bytes(commitment_x, 'big'), int.from_bytes(commitment[32:64], 'big'))
+        if not ec_jacobian.is_on_curve(*point):
+            point = None
+    if point is None:
+        return None, reject_off_curve
+
+    # Remembered before the proof is verified, so a replayed packet never
+    # reaches the elliptic-curve math, whatever its result was
+    if replay_filter is not None:
+        replay_filter.add(replay_key)
+    return CheckedPacket(point, commitment_x, response, packet_device_id, packet_bytes[split + 33:]), None
+
+
+# replay_filter remembers the commitments of the last proofs (replay_filter.py)
+class PacketValidator:
+    def __init__(self, replay_filter=None):
+        self.replay_filter = replay_filter if replay_filter is not None else ReplayFilter()
+        self.rejections = Counter()
+        self.accepted = 0
+        self.last_rejection = None
+
+    # Counts a rejected packet; returns None so callers can return it directly
+    def reject(self, reason):
+        self.rejections[reason] += 1
+        self.last_rejection = reason
+        return None
+
+    # Returns the CheckedPacket, or None (and counts the reason) when the packet
+    # cannot be a valid proof of the device. public_key_x is None when the key
+    # of the device is not known.
+    def check(self, packet_bytes, device_id, public_key_x):
+        checked, reason = screen_packet(packet_bytes, device_id, public_key_x, self.replay_filter)
+        if checked is None:
+            return self.reject(reason)
+        self.accepted += 1
+        return checked
+
+    # Counters of the validator, used for reporting
+    def stats(self):
+        stats = {reason: self.rejections[reason] for reason in rejection_reasons}
+        stats["accepted"] = self.accepted
+        return stats
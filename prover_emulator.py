@@ -0,0 +1,559 @@
+# Python emulator of the prover in nizkp_algorithm.ino, for running the verifier
+# without an Arduino. It keeps the same EEPROM layout, answers the R / I / K / D
+# commands with the same bytes as the sketch and delivers them the way the HM-10
+# bridge does: as BLE notifications of at most 20 bytes.
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import os
+import secrets
+from collections import namedtuple
+import ec_jacobian
+from ble_framing import (encode_frame, frame_header_size, frame_public_key, frame_proof, frame_time,
+                         protocol_v1, protocol_v2, capability_compressed, capability_identity,
+                         capability_binary_challenge, capability_key_ack, default_capabilities)
+from fixed_base import fixed_base_multiply
+from advertisement import advertisement_version, counter_size, manufacturer_id
+
+# Payload of a BLE notification from the HM-10
+notification_size = 20
+
+# Size of the buffer the sketch copies every command into (toCharArray(data, 130))
+command_buffer_size = 130
+
+# Timings measured on the Arduino Nano, in seconds (README, Preliminary Results)
+key_generation_time = 3.739
+# readString() returns after this long without new characters
+read_string_timeout = 1.0
+# send() waits this long after every 18 bytes of a packet
+send_pause = 0.5
+# send_frame() sends the same number of characters between pauses: 36 raw bytes
+# instead of 18 bytes as 36 hex digits
+frame_pause_bytes = 36
+# SoftwareSerial at 9600 baud, 10 bits per character
+character_time = 10 / 9600
+
+# Memory positions used by the sketch (see setup() in nizkp_algorithm.ino)
+EEPROM_PRIVATE_KEY = 1
+EEPROM_PUBLIC_KEY = 33
+EEPROM_ADM_PUBLIC_KEY = 97
+EEPROM_ID = 194
+EEPROM_COMMIT = 195
+EEPROM_ANSWER = 259
+EEPROM_WITNESS = 291
+EEPROM_DATA = 323
+EEPROM_REGISTRATION = 340
+
+hexchars = "0123456789ABCDEF"
+
+
+class ProverEmulator:
+    # time_scale multiplies every device-side delay: 1.0 behaves like the real
+    # board, 0.0 answers as fast as possible (for verifier load tests).
+    # max_protocol is the newest wire format of the firmware (1 = hex only) and
+    # capabilities the optional features it supports ("" for older firmware).
+    # uecc is a micro_ecc.MicroEcc (word size 1, as on the board) that makes the
+    # keys and the response with the sketch's own calls; None uses Python ints.
+    def __init__(self, name="MeuNovoNome", address="00:00:00:00:00:00", time_scale=0.0,
+                 max_protocol=protocol_v2, capabilities=default_capabilities + capability_binary_challenge,
+                 uecc=None):
+        self.name = name
+        self.address = address
+        self.time_scale = time_scale
+        self.max_protocol = max_protocol
+        self.supported_capabilities = capabilities
+        self.uecc = uecc
+        self.protocol = protocol_v1  # Wire format negotiated with the last R
+        self.compressed = False      # Points sent compressed, negotiated with the last R
+        self.identity_check = False  # I carries the verifier key fingerprint, negotiated with the last R
+        self.binary_challenge = False  # Challenge over the coordinate bytes, negotiated with the last R
+        self.key_ack = False         # K is answered with "RS1;", negotiated with the last R
+        self.advertisement_counter = 0  # Counter of the last advertised proof (advertisement.py)
+        self.eeprom = bytearray(1024)  # ATmega328P EEPROM
+        self._notify = None
+        self._pending = bytearray()
+        self._commands = None
+        self._loop_task = None
+        # setup(): EEPROM.put(340, 0)
+        self.eeprom_put(EEPROM_REGISTRATION, (0).to_bytes(2, "little"))
+
+    def eeprom_put(self, address, data):
+        self.eeprom[address:address + len(data)] = data
+
+    def eeprom_get(self, address, size):
+        return bytes(self.eeprom[address:address + size])
+
+    # Starts the loop() of the device; notify(data) receives every BLE notification
+    def start(self, notify):
+        self._notify = notify
+        self._commands = asyncio.Queue()
+        self._loop_task = asyncio.get_running_loop().create_task(self._device_loop())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        self._notify = None
+
+    # Bytes written by the verifier to the characteristic
+    def receive(self, data):
+        self._commands.put_nowait(bytes(data))
+
+    # delay() or computation on the board. While the UART is idle the HM-10
+    # sends whatever it has buffered as a shorter notification.
+    async def _delay(self, seconds):
+        await self._flush()
+        if self.time_scale > 0:
+            await asyncio.sleep(seconds * self.time_scale)
+
+    # bluetooth.print(): the bytes go out through the HM-10 in 20-byte notifications
+    async def _print(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        if self.time_scale > 0:
+            await asyncio.sleep(len(data) * character_time * self.time_scale)
+        self._pending += data
+        while len(self._pending) >= notification_size:
+            await self._flush(notification_size)
+
+    async def _flush(self, size=None):
+        size = len(self._pending) if size is None else size
+        if size == 0:
+            return
+        chunk = bytes(self._pending[:size])
+        del self._pending[:size]
+        if self._notify is not None:
+            result = self._notify(chunk)
+            if asyncio.iscoroutine(result):
+                await result
+
+    # loop(): readString() collects characters until one second passes without
+    # any; the first 129 characters become the command
+    async def _device_loop(self):
+        while True:
+            data = await self._commands.get()
+            while True:
+                try:
+                    timeout = read_string_timeout * self.time_scale
+                    if timeout > 0:
+                        data += await asyncio.wait_for(self._commands.get(), timeout)
+                    else:
+                        data += self._commands.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+            # toCharArray() copies up to the buffer size and String stops at NUL
+            data = data[:command_buffer_size - 1].split(b"\0", 1)[0]
+            if data:
+                await self.handle_command(data)
+                await self._flush()
+
+    async def handle_command(self, data):
+        command = data[:1]
+        if command == b"R":  # Registration request
+            await self.initial_action(data[1:2], data[2:])
+        elif command == b"I":  # Establishment of identification
+            await self.define_identification(data[1:])
+        elif command == b"K":  # Receiving the public key from the administrator device
+            self.process_adm_public_key(data[1:130])
+            self.eeprom_put(EEPROM_REGISTRATION, (1).to_bytes(2, "little"))
+            if self.key_ack:
+                await self.send_text("RS1")
+        elif command == b"D":  # Generation and transmission of NIZKP
+            # A resumed session skips R and gives the wire format here ("D2C")
+            if data[1:2]:
+                self.negotiate(data[1:2], data[2:])
+            self.generate_pac_nizkp()
+            await self._delay(key_generation_time)
+            await self.build_pac()
+        # Any other command only prints "Invalid Option" on the USB serial port
+
+    # send(operation): the text followed by println(';')
+    async def send_text(self, operation):
+        await self._print(operation + ";\r\n")
+
+    # send(seq, len, operation): hex encoding, pausing every 18 bytes
+    async def send_hex(self, seq, operation):
+        await self._print(operation)
+        for posn, value in enumerate(seq):
+            await self._print(hexchars[value >> 4] + hexchars[value & 0x0F])
+            if posn % 18 == 0:
+                await self._delay(send_pause)
+        await self._print(";\r\n")
+
+    # send_frame(type, payload, len): protocol v2 frame, pausing every 36 bytes
+    async def send_frame(self, frame_type, payload):
+        frame = encode_frame(frame_type, payload)
+        header_size = frame_header_size
+        await self._print(frame[:header_size])
+        for posn in range(len(payload)):
+            await self._print(frame[header_size + posn:header_size + posn + 1])
+            if posn % frame_pause_bytes == 0:
+                await self._delay(send_pause)
+        await self._print(frame[header_size + len(payload):])
+
+    # Wire format asked for after R or D: "2" for the binary format and "C" for
+    # compressed points. Returns the confirmation sent in the answer to R ("V2C"),
+    # empty for a plain "R".
+    def negotiate(self, version, capabilities):
+        self.protocol = protocol_v2 if version == b"2" and self.max_protocol >= protocol_v2 else protocol_v1
+        negotiated = version in (b"1", b"2")
+        self.compressed = (negotiated and capability_compressed in self.supported_capabilities
+                           and capability_compressed.encode() in capabilities)
+        self.identity_check = (negotiated and capability_identity in self.supported_capabilities
+                               and capability_identity.encode() in capabilities)
+        self.binary_challenge = (negotiated and capability_binary_challenge in self.supported_capabilities
+                                 and capability_binary_challenge.encode() in capabilities)
+        self.key_ack = (negotiated and capability_key_ack in self.supported_capabilities
+                        and capability_key_ack.encode() in capabilities)
+        if negotiated and (self.max_protocol >= protocol_v2 or self.supported_capabilities):
+            return (f"V{self.protocol}" + (capability_compressed if self.compressed else "")
+                    + (capability_identity if self.identity_check else "")
+                    + (capability_binary_challenge if self.binary_challenge else "")
+                    + (capability_key_ack if self.key_ack else ""))
+        return ""
+
+    async def initial_action(self, version, capabilities):
+        suffix = self.negotiate(version, capabilities)
+        if self.eeprom[EEPROM_REGISTRATION] == 0:
+            await self.send_text("RA" + suffix)
+            await self.generate_key_pair()
+        else:
+            await self.send_text("R1" + suffix)  # Device is already registered
+
+    # uECC_make_key(): random private key and its public key, both big-endian
+    def make_key(self):
+        if self.uecc is not None:
+            return self.uecc.make_key()
+        private_key = secrets.randbelow(ec_jacobian.n - 1) + 1
+        x, y = ec_jacobian.to_affine(fixed_base_multiply(private_key))
+        return x.to_bytes(32, "big") + y.to_bytes(32, "big"), private_key.to_bytes(32, "big")
+
+    # uECC_compress(): 0x02 / 0x03 (parity of y) followed by x
+    def compress(self, point):
+        if self.uecc is not None:
+            return self.uecc.compress(point)
+        return bytes([2 + (point[63] & 1)]) + point[:32]
+
+    async def generate_key_pair(self):
+        public_key, private_key = self.make_key()
+        await self._delay(key_generation_time)
+        self.eeprom_put(EEPROM_PRIVATE_KEY, private_key)
+        self.eeprom_put(EEPROM_PUBLIC_KEY, public_key)
+        await self._print(f"Time to generate the key pair:{key_generation_time:.3f}\r\n")
+
+    async def define_identification(self, data):
+        # atoi() of the two characters after 'I', recorded as an int (2 bytes)
+        digits = b""
+        for c in data[:2]:
+            if not 0x30 <= c <= 0x39:
+                break
+            digits += bytes([c])
+        device_id = int(digits) if digits else 0
+        self.eeprom_put(EEPROM_ID, device_id.to_bytes(2, "little"))
+        public_key = self.eeprom_get(EEPROM_PUBLIC_KEY, 64)
+        if self.compressed:
+            public_key = self.compress(public_key)  # uECC_compress()
+        if self.protocol == protocol_v2:
+            await self.send_frame(frame_public_key, public_key)
+        else:
+            await self.send_hex(public_key, "RK\n")
+
+        # "I10F<fingerprint>": tell whether the stored administrator key is the
+        # verifier's; if it is, the registration is complete without K
+        if self.identity_check and data[2:3] == capability_identity.encode():
+            stored = hashlib.sha256(self.eeprom_get(EEPROM_ADM_PUBLIC_KEY, 64)).digest()[:8]
+            if data[3:19] == stored.hex().upper().encode():
+                self.eeprom_put(EEPROM_REGISTRATION, (1).to_bytes(2, "little"))
+                await self.send_text("RF1")
+            else:
+                await self.send_text("RF0")
+
+    def process_adm_public_key(self, data):
+        # hexchars.indexOf() returns -1 (0xFF) for anything that is not an
+        # uppercase hex digit, and the sketch does not check it
+        hex_key = data[:128].ljust(128, b"\0")
+        pub_key_adm = bytearray(64)
+        for i in range(0, 128, 2):
+            high = hexchars.find(chr(hex_key[i])) & 0xFF
+            low = hexchars.find(chr(hex_key[i + 1])) & 0xFF
+            pub_key_adm[i // 2] = ((high << 4) + low) & 0xFF
+        self.eeprom_put(EEPROM_ADM_PUBLIC_KEY, pub_key_adm)
+
+    # generate_shared_point(), calc_challenge(), calc_mult_mod() and calc_add_mod()
+    def generate_pac_nizkp(self):
+        point, witness = self.make_key()
+        self.eeprom_put(EEPROM_COMMIT, point)
+        self.eeprom_put(EEPROM_WITNESS, witness)
+
+        # hash(G_x || Qd_x || R_x) over the uppercase hex strings, or over the
+        # bytes themselves with the binary challenge. G_x is read from
+        # uECC_curve_G() as the sketch does when micro-ecc is in use.
+        gx = self.uecc.generator_x() if self.uecc is not None else ec_jacobian.Gx.to_bytes(32, "big")
+        msg = (gx
+               + self.eeprom_get(EEPROM_PUBLIC_KEY, 32)
+               + self.eeprom_get(EEPROM_COMMIT, 32))
+        if not self.binary_challenge:
+            msg = msg.hex().upper().encode()
+        challenge_hash = hashlib.sha256(msg).digest()
+        self.eeprom_put(EEPROM_ANSWER, self.nizkp_response(challenge_hash, witness))
+
+    # calc_mult_mod() and calc_add_mod(): witness + hash * priK mod n, big-endian
+    def nizkp_response(self, challenge_hash, witness):
+        private_key = self.eeprom_get(EEPROM_PRIVATE_KEY, 32)
+        if self.uecc is not None:
+            return self.uecc.nizkp_response(challenge_hash, private_key, witness)
+        mult = int.from_bytes(challenge_hash, "big") * int.from_bytes(private_key, "big") % ec_jacobian.n
+        return ((int.from_bytes(witness, "big") + mult) % ec_jacobian.n).to_bytes(32, "big")
+
+    # Key pair and ID of an enrolled prover, without the delays of R and I; for
+    # provers that only advertise once enrolled
+    def provision(self, device_id):
+        public_key, private_key = self.make_key()
+        self.eeprom_put(EEPROM_PRIVATE_KEY, private_key)
+        self.eeprom_put(EEPROM_PUBLIC_KEY, public_key)
+        self.eeprom_put(EEPROM_ID, device_id.to_bytes(2, "little"))
+        self.eeprom_put(EEPROM_REGISTRATION, (1).to_bytes(2, "little"))
+        return ec_jacobian.decompress(self.compress(public_key))
+
+    # Manufacturer data of the next advertised proof: a fresh witness and the
+    # challenge hash(G_x || Qd_x || R_x || counter) over bytes (advertisement.py)
+    def advertisement(self):
+        self.advertisement_counter += 1
+        counter = self.advertisement_counter.to_bytes(counter_size, "big")
+        point, witness = self.make_key()
+        gx = self.uecc.generator_x() if self.uecc is not None else ec_jacobian.Gx.to_bytes(32, "big")
+        challenge_hash = hashlib.sha256(gx + self.eeprom_get(EEPROM_PUBLIC_KEY, 32) + point[:32] + counter).digest()
+        return (bytes([advertisement_version]) + self.eeprom_get(EEPROM_ID, 1) + counter
+                + self.compress(point) + self.nizkp_response(challenge_hash, witness))
+
+    async def build_pac(self):
+        self.eeprom_put(EEPROM_DATA, b"SuccessPayment!!\0")
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        commitment = self.eeprom_get(EEPROM_COMMIT, 64)
+        if self.compressed:
+            commitment = self.compress(commitment)
+        pac = (commitment
+               + self.eeprom_get(EEPROM_ANSWER, 32)
+               + self.eeprom_get(EEPROM_ID, 1)
+               + self.eeprom_get(EEPROM_DATA, 16))
+        if self.protocol == protocol_v2:
+            await self.send_frame(frame_proof, pac)
+            total = loop.time() - start
+            await self.send_frame(frame_time, int(total * 1000).to_bytes(4, "big"))
+        else:
+            await self.send_hex(pac, "PA")
+            total = loop.time() - start
+            await self._print(f"{total:.3f}\r\n")
+
+
+# Stand-in for BleakClient connected to an emulated prover
+class EmulatedBleakClient:
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.address = emulator.address
+        self.is_connected = False
+        self._callback = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.disconnect()
+
+    async def connect(self):
+        self.is_connected = True
+
+    async def disconnect(self):
+        await self.emulator.stop()
+        self.is_connected = False
+
+    async def start_notify(self, characteristic, callback):
+        self._callback = callback
+        self.emulator.start(self._deliver)
+
+    async def stop_notify(self, characteristic):
+        self._callback = None
+
+    async def _deliver(self, data):
+        if self._callback is not None:
+            result = self._callback(None, bytearray(data))
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def write_gatt_char(self, characteristic, data, response=None):
+        self.emulator.receive(data)
+
+
+# micro-ecc built with 8-bit words, the bit-exact arithmetic of the board (OSError if it cannot be built)
+def reference_prover():
+    import micro_ecc
+    return micro_ecc.MicroEcc(micro_ecc.word_size_avr)
+
+
+# Advertisement of an emulated prover, as returned by BleakScanner.discover()
+class EmulatedDevice:
+    def __init__(self, emulator):
+        self.name = emulator.name
+        self.address = emulator.address
+
+
+# A set of emulated provers that stands in for BleakScanner and BleakClient
+class EmulatedFleet:
+    def __init__(self, count, name="MeuNovoNome", time_scale=0.0, max_protocol=protocol_v2, use_micro_ecc=False):
+        uecc = reference_prover() if use_micro_ecc else None
+        self.provers = {}
+        for i in range(count):
+            address = f"EE:00:00:00:{i >> 8:02X}:{i & 0xFF:02X}"
+            self.provers[address] = ProverEmulator(name, address, time_scale, max_protocol, uecc=uecc)
+
+    # Same call as BleakScanner.discover()
+    async def discover(self):
+        return [EmulatedDevice(prover) for prover in self.provers.values()]
+
+    # Same call as BleakClient(address)
+    def client(self, address):
+        return EmulatedBleakClient(self.provers[address])
+
+
+# Advertisement data as bleak hands it to a detection callback
+EmulatedAdvertisementData = namedtuple("EmulatedAdvertisementData", ["local_name", "manufacturer_data", "rssi"])
+
+# Callbacks delivered between two yields to the event loop
+advertisement_batch = 64
+
+
+# A set of enrolled provers that broadcast their proofs in advertisements
+# (advertisement.py) and stand in for a passive BleakScanner. Every interval
+# seconds each prover makes a new proof and the scanner reports it repeats
+# times, spread over the interval, as a real scanner reports an advertisement
+# every time the prover repeats it.
+class AdvertisementFeed:
+    def __init__(self, count, interval=1.0, repeats=3, name="MeuNovoNome", use_micro_ecc=False):
+        uecc = reference_prover() if use_micro_ecc else None
+        self.interval = interval
+        self.repeats = repeats
+        self.provers = {}
+        for i in range(count):
+            address = f"EE:01:00:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}"
+            self.provers[address] = ProverEmulator(name, address, uecc=uecc)
+        self.advertised = 0  # Proofs made so far
+        self.delivered = 0   # Callbacks made so far
+
+    # Provisions every prover and enrolls it in registry, as an enrollment over a
+    # connection would
+    def enroll(self, registry):
+        addresses = list(self.provers)
+        for address, device_id in zip(addresses, registry.assign_device_ids(addresses)):
+            public_key = self.provers[address].provision(device_id)
+            registry.enroll(address, device_id, public_key, protocol_v2, capability_compressed)
+
+    # Same use as BleakScanner(callback): async with feed.scanner(callback)
+    @contextlib.asynccontextmanager
+    async def scanner(self, callback):
+        task = asyncio.ensure_future(self._broadcast(callback))
+        try:
+            yield self
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _broadcast(self, callback):
+        loop = asyncio.get_running_loop()
+        devices = {address: EmulatedDevice(prover) for address, prover in self.provers.items()}
+        next_round = loop.time()
+        while True:
+            payloads = []
+            for address, prover in self.provers.items():
+                payloads.append((devices[address], EmulatedAdvertisementData(
+                    prover.name, {manufacturer_id: prover.advertisement()}, -60)))
+                self.advertised += 1
+                if self.advertised % advertisement_batch == 0:
+                    await asyncio.sleep(0)
+            for repeat in range(self.repeats):
+                for device, advertisement_data in payloads:
+                    callback(device, advertisement_data)
+                    self.delivered += 1
+                    if self.delivered % advertisement_batch == 0:
+                        await asyncio.sleep(0)
+                await asyncio.sleep(max(next_round + self.interval * (repeat + 1) / self.repeats - loop.time(), 0))
+            next_round = max(next_round + self.interval, loop.time())
+
+
+# Serves an emulated prover on a pseudo-terminal, as if the board were wired to a
+# serial port; the verifier connects with --serial <port>
+class PtyProver:
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.port = None
+        self._master = None
+        self._slave = None
+
+    def start(self):
+        import pty
+        import tty
+        self._master, slave = pty.openpty()
+        tty.setraw(slave)
+        self._slave = slave
+        self.port = os.ttyname(slave)
+        self.emulator.start(self._send)
+        asyncio.get_running_loop().add_reader(self._master, self._on_readable)
+        return self.port
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master, 1024)
+        except OSError:
+            return
+        if data:
+            self.emulator.receive(data)
+
+    def _send(self, data):
+        os.write(self._master, data)
+
+    async def stop(self):
+        if self._master is not None:
+            asyncio.get_running_loop().remove_reader(self._master)
+            await self.emulator.stop()
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = None
+
+
+async def serve_pty(count, name, time_scale, max_protocol=protocol_v2, use_micro_ecc=False):
+    uecc = reference_prover() if use_micro_ecc else None
+    provers = [PtyProver(ProverEmulator(name, f"pty{i}", time_scale, max_protocol, uecc=uecc))
+               for i in range(count)]
+    ports = [prover.start() for prover in provers]
+    print("Emulated provers listening on: " + " ".join(ports))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for prover in provers:
+            await prover.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulated NIZKP provers on pseudo-terminals")
+    parser.add_argument("--count", type=int, default=1, help="number of emulated provers")
+    parser.add_argument("--name", default="MeuNovoNome", help="device name of the provers")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="1.0 reproduces the Arduino timings, 0.0 answers immediately")
+    parser.add_argument("--max-protocol", type=int, choices=[protocol_v1, protocol_v2], default=protocol_v2,
+                        help="newest wire format of the emulated firmware (1 = hex only)")
+    parser.add_argument("--micro-ecc", action="store_true",
+                        help="make the keys and proofs with micro-ecc built for 8-bit words, like the board")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_pty(args.count, args.name, args.time_scale, args.max_protocol, args.micro_ecc))
+    except KeyboardInterrupt:
+        pass
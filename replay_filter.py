@@ -0,0 +1,128 @@
+# Replay detection for proof commitments, keyed by (device ID, commitment x).
+#
+# A prover picks a new random commitment for every proof, so a key seen before
+# is a replayed packet. Two structures with fixed memory remember the keys:
+#  - an exact set of the most recent keys (no false positives), and
+#  - a time-windowed Bloom filter made of two generations of bits. Keys go into
+#    the current generation; every window seconds (or when it holds `capacity`
+#    keys) the current one becomes the previous one and the oldest is dropped,
+#    so a key is remembered between one and two windows (less when more than
+#    `capacity` keys arrive in a window).
+# A key found in the exact set is a replay. A key only found in the Bloom filter
+# is either an older replay or a false positive, which happens for a fresh proof
+# with probability error_rate; such a proof is rejected and the prover has to
+# send a new one.
+from collections import OrderedDict
+import hashlib
+import math
+import os
+import time
+
+# Keys inserted per window before the Bloom filter rotates early
+default_capacity = 65536
+
+# Probability that a fresh commitment is taken for a replay
+default_error_rate = 1e-6
+
+# Seconds a commitment is remembered at least (at most twice as long)
+default_window = 600.0
+
+# Keys of the exact set
+default_recent_size = 4096
+
+
+# Number of bits and of hash functions of a Bloom filter for capacity keys
+def bloom_parameters(capacity, error_rate):
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class ReplayFilter:
+    def __init__(self, capacity=default_capacity, error_rate=default_error_rate, window=default_window,
+                 recent_size=default_recent_size, clock=time.monotonic):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.recent_size = recent_size
+        self.clock = clock
+        # A key is looked up in both generations, each sized for half the error rate
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate / 2)
+        # Secret salt of the hash, so the bits a key sets cannot be computed in advance
+        self._salt = os.urandom(16)
+        self._current = bytearray((self.bits + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._inserted = 0
+        self._window_start = clock()
+        self._recent = OrderedDict()
+        self.exact_hits = 0
+        self.bloom_hits = 0
+        self.rotations = 0
+
+    # The bit positions of a key are (h1 + i * h2) mod bits for i < hashes
+    # (double hashing over one 128-bit keyed BLAKE2b digest)
+    def _hash(self, key):
+        device_id, commitment_x = key
+        digest = hashlib.blake2b(bytes([device_id]) + commitment_x, digest_size=16, key=self._salt).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    # Moves to the next generation when the window is over or the current one is full
+    def _rotate_if_due(self):
+        elapsed = self.clock() - self._window_start
+        if elapsed < self.window and self._inserted < self.capacity:
+            return
+        if elapsed >= 2 * self.window:
+            # Nothing in either generation is recent enough to keep
+            self._previous = bytearray(len(self._current))
+        else:
+            self._previous = self._current
+        self._current = bytearray(len(self._previous))
+        self._inserted = 0
+        self._window_start = self.clock()
+        self.rotations += 1
+
+    # Stops at the first clear bit, which for a fresh key is usually the first one
+    def _contains(self, bloom, h1, h2):
+        bits = self.bits
+        for _ in range(self.hashes):
+            position = h1 % bits
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+            h1 += h2
+        return True
+
+    # True when the key was (probably) seen in the last window
+    def seen(self, key):
+        if key in self._recent:
+            self.exact_hits += 1
+            return True
+        self._rotate_if_due()
+        h1, h2 = self._hash(key)
+        if self._contains(self._current, h1, h2) or self._contains(self._previous, h1, h2):
+            self.bloom_hits += 1
+            return True
+        return False
+
+    def add(self, key):
+        self._recent[key] = None
+        if len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+        self._rotate_if_due()
+        bloom = self._current
+        bits = self.bits
+        h1, h2 = self._hash(key)
+        for _ in range(self.hashes):
+            position = h1 % bits
+            bloom[position >> 3] |= 1 << (position & 7)
+            h1 += h2
+        self._inserted += 1
+
+    def __len__(self):
+        return len(self._recent)
+
+    # Counters and memory of the filter, used for reporting
+    def stats(self):
+        return {"exact_hits": self.exact_hits, "bloom_hits": self.bloom_hits, "rotations": self.rotations,
+                "bloom_bytes": 2 * len(self._current), "hashes": self.hashes}
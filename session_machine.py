@@ -0,0 +1,80 @@
+# Declarative sessions with a prover. Each Step names the command it sends, the
+# answer it expects and the deadline of that answer; its handler parses the
+# answer and names the next step. The next command goes out as soon as the
+# answer of the previous step is parsed: there are no fixed pauses between
+# commands and the receive buffer is never reset. Answers are taken from the
+# buffer in the order they arrive, so a late byte of one step cannot end up in
+# the answer of the next one, and complete answers that no step expects are
+# skipped (and counted) instead of blocking the session.
+from collections import namedtuple
+import asyncio
+import re
+from ble_framing import line_trailer
+
+# name: key of the step in the table.
+# command(state): bytes to send, or None for a step that only waits.
+# expect(state): the Expect of the answer, or None when the command gets no
+#   answer; the step then waits `deadline` seconds so the next command is not
+#   glued to it (readString() on the prover).
+# deadline: seconds the answer may take.
+# handle(state, answer): parses the answer (None on timeout) and returns the
+#   name of the next step, or None to end the session; may be a coroutine.
+Step = namedtuple("Step", ["name", "command", "expect", "deadline", "handle"])
+
+# A text answer: the first frame ending with ';' whose content matches pattern,
+# followed by trailer. frame_type is set instead for a protocol v2 binary frame
+# (0 accepts a frame of any type).
+Expect = namedtuple("Expect", ["pattern", "trailer", "frame_type"])
+
+# Value of Expect.frame_type that accepts any binary frame
+any_frame = 0
+
+
+def text_answer(pattern, trailer=line_trailer):
+    return Expect(re.compile(pattern), trailer, None)
+
+
+def frame_answer(frame_type=any_frame):
+    return Expect(None, None, frame_type)
+
+
+# Runs the steps from `first` until a handler returns None. reader is the
+# FrameReader the notifications of the transport are fed to. Returns the
+# (name, seconds) of every step, from sending its command to parsing its answer.
+async def run_steps(steps, first, transport, reader, state):
+    loop = asyncio.get_running_loop()
+    timings = []
+    name = first
+    while name is not None:
+        step = steps[name]
+        start = loop.time()
+        command = step.command(state) if step.command is not None else None
+        if command:
+            await transport.write(command)
+        expect = step.expect(state) if step.expect is not None else None
+        if expect is None:
+            answer = None
+            if step.deadline:
+                await asyncio.sleep(step.deadline)
+        else:
+            answer = await receive(reader, expect, step.deadline)
+        name = step.handle(state, answer)
+        if asyncio.iscoroutine(name):
+            name = await name
+        timings.append((step.name, loop.time() - start))
+    return timings
+
+
+# Waits for the answer described by expect, skipping the complete answers that
+# do not match it. Returns the answer (a bytearray, or a BinaryFrame), or None
+# when the deadline expires.
+async def receive(reader, expect, timeout):
+    if expect.frame_type is None:
+        return await reader.wait_for_answer(expect.pattern, expect.trailer, timeout)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        frame = await reader.wait_for_binary_frame(max(deadline - loop.time(), 0))
+        if frame is None or expect.frame_type in (any_frame, frame.type):
+            return frame
+        reader.skipped_frames += 1
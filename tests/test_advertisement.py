@@ -0,0 +1,160 @@
+# Connectionless authentication (advertisement.py) against emulated advertising
+# provers (prover_emulator.AdvertisementFeed)
+import asyncio
+import os
+import subprocess
+import sys
+import ec_jacobian
+from advertisement import AdvertisementVerifier, manufacturer_id, reject_busy, reject_off_curve, reject_stale
+from device_registry import DeviceRegistry
+from prover_emulator import AdvertisementFeed
+from verification import reject_invalid_proof
+from verify_pool import VerificationPool
+
+
+def enrolled(count=1, path=None):
+    feed = AdvertisementFeed(count)
+    registry = DeviceRegistry(path)
+    feed.enroll(registry)
+    return feed, registry
+
+
+def test_accepted_proof():
+    feed, registry = enrolled()
+    address, prover = next(iter(feed.provers.items()))
+    verifier = AdvertisementVerifier(registry)
+    assert verifier.receive(address, prover.advertisement()) is True
+    assert verifier.counters[address] == 1
+    assert verifier.authenticated[address] == 1
+
+
+def test_duplicate_dropped():
+    feed, registry = enrolled()
+    address, prover = next(iter(feed.provers.items()))
+    verifier = AdvertisementVerifier(registry)
+    data = prover.advertisement()
+    assert verifier.receive(address, data) is True
+    assert verifier.receive(address, data) is None
+    assert verifier.duplicates == 1
+    assert verifier.accepted == 1
+
+
+def test_stale_and_equal_counter():
+    feed, registry = enrolled()
+    address, prover = next(iter(feed.provers.items()))
+    verifier = AdvertisementVerifier(registry)
+    older = prover.advertisement()
+    assert verifier.receive(address, prover.advertisement()) is True
+    assert verifier.receive(address, older) is None
+
+    # A new proof under the counter that was just accepted
+    prover.advertisement_counter -= 1
+    assert verifier.receive(address, prover.advertisement()) is None
+    assert verifier.rejections[reject_stale] == 2
+    assert verifier.counters[address] == 2
+
+
+def test_forged_proofs_do_not_advance_counter():
+    feed, registry = enrolled(2)
+    (address, prover), (_, other) = feed.provers.items()
+    verifier = AdvertisementVerifier(registry)
+    assert verifier.receive(address, prover.advertisement()) is True
+
+    forged_response = bytearray(prover.advertisement())
+    forged_response[-1] ^= 1
+    assert verifier.receive(address, bytes(forged_response)) is False
+
+    # Commitment and response of another prover, under this prover's header
+    forged_commitment = prover.advertisement()[:6] + other.advertisement()[6:]
+    assert verifier.receive(address, forged_commitment) is False
+
+    # Counter raised after signing: the challenge no longer matches
+    forged_counter = bytearray(prover.advertisement())
+    forged_counter[2:6] = (1000).to_bytes(4, "big")
+    assert verifier.receive(address, bytes(forged_counter)) is False
+
+    off_curve = bytearray(prover.advertisement())
+    off_curve[6:39] = b"\x02" + (5).to_bytes(32, "big")
+    assert ec_jacobian.decompress(bytes(off_curve[6:39])) is None
+    assert verifier.receive(address, bytes(off_curve)) is None
+
+    assert verifier.rejections[reject_invalid_proof] == 3
+    assert verifier.rejections[reject_off_curve] == 1
+    assert verifier.counters[address] == 1
+    # A genuine proof after the forged ones is still accepted
+    assert verifier.receive(address, prover.advertisement()) is True
+
+
+# A proof turned away while the pool is behind comes back with the next repeat
+def test_busy_not_remembered():
+    feed, registry = enrolled(2)
+    (first, first_prover), (second, second_prover) = feed.provers.items()
+
+    async def scan():
+        async with VerificationPool(workers=1) as pool:
+            verifier = AdvertisementVerifier(registry, pool, max_in_flight=1)
+            data = second_prover.advertisement()
+            verifier.receive(first, first_prover.advertisement())
+            assert verifier.receive(second, data) is None
+            assert verifier.rejections[reject_busy] == 1
+            await verifier.drain()
+            assert await verifier.receive(second, data) is True
+            assert verifier.duplicates == 0
+            return verifier.stats()
+
+    stats = asyncio.run(scan())
+    assert stats["accepted"] == 2
+
+
+def test_counters_survive_reload(tmp_path):
+    path = str(tmp_path / "device_registry.json")
+    feed, registry = enrolled(path=path)
+    address, prover = next(iter(feed.provers.items()))
+    registry.save()
+    verifier = AdvertisementVerifier(registry)
+    older = prover.advertisement()
+    assert verifier.receive(address, prover.advertisement()) is True
+    verifier.save_counters()
+
+    restarted = AdvertisementVerifier(DeviceRegistry(path))
+    assert restarted.receive(address, older) is None
+    assert restarted.rejections[reject_stale] == 1
+    assert restarted.counters[address] == 2
+    assert restarted.receive(address, prover.advertisement()) is True
+
+
+# Every proof of the feed is verified once; its repeats are dropped
+def test_feed():
+    feed, registry = enrolled(20)
+    feed.interval = 0.05
+
+    payloads = set()
+
+    async def scan():
+        async with VerificationPool(workers=1) as pool:
+            verifier = AdvertisementVerifier(registry, pool)
+
+            def callback(device, advertisement_data):
+                payloads.add((device.address, advertisement_data.manufacturer_data[manufacturer_id]))
+                verifier.detection_callback(device, advertisement_data)
+
+            async with feed.scanner(callback):
+                await asyncio.sleep(0.3)
+            await verifier.drain()
+            return verifier
+
+    verifier = asyncio.run(scan())
+    assert verifier.accepted == len(payloads)
+    assert verifier.accepted >= 2 * 20
+    assert verifier.duplicates == feed.delivered - len(payloads)
+    assert len(verifier.authenticated) == 20
+    assert not verifier.rejections
+
+
+# Without the registry there is no key to check the advertised proofs against
+def test_advertisements_need_registry():
+    verifier_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "verifier.py")
+    result = subprocess.run([sys.executable, verifier_path, "--advertisements", "1", "--no-registry"],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 2
+    assert "--no-registry" in result.stderr
@@ -0,0 +1,66 @@
+# Batch verification with bisection (batch_verify.py)
+import random
+import ec_jacobian
+from batch_verify import Proof, verify_batch, verify_single
+from ec_msm import msm
+
+n = ec_jacobian.n
+G = (ec_jacobian.Gx, ec_jacobian.Gy)
+rng = random.Random(6)
+
+
+def point(k):
+    return ec_jacobian.to_affine(msm([k], [G]))
+
+
+def proofs(count, devices=3):
+    keys = [rng.randrange(1, n) for _ in range(devices)]
+    result = []
+    for i in range(count):
+        d = keys[i % devices]
+        w = rng.randrange(1, n)
+        sigma = rng.randrange(1, n)
+        result.append(Proof(point(w), (w + sigma * d) % n, sigma, point(d)))
+    return result
+
+
+def forge(proof):
+    return proof._replace(response=proof.response % (n - 1) + 1)
+
+
+def bad_indexes(results):
+    return [i for i, ok in enumerate(results) if not ok]
+
+
+def test_empty_batch():
+    assert verify_batch([]) == []
+
+
+def test_all_valid():
+    batch = proofs(9)
+    assert all(verify_single(proof) for proof in batch)
+    assert verify_batch(batch) == [True] * 9
+
+
+def test_one_bad_proof():
+    batch = proofs(9)
+    batch[4] = forge(batch[4])
+    assert bad_indexes(verify_batch(batch)) == [4]
+
+
+def test_several_bad_proofs():
+    batch = proofs(16)
+    bad = [0, 5, 6, 15]
+    for i in bad:
+        batch[i] = forge(batch[i])
+    assert bad_indexes(verify_batch(batch)) == bad
+
+
+# A valid proof moved to another key, and malformed proofs rejected before any sum
+def test_wrong_key_and_malformed():
+    batch = proofs(8)
+    batch[1] = batch[1]._replace(public_key=batch[2].public_key if batch[2].public_key != batch[1].public_key
+                                 else point(12345))
+    batch[3] = batch[3]._replace(response=0)
+    batch[6] = batch[6]._replace(commitment=(batch[6].commitment[0], batch[6].commitment[1] + 1))
+    assert bad_indexes(verify_batch(batch)) == [1, 3, 6]
@@ -0,0 +1,210 @@
+# FrameReader (ble_framing.py): frames split across notifications, the trailers
+# of the sketches, the buffer cap and its overflow policies, protocol v2 frames
+import asyncio
+import re
+import pytest
+from ble_framing import (FrameReader, aes_packet_trailer, crc16, encode_frame, frame_proof, frame_public_key,
+                         frame_time, hmac_packet_trailer, line_trailer, nizkp_packet_trailer,
+                         overflow_drop_newest, overflow_drop_oldest)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def chunks(data, size=20):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_frame_split_across_notifications():
+    async def receive():
+        reader = FrameReader()
+        frame = b"RK" + b"AB" * 64 + b";\r\n"
+
+        async def deliver():
+            for chunk in chunks(frame):
+                await asyncio.sleep(0)
+                reader.feed(chunk)
+
+        delivery = asyncio.ensure_future(deliver())
+        result = await reader.wait_for_frame(line_trailer, timeout=1.0)
+        await delivery
+        return result, frame
+
+    result, frame = run(receive())
+    assert result == frame
+
+
+# The trailer of every sketch, and the delimiter arriving before its trailer
+@pytest.mark.parametrize("trailer, tail", [
+    (line_trailer, b"\r\n"),
+    (nizkp_packet_trailer, b"\r\n1234.567\r\n"),
+    (hmac_packet_trailer, b"\r\n12.34"),
+    (aes_packet_trailer, b"\r\n  3.141592"),
+])
+def test_trailers(trailer, tail):
+    reader = FrameReader()
+    reader.feed(b"PA0102;")
+    assert reader.find_frame_end(trailer) is None
+    for byte in tail[:-1]:
+        reader.feed(bytes([byte]))
+        assert reader.find_frame_end(trailer) is None
+    reader.feed(tail[-1:])
+    assert reader.find_frame_end(trailer) == len(b"PA0102;") + len(tail)
+
+
+def test_frames_taken_in_order():
+    reader = FrameReader()
+    reader.feed(b"RA;\r\nRF1;\r\nRS")
+    assert run(reader.wait_for_frame(timeout=0)) == b"RA;\r\n"
+    assert run(reader.wait_for_frame(timeout=0)) == b"RF1;\r\n"
+    assert run(reader.wait_for_frame(timeout=0)) is None
+    assert reader.notification_data == b"RS"
+
+
+def test_drop_oldest():
+    reader = FrameReader(max_buffer=16, overflow=overflow_drop_oldest)
+    reader.feed(b"0123456789")
+    reader.feed(b"ABCDEFGHIJ")
+    assert reader.notification_data == b"456789ABCDEFGHIJ"
+    assert reader.dropped_bytes == 4
+    # A frame complete within the newest data still parses
+    reader.feed(b"RS1;\r\n")
+    assert reader.dropped_bytes == 10
+    assert run(reader.wait_for_answer(re.compile(rb"RS1"), timeout=0)) is not None
+
+
+def test_drop_oldest_chunk_larger_than_buffer():
+    reader = FrameReader(max_buffer=8, overflow=overflow_drop_oldest)
+    reader.feed(b"abc")
+    reader.feed(b"0123456789AB")
+    assert reader.notification_data == b"456789AB"
+    assert reader.dropped_bytes == 3 + 4
+
+
+def test_drop_newest():
+    reader = FrameReader(max_buffer=16, overflow=overflow_drop_newest)
+    reader.feed(b"0123456789")
+    reader.feed(b"ABCDEFGHIJ")
+    assert reader.notification_data == b"0123456789ABCDEF"
+    assert reader.dropped_bytes == 4
+    reader.feed(b"more")
+    assert reader.dropped_bytes == 8
+    # Consuming a frame makes room again
+    reader.reset()
+    reader.feed(b"RA;\r\n")
+    assert run(reader.wait_for_frame(timeout=0)) == b"RA;\r\n"
+
+
+def test_buffer_cap():
+    for overflow in (overflow_drop_oldest, overflow_drop_newest):
+        reader = FrameReader(max_buffer=64, overflow=overflow)
+        for chunk in chunks(bytes(range(256)) * 4, 19):
+            reader.feed(chunk)
+            assert len(reader.notification_data) <= 64
+        assert reader.dropped_bytes == 1024 - 64
+
+
+def test_timeout_keeps_partial_data():
+    reader = FrameReader()
+    reader.feed(b"PA01")
+    assert run(reader.wait_for_frame(timeout=0.01)) is None
+    reader.feed(b";\r\n")
+    assert run(reader.wait_for_frame(timeout=0)) == b"PA01;\r\n"
+
+
+# Protocol v2 frames: CRC16-XMODEM and resynchronisation
+def test_crc16_xmodem():
+    assert crc16(b"123456789") == 0x31C3
+
+
+def test_valid_binary_frame():
+    reader = FrameReader()
+    frame = encode_frame(frame_public_key, bytes(range(64)))
+    reader.feed(b"Time to generate the key pair:3.739\r\n" + frame)
+    result = run(reader.wait_for_binary_frame(timeout=0))
+    assert result.type == frame_public_key
+    assert bytes(result.payload) == bytes(range(64))
+    assert result.preamble == b"Time to generate the key pair:3.739\r\n"
+    assert reader.notification_data == b""
+
+
+def test_bad_crc_then_valid_frame():
+    reader = FrameReader()
+    corrupt = bytearray(encode_frame(frame_proof, b"\x11" * 82))
+    corrupt[10] ^= 0xFF
+    reader.feed(bytes(corrupt) + encode_frame(frame_time, (1234).to_bytes(4, "big")))
+    result = run(reader.wait_for_binary_frame(timeout=0))
+    assert result.type == frame_time
+    assert int.from_bytes(result.payload, "big") == 1234
+    assert reader.crc_errors == 1
+    assert result.preamble == bytes(corrupt)
+
+
+def test_truncated_frame():
+    reader = FrameReader()
+    frame = encode_frame(frame_proof, b"\x22" * 82)
+    reader.feed(frame[:40])
+    assert run(reader.wait_for_binary_frame(timeout=0.01)) is None
+    assert reader.crc_errors == 0
+    reader.feed(frame[40:])
+    assert bytes(run(reader.wait_for_binary_frame(timeout=0)).payload) == b"\x22" * 82
+
+
+def test_wrong_version_byte():
+    reader = FrameReader()
+    other_version = bytearray(encode_frame(frame_time, b"\x00\x00\x00\x01"))
+    other_version[1] = 3
+    reader.feed(bytes(other_version))
+    assert run(reader.wait_for_binary_frame(timeout=0)) is None
+    reader.feed(encode_frame(frame_time, b"\x00\x00\x00\x02"))
+    result = run(reader.wait_for_binary_frame(timeout=0))
+    assert bytes(result.payload) == b"\x00\x00\x00\x02"
+    assert result.preamble == bytes(other_version)
+
+
+# A length beyond the buffer cannot be a frame: the reader looks for the next one
+def test_oversized_length():
+    reader = FrameReader(max_buffer=256)
+    reader.feed(bytes([0xA5, 2, frame_proof, 0xFF, 0xFF]) + encode_frame(frame_time, b"\x00\x00\x00\x03"))
+    assert bytes(run(reader.wait_for_binary_frame(timeout=0)).payload) == b"\x00\x00\x00\x03"
+
+
+# A binary frame left in the buffer whose payload holds a ';' (without the
+# trailer after it) does not hide the text answer that follows
+def test_binary_frame_before_text_answer():
+    reader = FrameReader()
+    reader.feed(encode_frame(frame_time, b"\x00;\x01\x02") + b"RS1;\r\n")
+    assert run(reader.wait_for_answer(re.compile(rb"RS1"), timeout=0)) == b"RS1;\r\n"
+    assert reader.skipped_frames == 1
+    assert reader.notification_data == b""
+
+
+def test_binary_frame_arrives_before_text_answer():
+    async def receive():
+        reader = FrameReader()
+        data = b"RF1;\r\n" + encode_frame(frame_proof, b"\x3B" * 82) + b"RS1;\r\n"
+
+        async def deliver():
+            for chunk in chunks(data, 7):
+                await asyncio.sleep(0)
+                reader.feed(chunk)
+
+        delivery = asyncio.ensure_future(deliver())
+        result = await reader.wait_for_answer(re.compile(rb"RS1"), timeout=1.0)
+        await delivery
+        return reader, result
+
+    reader, result = run(receive())
+    assert result == b"RS1;\r\n"
+    assert reader.skipped_frames == 2
+
+
+# A binary frame is only taken once it is complete and its CRC holds
+def test_incomplete_binary_frame_before_text_answer():
+    reader = FrameReader()
+    frame = encode_frame(frame_time, b"\x00;\x01\x02")
+    reader.feed(frame[:8])
+    assert run(reader.wait_for_answer(re.compile(rb"RS1"), timeout=0.01)) is None
+    reader.feed(frame[8:] + b"RS1;\r\n")
+    assert run(reader.wait_for_answer(re.compile(rb"RS1"), timeout=0)) == b"RS1;\r\n"
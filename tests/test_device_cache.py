@@ -0,0 +1,69 @@
+# Bounded LRU cache of the device tables (device_cache.py)
+import ec_jacobian
+from device_cache import DeviceTableCache, table_size
+from ec_msm import WnafTable, msm
+
+G = (ec_jacobian.Gx, ec_jacobian.Gy)
+
+
+def public_key(private_key):
+    return ec_jacobian.to_affine(msm([private_key], [G]))
+
+
+keys = [public_key(k) for k in range(2, 8)]
+entry_size = max(table_size(WnafTable(x, y, 6)) for x, y in keys)
+
+
+def test_hit_and_miss():
+    cache = DeviceTableCache()
+    first = cache.get(*keys[0], device_id=10)
+    assert cache.get(*keys[0], device_id=10) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.get(ec_jacobian.Gx, ec_jacobian.Gy + 1, device_id=11) is None
+
+
+def test_eviction_order():
+    cache = DeviceTableCache(max_bytes=2 * entry_size + entry_size // 2)
+    cache.get(*keys[0], device_id=1)
+    cache.get(*keys[1], device_id=2)
+    cache.get(*keys[0], device_id=1)  # Device 1 is now the most recently used
+    cache.get(*keys[2], device_id=3)
+    assert cache.evictions == 1
+    assert cache.stats()["entries"] == 2
+    hits = cache.hits
+    cache.get(*keys[0], device_id=1)
+    cache.get(*keys[2], device_id=3)
+    assert cache.hits == hits + 2
+    cache.get(*keys[1], device_id=2)
+    assert cache.misses == 4
+
+
+def test_byte_cap():
+    cache = DeviceTableCache(max_bytes=3 * entry_size)
+    for device_id, key in enumerate(keys):
+        cache.get(*key, device_id=device_id)
+        assert cache.current_bytes <= cache.max_bytes
+    assert len(cache) == 3
+    assert cache.evictions == len(keys) - 3
+    assert cache.current_bytes == sum(table_size(cache.get(*key, device_id=device_id))
+                                      for device_id, key in list(enumerate(keys))[-3:])
+
+
+# The entry is always kept, even when it alone is over the cap
+def test_cap_smaller_than_an_entry():
+    cache = DeviceTableCache(max_bytes=1)
+    assert cache.get(*keys[0], device_id=1) is not None
+    assert cache.get(*keys[1], device_id=2) is not None
+    assert len(cache) == 1
+
+
+def test_new_key_and_invalidate():
+    cache = DeviceTableCache()
+    cache.get(*keys[0], device_id=1)
+    entry = cache.get(*keys[1], device_id=1)
+    assert (entry.x, entry.y) == keys[1]
+    assert len(cache) == 1
+    cache.invalidate(1)
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
+    cache.invalidate(1)
@@ -0,0 +1,74 @@
+# Durable registry of the enrolled provers (device_registry.py)
+import json
+import os
+from device_registry import DeviceRegistry, registry_version
+
+key = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+       0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+new_key = (1, 2)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "device_registry.json")
+    registry = DeviceRegistry(path)
+    assert registry.devices == {}
+    registry.enroll("AA:BB", 12, key, 2, "CFA", "00112233AABBCCDD")
+    registry.save()
+
+    record = DeviceRegistry(path).get("AA:BB")
+    assert record["device_id"] == 12
+    assert DeviceRegistry.public_key(record) == key
+    assert (record["protocol"], record["capabilities"], record["verifier_key"]) == (2, "CFA", "00112233AABBCCDD")
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+# A resumed proof was rejected: the prover is forgotten and enrolled again
+def test_reenrollment_persists(tmp_path):
+    path = str(tmp_path / "device_registry.json")
+    registry = DeviceRegistry(path)
+    registry.enroll("AA:BB", 12, key, 2, "CFA")
+    registry.save()
+
+    registry = DeviceRegistry(path)
+    registry.forget("AA:BB")
+    registry.enroll("AA:BB", 12, new_key, 1, "")
+    registry.update("AA:BB", verifier_key="FFEEDDCCBBAA9988")
+    registry.save()
+
+    record = DeviceRegistry(path).get("AA:BB")
+    assert DeviceRegistry.public_key(record) == new_key
+    assert (record["protocol"], record["capabilities"], record["verifier_key"]) == (1, "", "FFEEDDCCBBAA9988")
+
+
+def test_corrupt_file(tmp_path):
+    path = tmp_path / "device_registry.json"
+    path.write_text('{"version": 1, "devices": {"AA:BB": ')
+    registry = DeviceRegistry(str(path))
+    assert registry.devices == {}
+    registry.enroll("CC:DD", 10, key, 2, "C")
+    registry.save()
+    assert list(DeviceRegistry(str(path)).devices) == ["CC:DD"]
+
+
+def test_other_version_ignored(tmp_path):
+    path = tmp_path / "device_registry.json"
+    path.write_text(json.dumps({"version": registry_version + 1, "devices": {"AA:BB": {}}}))
+    assert DeviceRegistry(str(path)).devices == {}
+
+
+def test_memory_only():
+    registry = DeviceRegistry(None)
+    registry.enroll("AA:BB", 12, key, 2, "C")
+    registry.save()
+    assert registry.get("AA:BB") is not None
+    registry.update("unknown", device_id=1)
+    assert registry.get("unknown") is None
+
+
+# Enrolled provers keep their IDs; new ones get the next free ones
+def test_assign_device_ids():
+    registry = DeviceRegistry(None)
+    registry.enroll("B", 10, key, 2, "C")
+    assert registry.assign_device_ids(["A", "B", "C"]) == [11, 10, 12]
+    assert registry.assign_device_ids(["A"], first_device_id=99) == [99]
+    assert registry.assign_device_ids(["A", "C"], first_device_id=99) == [99, 0]
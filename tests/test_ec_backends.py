@@ -0,0 +1,83 @@
+# Elliptic-curve backends (ec_backends.py): every installed one computes the
+# same πG - σQd
+import pytest
+import ec_jacobian
+from ec_backends import EcBackend, backend_classes, benchmark_backend, create_backend
+from fixed_base import fixed_base_multiply
+
+private_key = 0x2B1F0E9D8C7B6A5948372615F4E3D2C1B0A99887766554433221100FFEEDDCCB
+public_key = ec_jacobian.to_affine(fixed_base_multiply(private_key))
+
+
+@pytest.fixture(params=list(backend_classes))
+def backend(request):
+    if not backend_classes[request.param].available():
+        pytest.skip(f"the library of the {request.param} backend is not installed")
+    return create_backend(request.param)
+
+
+# πG - σQd with the arithmetic of ec_jacobian; None at infinity
+def reference(response, challenge):
+    P = fixed_base_multiply((response - challenge * private_key) % ec_jacobian.n)
+    return None if ec_jacobian.is_infinity(P) else ec_jacobian.to_affine(P)
+
+
+@pytest.mark.parametrize("response, challenge", [
+    (0xC0FFEE, 0xDECAF),
+    (ec_jacobian.n - 1, 2 ** 256 - 1),
+    (1, 0),
+    (private_key * 3 % ec_jacobian.n, 3),  # πG = σQd: the point at infinity
+])
+def test_double_multiply(backend, response, challenge):
+    expected = reference(response, challenge)
+    Q = backend.point(*public_key)
+    result = backend.double_multiply(response, backend.generator(), -challenge, Q)
+    if expected is None:
+        assert result is None
+    else:
+        assert backend.equal(result, backend.point(*expected))
+
+
+@pytest.mark.parametrize("witness", [1, 0xC0FFEE, ec_jacobian.n - 1])
+def test_verify(backend, witness):
+    challenge = 0x6F5E4D3C2B1A09F8E7D6C5B4A39281706F5E4D3C2B1A09F8E7D6C5B4A3928170
+    commitment = ec_jacobian.to_affine(fixed_base_multiply(witness))
+    response = (witness + challenge * private_key) % ec_jacobian.n
+    key = backend.prepare_public_key(*public_key)
+    assert backend.verify(response, challenge, commitment, key)
+    assert not backend.verify(response + 1, challenge, commitment, key)
+    assert not backend.verify(response, challenge + 1, commitment, key)
+
+
+def test_point_validation(backend):
+    x, y = public_key
+    assert backend.point(x, y + 1) is None
+    assert backend.decode_point(b"\x02" + bytes(32)) is None
+    assert backend.decode_point(bytes(64)) is None
+    compressed = bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+    uncompressed = x.to_bytes(32, "big") + y.to_bytes(32, "big")
+    for data in (compressed, uncompressed, b"\x04" + uncompressed):
+        assert backend.equal(backend.decode_point(data), backend.point(x, y))
+
+
+def test_add_and_multiply(backend):
+    G = backend.generator()
+    assert backend.equal(backend.add(G, G), backend.multiply(2, G))
+    assert backend.multiply(ec_jacobian.n, G) is None
+    assert backend.add(None, G) is G
+    assert backend.add(backend.multiply(-1, G), G) is None
+
+
+@pytest.mark.parametrize("scalar", [1, 2, 3, ec_jacobian.n - 3, ec_jacobian.n - 2, ec_jacobian.n - 1])
+def test_multiply_edge_scalars(backend, scalar):
+    expected = ec_jacobian.to_affine(fixed_base_multiply(scalar))
+    assert backend.equal(backend.multiply(scalar, backend.generator()), backend.point(*expected))
+
+
+def test_benchmark(backend):
+    assert benchmark_backend(backend, 0.001) is not None
+
+
+def test_abstract():
+    with pytest.raises(TypeError):
+        EcBackend()
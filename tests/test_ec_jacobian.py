@@ -0,0 +1,54 @@
+# SEC1 compressed points (ec_jacobian.compress / decompress)
+import random
+import pytest
+import ec_jacobian
+from ec_jacobian import compress, decompress, p
+from ec_msm import msm
+
+G = (ec_jacobian.Gx, ec_jacobian.Gy)
+rng = random.Random(14)
+
+
+def random_point():
+    return ec_jacobian.to_affine(msm([rng.randrange(1, ec_jacobian.n)], [G]))
+
+
+@pytest.mark.parametrize("prefix", [2, 3])
+def test_round_trip(prefix):
+    for _ in range(64):
+        x, y = random_point()
+        if 2 + (y & 1) == prefix:
+            break
+    data = compress(x, y)
+    assert data[0] == prefix
+    assert decompress(data) == (x, y)
+    # The other prefix gives the negated point
+    assert decompress(bytes([prefix ^ 1]) + data[1:]) == (x, p - y)
+
+
+def test_generator():
+    assert decompress(compress(*G)) == G
+    assert compress(*G).hex().upper() == "0279BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798"
+
+
+@pytest.mark.parametrize("prefix", [0, 1, 4, 5, 0xFF])
+def test_bad_prefix(prefix):
+    assert decompress(bytes([prefix]) + compress(*G)[1:]) is None
+
+
+def test_bad_length():
+    assert decompress(compress(*G)[:32]) is None
+    assert decompress(compress(*G) + b"\x00") is None
+
+
+# x >= p is rejected even when x - p is the abscissa of a point
+def test_x_not_below_p():
+    x = next(x for x in range(1, 100) if decompress(b"\x02" + x.to_bytes(32, "big")) is not None)
+    assert x + p < 1 << 256
+    assert decompress(b"\x02" + (x + p).to_bytes(32, "big")) is None
+    assert decompress(b"\x02" + p.to_bytes(32, "big")) is None
+
+
+def test_not_on_curve():
+    x = next(x for x in range(1, 100) if decompress(b"\x02" + x.to_bytes(32, "big")) is None)
+    assert decompress(b"\x03" + x.to_bytes(32, "big")) is None
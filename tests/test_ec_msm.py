@@ -0,0 +1,104 @@
+# ec_msm and ec_glv against python-ecdsa, the arithmetic of the original
+# calculate_P(): πG - σQd must come out bit for bit the same
+import random
+import pytest
+from ecdsa import SECP256k1
+from ecdsa.ellipticcurve import INFINITY, Point
+import ec_glv
+import ec_jacobian
+from ec_msm import WnafTable, msm, pippenger_threshold, strauss
+from fixed_base import generator_wnaf_table
+
+n = ec_jacobian.n
+G = (ec_jacobian.Gx, ec_jacobian.Gy)
+generator = SECP256k1.generator
+rng = random.Random(20240607)
+
+edge_scalars = [0, 1, 2, n - 1, n - 2, ec_glv.lam, n - ec_glv.lam, ec_glv.lam * ec_glv.lam % n,
+                (n + 1) // 2, 1 << 128, (1 << 128) - 1, 1 << 255]
+random_scalars = [rng.randrange(n) for _ in range(20)]
+
+
+def random_point():
+    P = generator * rng.randrange(1, n)
+    return int(P.x()), int(P.y())
+
+
+def ecdsa_point(point):
+    return Point(SECP256k1.curve, point[0], point[1], n)
+
+
+# sum(scalars[i] * points[i]) with python-ecdsa, as an affine pair or None
+def reference(scalars, points):
+    total = INFINITY
+    for scalar, point in zip(scalars, points):
+        total = total + ecdsa_point(point) * (scalar % n)
+    if total == INFINITY:
+        return None
+    return int(total.x()), int(total.y())
+
+
+# calculate_P() of the original verifier (which fails on σ = 0, where σQd is
+# the point at infinity; a SHA-256 challenge is never 0 in practice)
+def calculate_P(response, challenge, Qd):
+    piG = generator * response
+    sigmaQd = ecdsa_point(Qd) * challenge
+    if sigmaQd == INFINITY:
+        P = piG
+    else:
+        P = piG + Point(SECP256k1.curve, sigmaQd.x(), (-sigmaQd.y()) % SECP256k1.curve.p())
+    if P == INFINITY:
+        return None
+    return int(P.x()), int(P.y())
+
+
+@pytest.mark.parametrize("k", edge_scalars + random_scalars)
+def test_glv_split_halves(k):
+    k1, k2 = ec_glv.decompose(k)
+    assert (k1 + k2 * ec_glv.lam - k) % n == 0
+    assert abs(k1) < 1 << 128
+    assert abs(k2) < 1 << 128
+
+
+@pytest.mark.parametrize("k", edge_scalars + random_scalars[:5])
+def test_single_multiplication(k):
+    Q = random_point()
+    assert ec_jacobian.to_affine(msm([k], [G], [generator_wnaf_table()])) == reference([k], [G])
+    assert ec_jacobian.to_affine(WnafTable(*Q).multiply(k)) == reference([k], [Q])
+    assert ec_jacobian.to_affine(strauss([k], [WnafTable(*Q)], use_glv=False)) == reference([k], [Q])
+
+
+def test_endomorphism_is_lambda():
+    Q = random_point()
+    assert ec_glv.endomorphism(*Q) == reference([ec_glv.lam], [Q])
+
+
+@pytest.mark.parametrize("response, challenge", [(k, s) for k in edge_scalars[:6] for s in edge_scalars[:6]]
+                         + [(rng.randrange(n), rng.randrange(n)) for _ in range(10)])
+def test_calculate_P(response, challenge):
+    Qd = random_point()
+    result = msm([response, -challenge], [G, Qd], [generator_wnaf_table(), WnafTable(*Qd, 6)])
+    assert ec_jacobian.to_affine(result) == calculate_P(response, challenge, Qd)
+
+
+# Terms that cancel: πG - σQd is infinity when the proof is built from σ and d only
+@pytest.mark.parametrize("count", [2, 3, pippenger_threshold])
+def test_cancellation_to_infinity(count):
+    d = rng.randrange(1, n)
+    Qd = ec_jacobian.to_affine(msm([d], [G]))
+    sigma = rng.randrange(1, n)
+    assert ec_jacobian.is_infinity(msm([sigma * d, -sigma], [G, Qd]))
+    assert calculate_P(sigma * d % n, sigma, Qd) is None
+
+    points = [random_point() for _ in range(count // 2)]
+    scalars = [rng.randrange(n) for _ in points]
+    total = msm(scalars + [-k for k in scalars], points + points)
+    assert ec_jacobian.is_infinity(total)
+
+
+# Both sides of the switch from Strauss to Pippenger
+@pytest.mark.parametrize("count", [pippenger_threshold - 1, pippenger_threshold, pippenger_threshold + 1])
+def test_pippenger_threshold(count):
+    points = [random_point() for _ in range(count)]
+    scalars = [rng.randrange(n) for _ in range(count - 3)] + [0, 1, n - 1]
+    assert ec_jacobian.to_affine(msm(scalars, points)) == reference(scalars, points)
@@ -0,0 +1,98 @@
+# micro-ecc loaded with ctypes (micro_ecc.py), checked against ec_jacobian.
+# Skipped when the library cannot be built or loaded.
+import pytest
+import ec_jacobian
+import micro_ecc
+from fixed_base import fixed_base_multiply
+
+private_key = 0x2B1F0E9D8C7B6A5948372615F4E3D2C1B0A99887766554433221100FFEEDDCCB
+
+
+@pytest.fixture(params=[micro_ecc.word_size_avr, micro_ecc.word_size_host], ids=["avr", "host"])
+def uecc(request):
+    if not micro_ecc.available(request.param):
+        pytest.skip("micro-ecc cannot be built or loaded")
+    return micro_ecc.MicroEcc(request.param)
+
+
+# 64-byte big-endian public key of k * G
+def public_key(k):
+    x, y = ec_jacobian.to_affine(fixed_base_multiply(k))
+    return x.to_bytes(32, "big") + y.to_bytes(32, "big")
+
+
+def test_curve(uecc):
+    assert uecc.generator_x() == ec_jacobian.Gx.to_bytes(32, "big")
+    assert micro_ecc.reverse(uecc.n) == ec_jacobian.n.to_bytes(32, "big")
+
+
+@pytest.mark.parametrize("k", [2, 3, private_key, ec_jacobian.n - 3])
+def test_compute_public_key(uecc, k):
+    assert uecc.compute_public_key(k.to_bytes(32, "big")) == public_key(k)
+
+
+# Out of range, or where the co-Z ladder meets the point at infinity (uECC_make_key() draws again)
+@pytest.mark.parametrize("k", [0, 1, ec_jacobian.n - 2, ec_jacobian.n - 1, ec_jacobian.n])
+def test_compute_public_key_rejected(uecc, k):
+    assert uecc.compute_public_key(k.to_bytes(32, "big")) is None
+
+
+def test_make_key(uecc):
+    key, secret = uecc.make_key()
+    assert key == public_key(int.from_bytes(secret, "big"))
+    assert uecc.valid_public_key(key)
+
+
+def test_valid_public_key(uecc):
+    key = public_key(private_key)
+    assert uecc.valid_public_key(key)
+    assert not uecc.valid_public_key(key[:63] + bytes([key[63] ^ 1]))
+    assert not uecc.valid_public_key(bytes(64))
+    # x + p is the same residue but not a valid coordinate
+    x = int.from_bytes(key[:32], "big")
+    if x + ec_jacobian.p < 2 ** 256:
+        assert not uecc.valid_public_key((x + ec_jacobian.p).to_bytes(32, "big") + key[32:])
+
+
+# uECC_valid_point() works on native points (little-endian coordinates)
+def test_valid_point(uecc):
+    key = public_key(private_key)
+    native = micro_ecc.reverse(key[:32]) + micro_ecc.reverse(key[32:])
+    assert uecc.valid_point(native)
+    assert uecc.valid_point(uecc.G)
+    assert not uecc.valid_point(native[:32] + bytes([native[32] ^ 1]) + native[33:])
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, private_key, ec_jacobian.n - 1])
+def test_compress_and_decompress(uecc, k):
+    key = public_key(k)
+    compressed = uecc.compress(key)
+    y = int.from_bytes(key[32:], "big")
+    assert compressed == bytes([2 + (y & 1)]) + key[:32]
+    assert ec_jacobian.decompress(compressed) == (int.from_bytes(key[:32], "big"), y)
+    assert uecc.decompress(compressed) == key
+
+
+# Both parities of the same x
+def test_decompress_parity(uecc):
+    x, y = ec_jacobian.to_affine(fixed_base_multiply(private_key))
+    for prefix in (2, 3):
+        compressed = bytes([prefix]) + x.to_bytes(32, "big")
+        expected_x, expected_y = ec_jacobian.decompress(compressed)
+        assert expected_y & 1 == prefix & 1
+        assert uecc.decompress(compressed) == expected_x.to_bytes(32, "big") + expected_y.to_bytes(32, "big")
+
+
+@pytest.mark.parametrize("k", [2, 3, private_key, ec_jacobian.n - 3])
+def test_point_mult(uecc, k):
+    native = uecc.point_mult(uecc.G, k.to_bytes(32, "little"))
+    assert micro_ecc.reverse(native[:32]) + micro_ecc.reverse(native[32:]) == public_key(k)
+
+
+# calc_mult_mod() and calc_add_mod() of the sketch
+def test_nizkp_response(uecc):
+    challenge_hash = bytes(range(32))
+    witness = 0x3C4B5A69788796A5B4C3D2E1F0E1D2C3B4A5968778695A4B3C2D1E0F1A2B3C4D
+    response = uecc.nizkp_response(challenge_hash, private_key.to_bytes(32, "big"), witness.to_bytes(32, "big"))
+    expected = (witness + int.from_bytes(challenge_hash, "big") * private_key) % ec_jacobian.n
+    assert response == expected.to_bytes(32, "big")
@@ -0,0 +1,105 @@
+# Checks of a proof packet before the curve math (packet_validation.py)
+import pytest
+import ec_jacobian
+from fixed_base import fixed_base_multiply
+from packet_validation import (PacketValidator, reject_length, reject_off_curve, reject_replay,
+                               reject_response_range, reject_unknown_device, rejection_reasons)
+
+device_id = 10
+public_key_x = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
+data = b"SuccessPayment!!"
+
+
+# Packet of the commitment k * G: compressed (82 bytes) or not (113 bytes)
+def packet(k=7, response=12345, compressed=True, packet_device_id=device_id):
+    x, y = ec_jacobian.to_affine(fixed_base_multiply(k))
+    if compressed:
+        commitment = bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+    else:
+        commitment = x.to_bytes(32, "big") + y.to_bytes(32, "big")
+    return commitment + response.to_bytes(32, "big") + bytes([packet_device_id]) + data
+
+
+# An x coordinate with no point on the curve
+def off_curve_x():
+    x = 5
+    while ec_jacobian.decompress(b"\x02" + x.to_bytes(32, "big")) is not None:
+        x += 1
+    return x
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+def test_accepted(compressed):
+    validator = PacketValidator()
+    checked = validator.check(packet(compressed=compressed), device_id, public_key_x)
+    assert checked.commitment == ec_jacobian.to_affine(fixed_base_multiply(7))
+    assert checked.commitment_x == checked.commitment[0].to_bytes(32, "big")
+    assert (checked.response, checked.device_id, checked.data) == (12345, device_id, data)
+    assert validator.accepted == 1
+    assert sum(validator.rejections.values()) == 0
+    assert validator.last_rejection is None
+
+
+def bad_prefix():
+    return b"\x04" + packet()[1:]
+
+
+def off_curve_compressed():
+    return b"\x02" + off_curve_x().to_bytes(32, "big") + packet()[33:]
+
+
+def off_curve_uncompressed():
+    valid = packet(compressed=False)
+    return valid[:63] + bytes([valid[63] ^ 1]) + valid[64:]
+
+
+@pytest.mark.parametrize("make_packet, key_x, reason", [
+    (lambda: b"", public_key_x, reject_length),
+    (lambda: packet()[:-1], public_key_x, reject_length),
+    (lambda: packet(compressed=False) + b"\0", public_key_x, reject_length),
+    (lambda: packet(packet_device_id=device_id + 1), public_key_x, reject_unknown_device),
+    (lambda: packet(), None, reject_unknown_device),
+    (lambda: packet(response=0), public_key_x, reject_response_range),
+    (lambda: packet(response=ec_jacobian.n), public_key_x, reject_response_range),
+    (lambda: packet(compressed=False, response=2 ** 256 - 1), public_key_x, reject_response_range),
+    (bad_prefix, public_key_x, reject_off_curve),
+    (off_curve_compressed, public_key_x, reject_off_curve),
+    (off_curve_uncompressed, public_key_x, reject_off_curve),
+])
+def test_rejected(make_packet, key_x, reason):
+    validator = PacketValidator()
+    assert validator.check(make_packet(), device_id, key_x) is None
+    assert validator.last_rejection == reason
+    assert validator.rejections[reason] == 1
+    assert sum(validator.rejections.values()) == 1
+    assert validator.accepted == 0
+    assert validator.stats()[reason] == 1
+
+
+# The same commitment twice: the second packet is a replay, even with another response
+def test_replay():
+    validator = PacketValidator()
+    assert validator.check(packet(response=1), device_id, public_key_x) is not None
+    assert validator.check(packet(response=2), device_id, public_key_x) is None
+    assert validator.last_rejection == reject_replay
+    assert validator.rejections[reject_replay] == 1
+    assert validator.check(packet(k=8), device_id, public_key_x) is not None
+    assert validator.accepted == 2
+
+
+# A rejected packet is not remembered, so it is not a replay when it comes back valid
+def test_rejected_not_remembered():
+    validator = PacketValidator()
+    assert validator.check(packet(response=0), device_id, public_key_x) is None
+    assert validator.check(packet(), device_id, public_key_x) is not None
+
+
+def test_stats():
+    validator = PacketValidator()
+    validator.check(packet(), device_id, public_key_x)
+    validator.check(packet()[:-1], device_id, public_key_x)
+    validator.check(packet()[:-1], device_id, public_key_x)
+    stats = validator.stats()
+    assert set(stats) == set(rejection_reasons) | {"accepted"}
+    assert stats[reject_length] == 2
+    assert stats["accepted"] == 1
@@ -0,0 +1,113 @@
+# Replay detection of proof commitments (replay_filter.py)
+import math
+import pytest
+from replay_filter import ReplayFilter, bloom_parameters
+
+
+# Clock of a filter, moved by hand
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def key(i, device_id=10):
+    return device_id, i.to_bytes(32, "big")
+
+
+def test_fresh_keys_pass():
+    replay_filter = ReplayFilter(capacity=1000)
+    for i in range(500):
+        assert not replay_filter.seen(key(i))
+        replay_filter.add(key(i))
+    assert not replay_filter.seen(key(500))
+    assert not replay_filter.seen(key(0, device_id=11))
+    assert replay_filter.stats()["exact_hits"] == replay_filter.stats()["bloom_hits"] == 0
+
+
+def test_replay_in_window():
+    clock = Clock()
+    replay_filter = ReplayFilter(window=60, clock=clock)
+    replay_filter.add(key(1))
+    clock.now = 59
+    assert replay_filter.seen(key(1))
+    assert replay_filter.exact_hits == 1
+
+
+# A key that left the exact set is still found in the Bloom filter
+def test_exact_set_to_bloom_filter():
+    replay_filter = ReplayFilter(recent_size=2)
+    for i in range(3):
+        replay_filter.add(key(i))
+    assert len(replay_filter) == 2
+    assert replay_filter.seen(key(0))
+    assert (replay_filter.exact_hits, replay_filter.bloom_hits) == (0, 1)
+    assert replay_filter.seen(key(2))
+    assert (replay_filter.exact_hits, replay_filter.bloom_hits) == (1, 1)
+
+
+# Remembered in the current generation, then in the previous one, then dropped
+def test_forgotten_after_two_rotations():
+    clock = Clock()
+    replay_filter = ReplayFilter(window=60, recent_size=0, clock=clock)
+    replay_filter.add(key(1))
+    clock.now = 60
+    assert replay_filter.seen(key(1))
+    assert replay_filter.rotations == 1
+    clock.now = 120
+    assert not replay_filter.seen(key(1))
+    assert replay_filter.rotations == 2
+
+
+# No key for two windows: both generations are dropped at once
+def test_idle_for_two_windows():
+    clock = Clock()
+    replay_filter = ReplayFilter(window=60, recent_size=0, clock=clock)
+    replay_filter.add(key(1))
+    clock.now = 125
+    assert not replay_filter.seen(key(1))
+    assert replay_filter.rotations == 1
+
+
+# capacity keys in a window rotate the filter early
+def test_rotation_when_full():
+    replay_filter = ReplayFilter(capacity=10, recent_size=0, clock=Clock())
+    for i in range(10):
+        replay_filter.add(key(i))
+    assert replay_filter.rotations == 0
+    assert replay_filter.seen(key(0))
+    assert replay_filter.rotations == 1
+    for i in range(10, 20):
+        replay_filter.add(key(i))
+    assert not replay_filter.seen(key(0))
+    assert replay_filter.seen(key(10))
+
+
+@pytest.mark.parametrize("capacity, error_rate", [(1000, 0.01), (65536, 1e-6), (100, 1e-9)])
+def test_bloom_parameters(capacity, error_rate):
+    bits, hashes = bloom_parameters(capacity, error_rate)
+    assert (1 - math.exp(-hashes * capacity / bits)) ** hashes <= error_rate * 1.05
+    assert bits <= -capacity * math.log(error_rate) / math.log(2) ** 2 + 1
+
+
+# Fresh keys taken for replays with both generations full, at about error_rate
+def test_false_positive_rate():
+    error_rate = 0.02
+    capacity = 2000
+    replay_filter = ReplayFilter(capacity=capacity, error_rate=error_rate, recent_size=0, clock=Clock())
+    inserted = 2 * capacity - 1
+    for i in range(inserted):
+        replay_filter.add(key(i))
+    queries = 20000
+    false_positives = sum(replay_filter.seen(key(i)) for i in range(inserted, inserted + queries))
+    assert replay_filter.rotations == 1
+    assert error_rate / 2 < false_positives / queries < error_rate * 1.5
+
+
+def test_error_rate_checked():
+    with pytest.raises(ValueError):
+        ReplayFilter(error_rate=0)
+    with pytest.raises(ValueError):
+        ReplayFilter(error_rate=1)
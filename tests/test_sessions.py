@@ -0,0 +1,197 @@
+# Sessions of the verifier (verifier.run_session) against emulated provers
+# (prover_emulator.EmulatedFleet), at time scale 0
+import asyncio
+import pytest
+import verifier
+import verifier_identity
+from ble_framing import (capability_binary_challenge, capability_compressed, capability_identity, capability_key_ack,
+                         default_capabilities, encode_frame, frame_crc_size, frame_header_size, frame_proof, protocol_v1,
+                         protocol_v2)
+from device_registry import DeviceRegistry
+from prover_emulator import EmulatedFleet, ProverEmulator
+from transport import BleTransport
+from verify_pool import VerificationPool
+
+
+# The verifier key of the tests lives in a temporary directory
+@pytest.fixture(autouse=True)
+def verifier_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(verifier_identity, "_identity", None)
+    verifier_identity.load_identity(str(tmp_path / "verifier_identity.key"))
+
+
+# Runs one session with the prover of address and returns its SessionContext
+def run(fleet, address, registry=None, continuous=None, protocol=protocol_v2, capabilities=default_capabilities):
+    async def session():
+        async with VerificationPool(workers=1) as pool:
+            state = verifier.SessionContext(address, 10, protocol, capabilities)
+            await verifier.run_session(state, pool, lambda address: BleTransport(address, fleet.client),
+                                       registry, continuous)
+            return state
+    return asyncio.run(session())
+
+
+def test_protocol_v2():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    state = run(fleet, address)
+    assert state.authenticated
+    assert state.protocol == protocol_v2
+    for capability in (capability_compressed, capability_identity, capability_key_ack):
+        assert capability in state.capabilities
+    assert state.verifier_key_sent
+
+
+# Firmware from before the negotiation: hex answers, no capabilities
+def test_legacy_firmware():
+    fleet = EmulatedFleet(1, max_protocol=protocol_v1)
+    address, = fleet.provers
+    fleet.provers[address].supported_capabilities = ""
+    state = run(fleet, address)
+    assert state.authenticated
+    assert state.protocol == protocol_v1
+    assert state.capabilities == ""
+
+
+def test_protocol_v1_offered():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    state = run(fleet, address, protocol=protocol_v1)
+    assert state.authenticated
+
+
+def test_resume_from_registry():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    registry = DeviceRegistry(None)
+    first = run(fleet, address, registry)
+    assert first.authenticated and not first.resumed
+    record = registry.get(address)
+    assert record is not None
+
+    second = run(fleet, address, registry)
+    assert second.authenticated
+    assert second.resumed
+    assert not second.verifier_key_sent
+    assert registry.get(address)["public_key"] == record["public_key"]
+
+
+# The board was reflashed: new key, not registered. The resumed proof fails and
+# the prover is enrolled again with its new key.
+def test_reenrollment_after_reflash():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    registry = DeviceRegistry(None)
+    assert run(fleet, address, registry).authenticated
+    old_key = registry.get(address)["public_key"]
+
+    fleet.provers[address] = ProverEmulator(address=address)
+    state = run(fleet, address, registry)
+    assert state.authenticated
+    assert not state.resumed
+    assert state.verifier_key_sent
+    assert registry.get(address)["public_key"] != old_key
+    assert registry.get(address)["public_key"] == f"{state.Qd_x_int:064X}{state.Qd_y_int:064X}"
+
+
+# --proofs 3: the proof of the enrollment and two more, each verified once
+def test_continuous_proof_count():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+
+    async def session():
+        async with VerificationPool(workers=1) as pool:
+            state = verifier.SessionContext(address)
+            await verifier.run_session(state, pool, lambda address: BleTransport(address, fleet.client),
+                                       continuous=verifier.ContinuousMode(0, 3))
+            return state, pool.cache_stats()
+
+    state, cache = asyncio.run(session())
+    assert state.authenticated
+    assert state.proofs == 3
+    assert state.valid_proofs == 3
+    assert cache["hits"] + cache["misses"] == 3
+
+
+# Capability H: the challenge hashes the coordinate bytes instead of their hex
+def test_binary_challenge():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    state = run(fleet, address, capabilities=default_capabilities + capability_binary_challenge)
+    assert state.authenticated
+    assert capability_binary_challenge in state.capabilities
+    assert fleet.provers[address].binary_challenge
+
+
+def test_binary_challenge_not_offered():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    state = run(fleet, address)
+    assert state.authenticated
+    assert capability_binary_challenge not in state.capabilities
+    assert not fleet.provers[address].binary_challenge
+
+
+def test_binary_challenge_not_supported():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    fleet.provers[address].supported_capabilities = default_capabilities
+    state = run(fleet, address, capabilities=default_capabilities + capability_binary_challenge)
+    assert state.authenticated
+    assert capability_binary_challenge not in state.capabilities
+
+
+# The prover confirms H but hashes the hex digits: the challenges differ
+def test_binary_challenge_mismatch():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    prover = fleet.provers[address]
+    negotiate = prover.negotiate
+
+    def hex_challenge(version, capabilities):
+        confirmation = negotiate(version, capabilities)
+        prover.binary_challenge = False
+        return confirmation
+
+    prover.negotiate = hex_challenge
+    state = run(fleet, address, capabilities=default_capabilities + capability_binary_challenge)
+    assert capability_binary_challenge in state.capabilities
+    assert not state.authenticated
+
+
+# Replaces the proof frame of the prover of address by corrupt(frame)
+def corrupt_proof_frame(fleet, address, corrupt):
+    prover = fleet.provers[address]
+    send_frame = prover.send_frame
+
+    async def corrupted(frame_type, payload):
+        if frame_type != frame_proof:
+            return await send_frame(frame_type, payload)
+        await prover._print(corrupt(encode_frame(frame_type, payload)))
+
+    prover.send_frame = corrupted
+
+
+# A proof altered with a valid CRC reaches the curve math and is rejected there
+def test_corrupted_proof():
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+
+    def flip_response(frame):
+        payload = bytearray(frame[frame_header_size:-frame_crc_size])
+        payload[33 + 31] ^= 1  # Last byte of the response, after the compressed R
+        return encode_frame(frame_proof, bytes(payload))
+
+    corrupt_proof_frame(fleet, address, flip_response)
+    assert not run(fleet, address).authenticated
+
+
+# A proof frame with a bad CRC is dropped: the session times out without a proof
+def test_proof_frame_bad_crc(monkeypatch):
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+    corrupt_proof_frame(fleet, address, lambda frame: frame[:-1] + bytes([frame[-1] ^ 1]))
+    monkeypatch.setitem(verifier.session_steps, "proof", verifier.session_steps["proof"]._replace(deadline=0.5))
+    state = run(fleet, address)
+    assert not state.authenticated
+    assert state.verification is None
@@ -0,0 +1,95 @@
+# Headless verification of proof packets (verification.py)
+import hashlib
+import pytest
+import ec_jacobian
+from challenge import hash_mode_binary, hash_mode_hex
+from fixed_base import fixed_base_multiply
+from packet_validation import (PacketValidator, reject_length, reject_off_curve, reject_replay,
+                               reject_response_range, reject_unknown_device)
+from verification import DeviceContext, reject_invalid_proof, verify_proof
+
+device_id = 10
+private_key = 0x1E99423A4ED27608A15A2616A2B0E9E52CED330AC530EDCC32C8FFC6A526AEDD
+public_key = ec_jacobian.to_affine(fixed_base_multiply(private_key))
+data = b"SuccessPayment!!"
+
+
+# σ as calc_challenge() in the sketch computes it
+def sketch_challenge(commitment_x, mode):
+    coordinates = (ec_jacobian.Gx, public_key[0], commitment_x)
+    if mode == hash_mode_binary:
+        message = b"".join(value.to_bytes(32, "big") for value in coordinates)
+    else:
+        message = "".join(f"{value:064X}" for value in coordinates).encode()
+    return int.from_bytes(hashlib.sha256(message).digest(), "big")
+
+
+# Compressed packet of a proof with witness k; response overrides π
+def proof_packet(k=0xC0FFEE, mode=hash_mode_hex, response=None):
+    x, y = ec_jacobian.to_affine(fixed_base_multiply(k))
+    if response is None:
+        response = (k + sketch_challenge(x, mode) * private_key) % ec_jacobian.n
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, "big") + response.to_bytes(32, "big") + bytes([device_id]) + data
+
+
+@pytest.mark.parametrize("mode", [hash_mode_hex, hash_mode_binary])
+def test_valid_proof(mode):
+    result = verify_proof(proof_packet(mode=mode), DeviceContext(device_id, public_key, mode))
+    assert result.ok
+    assert result.reason is None
+    assert result.device_id == device_id
+    assert result.commitment == ec_jacobian.to_affine(fixed_base_multiply(0xC0FFEE))
+    assert result.challenge == sketch_challenge(result.commitment[0], mode)
+    assert result.data == data
+
+
+# Each failure mode and its reason; the packets rejected before the curve math
+# carry no fields
+@pytest.mark.parametrize("packet, reason", [
+    (b"\x02" + bytes(32) + proof_packet()[33:], reject_off_curve),
+    (b"\x05" + proof_packet()[1:], reject_off_curve),
+    (proof_packet(response=0), reject_response_range),
+    (proof_packet(response=ec_jacobian.n + 1), reject_response_range),
+    (proof_packet()[:-1], reject_length),
+    (proof_packet()[:65] + bytes([device_id + 1]) + data, reject_unknown_device),
+])
+def test_rejected_before_curve_math(packet, reason):
+    result = verify_proof(packet, DeviceContext(device_id, public_key))
+    assert not result.ok
+    assert result.reason == reason
+    assert result[2:] == (None,) * 5
+
+
+@pytest.mark.parametrize("packet", [
+    proof_packet(response=12345),
+    proof_packet(mode=hash_mode_binary),
+])
+def test_proof_mismatch(packet):
+    result = verify_proof(packet, DeviceContext(device_id, public_key))
+    assert not result.ok
+    assert result.reason == reject_invalid_proof
+    assert result.device_id == device_id
+    assert result.commitment is not None
+
+
+def test_other_key():
+    other_key = ec_jacobian.to_affine(fixed_base_multiply(private_key + 1))
+    result = verify_proof(proof_packet(), DeviceContext(device_id, other_key))
+    assert result.reason == reject_invalid_proof
+
+
+# With a validator the reasons are counted and replays are caught
+def test_validator():
+    validator = PacketValidator()
+    context = DeviceContext(device_id, public_key)
+    assert verify_proof(proof_packet(), context, validator).ok
+    assert verify_proof(proof_packet(), context, validator).reason == reject_replay
+    assert verify_proof(proof_packet(k=5, response=0), context, validator).reason == reject_response_range
+    assert verify_proof(proof_packet(k=6, response=7), context, validator).reason == reject_invalid_proof
+    assert validator.rejections == {reject_replay: 1, reject_response_range: 1}
+    assert validator.accepted == 2
+
+
+def test_public_key_off_curve():
+    with pytest.raises(ValueError):
+        DeviceContext(device_id, (public_key[0], public_key[1] + 1))
@@ -0,0 +1,97 @@
+# Key of the verifier (verifier_identity.py) and its fingerprint in I
+import asyncio
+import hashlib
+import os
+import stat
+import pytest
+import ec_jacobian
+import verifier
+import verifier_identity
+from prover_emulator import EmulatedFleet
+from transport import BleTransport
+from verify_pool import VerificationPool
+
+
+@pytest.fixture
+def key_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(verifier_identity, "_identity", None)
+    return str(tmp_path / "verifier_identity.key")
+
+
+# Loads the identity of path as a new process of the gateway would
+def reload(path):
+    verifier_identity._identity = None
+    return verifier_identity.load_identity(path)
+
+
+def test_stable_across_loads(key_path):
+    private_key, public_key = verifier_identity.load_identity(key_path)
+    assert 0 < private_key < ec_jacobian.n
+    assert len(public_key) == 64
+    assert stat.S_IMODE(os.stat(key_path).st_mode) == 0o600
+    assert reload(key_path) == (private_key, public_key)
+    assert verifier_identity.read_identity(key_path) == private_key
+
+
+def test_public_key_on_curve(key_path):
+    _, public_key = verifier_identity.load_identity(key_path)
+    point = ec_jacobian.decompress(bytes([2 + (public_key[63] & 1)]) + public_key[:32])
+    assert point == (int.from_bytes(public_key[:32], "big"), int.from_bytes(public_key[32:], "big"))
+
+
+@pytest.mark.parametrize("content", ["", "not hex\n", "0" * 64 + "\n", f"{ec_jacobian.n:064X}\n"])
+def test_malformed_file_replaced(key_path, content):
+    with open(key_path, "w") as key_file:
+        key_file.write(content)
+    assert verifier_identity.read_identity(key_path) is None
+    private_key, _ = verifier_identity.load_identity(key_path)
+    assert verifier_identity.read_identity(key_path) == private_key
+
+
+def test_rotation(key_path):
+    old = verifier_identity.load_identity(key_path)
+    new = verifier_identity.rotate_identity(key_path)
+    assert new != old
+    assert verifier_identity.load_identity(key_path) == new
+    assert reload(key_path) == new
+    assert verifier_identity.fingerprint(new[1]) != verifier_identity.fingerprint(old[1])
+
+
+def test_fingerprint(key_path):
+    _, public_key = verifier_identity.load_identity(key_path)
+    expected = hashlib.sha256(public_key).digest()[:verifier_identity.fingerprint_size].hex().upper()
+    assert verifier_identity.fingerprint(public_key) == expected
+    assert len(expected) == 2 * verifier_identity.fingerprint_size
+
+
+def test_identification_command(key_path):
+    _, public_key = verifier_identity.load_identity(key_path)
+    state = verifier.SessionContext("AA:BB", 7, verifier.protocol_v2)
+    state.capabilities = "CFA"
+    assert verifier.identification_command(state) == b"I07F" + verifier_identity.fingerprint(public_key).encode()
+    state.capabilities = "CA"
+    assert verifier.identification_command(state) == b"I07"
+
+
+# The prover keeps the key sent with K: the next session skips K until the key
+# is rotated
+def test_fingerprint_in_sessions(key_path):
+    verifier_identity.load_identity(key_path)
+    fleet = EmulatedFleet(1)
+    address, = fleet.provers
+
+    def run():
+        async def session():
+            async with VerificationPool(workers=1) as pool:
+                state = verifier.SessionContext(address, 10, verifier.protocol_v2)
+                await verifier.run_session(state, pool, lambda address: BleTransport(address, fleet.client))
+                return state
+        return asyncio.run(session())
+
+    first = run()
+    assert first.authenticated and first.verifier_key_needed and first.verifier_key_sent
+    second = run()
+    assert second.authenticated and not second.verifier_key_needed and not second.verifier_key_sent
+    verifier_identity.rotate_identity(key_path)
+    third = run()
+    assert third.authenticated and third.verifier_key_needed and third.verifier_key_sent
@@ -0,0 +1,68 @@
+# Verification pool (verify_pool.py): results in order per session, and
+# backpressure once max_pending proofs are in flight
+import asyncio
+import random
+import ec_jacobian
+from batch_verify import Proof
+from ec_msm import msm
+from verify_pool import VerificationPool, verify_proof_in_worker
+
+n = ec_jacobian.n
+G = (ec_jacobian.Gx, ec_jacobian.Gy)
+rng = random.Random(8)
+
+
+def point(k):
+    return ec_jacobian.to_affine(msm([k], [G]))
+
+
+def valid_proof():
+    d, w, sigma = rng.randrange(1, n), rng.randrange(1, n), rng.randrange(1, n)
+    return Proof(point(w), (w + sigma * d) % n, sigma, point(d))
+
+
+# Rejected by the range check, before any curve math: finishes first in the workers
+def fast_invalid_proof():
+    return valid_proof()._replace(response=0)
+
+
+def test_verify_proof_in_worker():
+    proof = valid_proof()
+    assert verify_proof_in_worker(proof)
+    assert not verify_proof_in_worker(proof._replace(challenge=proof.challenge + 1))
+    assert not verify_proof_in_worker(fast_invalid_proof())
+
+
+def test_results_in_order_per_session():
+    plan = {"A": [True, False, True, False, False], "B": [False, True, False, True, True]}
+
+    async def run():
+        completed = {session: [] for session in plan}
+        futures = []
+        async with VerificationPool(workers=2) as pool:
+            for i in range(5):
+                for session, expected in plan.items():
+                    proof = valid_proof() if expected[i] else fast_invalid_proof()
+                    future = await pool.submit(session, proof)
+                    future.add_done_callback(lambda done, session=session, i=i: completed[session].append(i))
+                    futures.append((session, i, future))
+            for session, i, future in futures:
+                assert await future == plan[session][i]
+        return completed
+
+    completed = asyncio.run(run())
+    assert completed == {"A": list(range(5)), "B": list(range(5))}
+
+
+def test_submit_blocks_at_the_limit():
+    async def run():
+        async with VerificationPool(workers=1, max_pending=2) as pool:
+            first = await pool.submit("A", valid_proof())
+            second = await pool.submit("B", valid_proof())
+            third = asyncio.ensure_future(pool.submit("C", valid_proof()))
+            await asyncio.sleep(0)
+            assert not third.done()
+            assert await first and await second
+            assert await (await third)
+
+    asyncio.run(run())
@@ -0,0 +1,150 @@
+# Transports between the verifier and a prover. Every transport offers the same
+# four operations: connect, write, an async stream of received data and close.
+# BleTransport goes through the HM-10 BLE bridge; SerialTransport talks to a
+# prover wired to a serial port (or to a pseudo-terminal in tests).
+import asyncio
+
+# UUID of the BLE module characteristic
+characteristic_uuid = "0000ffe1-0000-1000-8000-00805f9b34fb"
+
+# Baud rate of the sketches' SoftwareSerial link
+default_baudrate = 9600
+
+
+class Transport:
+    def __init__(self):
+        self._received = asyncio.Queue()
+        self._closed = False
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def write(self, data):
+        raise NotImplementedError
+
+    async def close(self):
+        self._closed = True
+        self._received.put_nowait(None)
+
+    # Called by the implementations with every chunk received from the prover.
+    # The chunk is passed on as is: bleak and pyserial hand over a new object
+    # for every notification or read.
+    def _data_received(self, data):
+        self._received.put_nowait(data)
+
+    # Async stream of the chunks received from the prover, until close()
+    async def notifications(self):
+        while True:
+            data = await self._received.get()
+            if data is None:
+                return
+            yield data
+
+
+# Forwards every chunk received by the transport to handler(characteristic, data),
+# the same signature as a bleak notification callback
+async def forward_notifications(transport, handler):
+    async for data in transport.notifications():
+        handler(None, data)
+
+
+# Scanner of the BLE provers. bleak is only imported when BLE is used, so the
+# serial and emulated setups (and the verification core) do not need it.
+def ble_scanner():
+    from bleak import BleakScanner
+    return BleakScanner
+
+
+# Passive scanner for the advertised proofs (advertisement.py): callback is
+# called with every advertisement that carries manufacturer data of company_id.
+# BlueZ only scans passively with an advertisement monitor, which needs a
+# pattern; CoreBluetooth cannot scan passively at all.
+def ble_advertisement_scanner(callback, company_id):
+    import sys
+    from bleak import BleakScanner
+    if sys.platform.startswith("linux"):
+        from bleak.args.bluez import BlueZScannerArgs, OrPattern
+        from bleak.assigned_numbers import AdvertisementDataType
+        pattern = OrPattern(0, AdvertisementDataType.MANUFACTURER_SPECIFIC_DATA, company_id.to_bytes(2, "little"))
+        return BleakScanner(callback, scanning_mode="passive", bluez=BlueZScannerArgs(or_patterns=[pattern]))
+    if sys.platform == "darwin":
+        return BleakScanner(callback)
+    return BleakScanner(callback, scanning_mode="passive")
+
+
+# Transport over the HM-10 characteristic. client_factory(address) returns the
+# client: BleakClient by default, or a stand-in such as
+# prover_emulator.EmulatedBleakClient.
+class BleTransport(Transport):
+    def __init__(self, address, client_factory=None, characteristic=characteristic_uuid):
+        super().__init__()
+        if client_factory is None:
+            from bleak import BleakClient
+            client_factory = BleakClient
+        self.address = address
+        self.characteristic = characteristic
+        self.client = client_factory(address)
+
+    async def connect(self):
+        await self.client.connect()
+
+        async def notification_handler(characteristic, data):
+            self._data_received(data)
+
+        await self.client.start_notify(self.characteristic, notification_handler)
+
+    async def write(self, data):
+        await self.client.write_gatt_char(self.characteristic, data)
+
+    async def close(self):
+        try:
+            if self.client.is_connected:
+                await self.client.stop_notify(self.characteristic)
+        finally:
+            await self.client.disconnect()
+            await super().close()
+
+
+# Transport over a serial port (pyserial). Reads are driven by the event loop, so
+# no thread is needed; this works for USB-serial adapters and pseudo-terminals.
+class SerialTransport(Transport):
+    def __init__(self, port, baudrate=default_baudrate):
+        super().__init__()
+        self.address = port
+        self.port = port
+        self.baudrate = baudrate
+        self._serial = None
+
+    async def connect(self):
+        try:
+            import serial
+        except ImportError:
+            raise RuntimeError("SerialTransport needs pyserial (pip install pyserial)")
+
+        self._serial = serial.Serial(self.port, self.baudrate, timeout=0)
+        asyncio.get_running_loop().add_reader(self._serial.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        data = self._serial.read(self._serial.in_waiting or 1)
+        if data:
+            self._data_received(data)
+
+    async def write(self, data):
+        self._serial.write(data)
+        # Wait until the bytes have left the output buffer without blocking the loop
+        while self._serial.out_waiting:
+            await asyncio.sleep(0.001)
+
+    async def close(self):
+        if self._serial is not None:
+            asyncio.get_running_loop().remove_reader(self._serial.fileno())
+            self._serial.close()
+            self._serial = None
+        await super().close()
@@ -0,0 +1,62 @@
+# Headless verification of NIZKP proof packets: nothing is printed, no module
+# state is changed and nothing of the BLE stack is imported, so batch jobs,
+# worker pools and benchmarks can call verify_proof() in a loop. verifier.py
+# runs the sessions and prints the Result.
+from collections import namedtuple
+import ec_jacobian
+from challenge import challenge_from_midstate, hash_mode_hex, initial_midstate
+from ec_backends import default_backend
+from packet_validation import screen_packet
+
+# Reason of a packet that passed the checks but whose proof does not hold
+reject_invalid_proof = "invalid_proof"
+
+# ok: the proof holds. reason: None, a rejection reason of packet_validation or
+# reject_invalid_proof. device_id, commitment (x, y), response, challenge and
+# data (bytes) are None when the packet was rejected before the curve math.
+Result = namedtuple("Result", ["ok", "reason", "device_id", "commitment", "response", "challenge", "data"])
+
+
+# What the proofs of one device are checked against: its ID, its public key
+# (x, y) and the challenge mode negotiated with it (challenge.py). backend is
+# the elliptic-curve backend (ec_backends.py, the default one if None). The key
+# in the form of the backend (a wNAF table for the native one) and the SHA-256
+# midstate of G_x || Qd_x are built once, or passed in by a caller that caches them.
+class DeviceContext:
+    __slots__ = ("device_id", "public_key", "challenge_mode", "backend", "key", "midstate")
+
+    def __init__(self, device_id, public_key, challenge_mode=hash_mode_hex, key=None, midstate=None,
+                 backend=None):
+        x, y = public_key
+        if not ec_jacobian.is_on_curve(x, y):
+            raise ValueError("the public key is not a point of the curve")
+        self.device_id = device_id
+        self.public_key = (x, y)
+        self.challenge_mode = challenge_mode
+        self.backend = backend if backend is not None else default_backend()
+        self.key = key if key is not None else self.backend.prepare_public_key(x, y)
+        self.midstate = midstate if midstate is not None else initial_midstate(x, challenge_mode)
+
+
+# πG - σQd == R; key is the device key prepared by the backend
+def proof_holds(response, challenge, commitment, key, backend=None):
+    return (backend or default_backend()).verify(response, challenge, commitment, key)
+
+
+# Verifies the bytes of a proof packet (v1 hex already decoded, or the payload
+# of a v2 P frame) against device_ctx. validator is an optional
+# packet_validation.PacketValidator of the caller, for its counters and replay
+# filter; without it the checks run without keeping anything.
+def verify_proof(packet_bytes, device_ctx, validator=None):
+    if validator is not None:
+        checked = validator.check(packet_bytes, device_ctx.device_id, device_ctx.public_key[0])
+        reason = validator.last_rejection
+    else:
+        checked, reason = screen_packet(packet_bytes, device_ctx.device_id, device_ctx.public_key[0])
+    if checked is None:
+        return Result(False, reason, None, None, None, None, None)
+
+    challenge = challenge_from_midstate(device_ctx.midstate, checked.commitment_x, device_ctx.challenge_mode)
+    ok = device_ctx.backend.verify(checked.response, challenge, checked.commitment, device_ctx.key)
+    return Result(ok, None if ok else reject_invalid_proof, checked.device_id, checked.commitment,
+                  checked.response, challenge, bytes(checked.data))
@@ -1,42 +1,75 @@
+import argparse
 import asyncio
+import collections
 import re
-from bleak import BleakClient, BleakScanner
-from ecdsa import SigningKey, SECP256k1, VerifyingKey, ellipticcurve, curves
-from ecdsa.ellipticcurve import Point
-import hashlib
-import ecdsa
+import signal
 import os
+import ec_jacobian
+from ble_framing import (FrameReader, nizkp_packet_trailer, protocol_v1, protocol_v2,
+                         capability_compressed, capability_identity, capability_binary_challenge,
+                         capability_key_ack, default_capabilities,
+                         parse_registration_answer,
+                         frame_public_key, frame_proof, frame_time)
+from fixed_base import generator_wnaf_table
+from device_cache import DeviceTableCache, decompress_public_key
+from device_registry import DeviceRegistry, registry_path
+from challenge import ChallengeEngine, hash_mode_hex, hash_mode_binary
+from replay_filter import (ReplayFilter, default_window as default_replay_window,
+                           default_error_rate as default_replay_error_rate)
+from packet_validation import (PacketValidator, packet_tail_size, reject_framing, reject_length,
+                               reject_unknown_device, reject_response_range, reject_replay,
+                               reject_off_curve)
+from verifier_identity import load_identity, rotate_identity, fingerprint, identity_path
+from batch_verify import Proof
+from verify_pool import VerificationPool
+from session_machine import Step, frame_answer, run_steps, text_answer
+from transport import (BleTransport, SerialTransport, ble_scanner, ble_advertisement_scanner, default_baudrate,
+                       forward_notifications)
+from advertisement import AdvertisementVerifier, manufacturer_id
+from verification import DeviceContext, verify_proof
+from ec_backends import NativeBackend, backend_classes, default_backend, select_backend, use_backend
 
 # Target device name
 target_name = "MeuNovoNome"
 
-# UUID of the BLE module characteristic
-characteristic_uuid = "0000ffe1-0000-1000-8000-00805f9b34fb"
+# Validated prover keys and their precomputed tables, reused while the device
+# keeps authenticating with the same key
+device_tables = DeviceTableCache()
 
+# SHA-256 midstates of G_x || Qd_x per device, so each proof only hashes R_x
+challenges = ChallengeEngine()
 
-# Parameters of the SECP256k1 curve
-curve = curves.SECP256k1.curve  # Curve parameters
-generator = curves.SECP256k1.generator  # Generator point of the curve
+# Cheap checks run on every proof packet before the elliptic-curve math, with
+# a counter per rejection reason
+packet_validator = PacketValidator()
 
-# Get the parameter p (order of the finite field) from the elliptic curve
-p = curve.p()
+# Name of --ec-backend that measures the installed backends at startup
+auto_backend = "auto"
 
-class MyDelegate:
-    def __init__(self):
-        # Initialize notification data as an empty byte string
-        self.notification_data = b""
+# Deadlines (in seconds) for each step of the session (session_steps). The
+# verifier moves on as soon as the answer is complete; these are only upper bounds.
+registration_deadline = 5.0   # R -> "RA;" or "R1;", and the short answers "RF1;", "RS1;"
+public_key_deadline = 15.0    # I -> key generation time + "RK...;"
+proof_deadline = 20.0         # D -> "PA...;" + packet time
 
+# The sketch reads each command with readString(), which only returns after one
+# second without new characters. K sent to a prover that does not acknowledge
+# it (capability A) must be followed by this pause so the next command is not
+# glued to it.
+command_settle_time = 1.2
+
+# Simultaneous BLE sessions in gateway mode (adapters handle only a few connections)
+default_max_connections = 4
+
+class MyDelegate(FrameReader):
+    # Called for every chunk: only buffers it. Frames are decoded and printed
+    # once they are complete.
     def handle_notification(self, characteristic, data):
         # Accumulate the received notification data
-        self.notification_data += data
-        
-        print(f"Notification received: {data}")
-        
-        #If the device is not registered, the response is "RA"; if already registered, the response is "R1"
-        print(f"Notification as string: {data.decode('utf-8', errors='ignore')}")
+        self.feed(data)
 
-async def scan_for_device(name):
-    devices = await BleakScanner.discover()
+async def scan_for_device(name, scanner=None):
+    devices = await (scanner or ble_scanner()).discover()
     for device in devices:
         # Ensure device.name is not None before checking
         if device.name and name in device.name:
@@ -44,79 +77,78 @@ async def scan_for_device(name):
             return device.address
     return None
 
-# Function that waits for the complete reception of the public key 
-# # It checks for notifications and looks for the key end delimiter (';')
-async def wait_for_public_key(delegate, timeout=5.0):
-    while True:
-        await asyncio.sleep(timeout)  # Wait for up to timeout seconds for notifications
-        if delegate.notification_data:
-            # Check if the received notification contains the key end delimiter (e.g., ';')
-            if b';' in delegate.notification_data:
-                print("End of public key detected.")
-                break
-
-    # Remove any extra end-of-line characters if necessary
-    public_key = delegate.notification_data.replace(b'\r', b'').replace(b'\n', b'').strip()
-    return public_key
-
 # This function filters out the message portion and returns the cleaned public key data
+# The key generation time only precedes the key when it arrives after the R answer,
+# so the key is located by its "RK" marker rather than by a fixed offset
 def filter_public_key_data(public_key):
-    if b';' in public_key:
-        filtered_data = public_key[:35].strip()
-        print(f"Stored notification (Key generation time): {filtered_data.decode('utf-8', errors='ignore')}")
-        public_key = public_key[37:public_key.rfind(b';')].strip()
+    key_pos = public_key.find(b'RK')
+    if b';' in public_key and key_pos != -1:
+        filtered_data = public_key[:key_pos].strip()
+        if filtered_data:
+            print(f"Stored notification (Key generation time): {filtered_data.decode('utf-8', errors='ignore')}")
+        public_key = public_key[key_pos + 2:public_key.rfind(b';')].strip()
     else:
         print("Error: Delimiter ';' not found in received data.")
         public_key = b""
     return public_key
 
 # Function to process the public key and return X and Y coordinates as integers  
-def process_public_key(public_key):
+def process_public_key(public_key, state):
     # Check length to ensure the public key has 64 bytes or 128 characters
-    if len(public_key) != 128:
+    # (33 bytes or 66 characters when the prover compresses it)
+    if len(public_key) not in (128, 66):
         print("Error: Public key does not have the expected length of 64 bytes.")
         return None, None
     else:
-        # Split the public key into X and Y coordinates (64 bytes each)
-        Qd_x_hex = public_key[:64]
-        Qd_y_hex = public_key[64:]
+        # Convert the key from hexadecimal to bytes
+        return process_public_key_bytes(bytes.fromhex(public_key.decode('utf-8')), state)
+
+# Same as process_public_key, for the 64 bytes of the key (protocol v2 sends them as is)
+# or its 33-byte SEC1 compressed form
+def process_public_key_bytes(public_key, state):
+    if len(public_key) == 33:
+        # The square root is only computed the first time a key is seen
+        point = decompress_public_key(bytes(public_key))
+        if point is None:
+            print("Error: The client's public key is not a point of the curve.")
+            return None, None
+        public_key = point[0].to_bytes(32, 'big') + point[1].to_bytes(32, 'big')
+    if len(public_key) != 64:
+        print("Error: Public key does not have the expected length of 64 bytes.")
+        return None, None
 
-        global_state.x_public_key = Qd_x_hex.decode('utf-8')
-        # Print the X coordinate in hexadecimal
-        print(f"Hexadecimal representation of the client's public key X coordinate: {global_state.x_public_key}")
+    # Split the public key into X and Y coordinates (32 bytes each)
+    Qd_x_bytes = public_key[:32]
+    Qd_y_bytes = public_key[32:]
 
-        # Convert the X coordinate from hexadecimal to bytes
-        Qd_x_bytes = bytes.fromhex(Qd_x_hex.decode('utf-8'))  # Convert from hex string to bytes
-        Qd_y_bytes = bytes.fromhex(Qd_y_hex.decode('utf-8'))  # Convert from hex string to bytes
+    state.x_public_key = Qd_x_bytes.hex().upper()
+    # Print the X coordinate in hexadecimal
+    print(f"Hexadecimal representation of the client's public key X coordinate: {state.x_public_key}")
 
-        # Convert to integers to be used in Shared Point.
-        global_state.Qd_x_int = int.from_bytes(Qd_x_bytes, byteorder='big')
-        global_state.Qd_y_int = int.from_bytes(Qd_y_bytes, byteorder='big')
-        print(f"X and Y coordinates as integers respectively: {global_state.Qd_x_int} {global_state.Qd_y_int}")
+    # Convert to integers to be used in Shared Point.
+    state.Qd_x_int = int.from_bytes(Qd_x_bytes, byteorder='big')
+    state.Qd_y_int = int.from_bytes(Qd_y_bytes, byteorder='big')
+    print(f"X and Y coordinates as integers respectively: {state.Qd_x_int} {state.Qd_y_int}")
 
-        return global_state.Qd_x_int, global_state.Qd_y_int
+    return state.Qd_x_int, state.Qd_y_int
 
 # Function responsible for returning the X coordinate of point G.
-def get_point_G_x_coordinate(generator):
-    global_state.x_g1_hex = hex(generator.x())[2:].upper()  # Remove '0x' and convert to uppercase
-    print(f"X coordinate value of point G for testing (pure hex): {global_state.x_g1_hex}")
-    return global_state.x_g1_hex
-
-from ecdsa import SigningKey, SECP256k1
+def get_point_G_x_coordinate(state):
+    state.x_g1_hex = f"{ec_jacobian.Gx:X}"  # Uppercase hex without '0x'
+    print(f"X coordinate value of point G for testing (pure hex): {state.x_g1_hex}")
+    return state.x_g1_hex
 
-# Function to generate the server's keys and return only the public key in bytes
+# Function that returns the server's public key in bytes: the persistent
+# identity of the verifier (verifier_identity.py), created on the first run
 def generate_server_public_key():
-    # Generate the server's private key using ECC
-    private_key = SigningKey.generate(curve=SECP256k1)
-    
-    # Generate the server's public key
-    server_public_key = private_key.get_verifying_key()
-    
-    # Save the server's public key as bytes
-    pub_key_bytes = server_public_key.to_string()
-        
+    _, pub_key_bytes = load_identity()
     return pub_key_bytes
 
+# K followed by the verifier key as the 128 uppercase hex digits the sketch reads
+def verifier_key_command(state):
+    print("K + Verifier's public key sent to the Prover.\n")
+    return b'K' + generate_server_public_key().hex().upper().encode()
+
 # Extracts the receipt time and cleans the prover's packet, returning it as a hexadecimal
 def convert_packet_to_string(packet):
     # Convert the packet to a string and remove "PA" and ";"
@@ -144,77 +176,114 @@ def convert_packet_to_string(packet):
 
     return packet_str
 
-# Function that converts the packet from hexadecimal to bytes and checks if it has the correct size
+# Function that converts the packet from hexadecimal to bytes (its size is
+# checked with the rest of the packet by check_packet)
 def validate_and_convert_to_bytes(packet_str):
-    # Check if the packet is in a valid hexadecimal format
-    if not all(c in '0123456789ABCDEFabcdef' for c in packet_str):
-        print("Error: The packet contains non-hexadecimal characters.")
-        return None
-
     # Convert the hexadecimal string to bytes
     try:
         packet_bytes = bytes.fromhex(packet_str)
     except ValueError:
         print("Error: The packet is not in a valid hexadecimal format.")
-        return None
-
-    # Check if the packet size is correct
-    if len(packet_bytes) != 113:
-        print(f"Error: Incorrect packet size: {len(packet_bytes)} bytes")
-        return None
+        return packet_validator.reject(reject_framing)
 
     return packet_bytes
 
-def extract_and_process_packet_components(packet_bytes):
+# Messages printed for the packets rejected before the elliptic-curve math
+rejection_messages = {
+    reject_length: "Incorrect packet size",
+    reject_unknown_device: "The packet is not from the device of this session",
+    reject_response_range: "The challenge response is out of range",
+    reject_replay: "The proof was already received (replay)",
+    reject_off_curve: "The commitment is not a point of the curve",
+}
+
+# Cheap checks of a proof packet (packet_validation.py); returns the
+# CheckedPacket, or None when the packet is rejected
+def check_packet(packet_bytes, state):
+    checked = packet_validator.check(packet_bytes, state.device_id, state.Qd_x_int)
+    if checked is None:
+        print(f"Error: Packet rejected ({len(packet_bytes)} bytes): "
+              f"{rejection_messages[packet_validator.last_rejection]}")
+    return checked
+
+def extract_and_process_packet_components(packet_bytes, state):
+    context = device_context(state)
+    if context is None:
+        print("Error: The client's public key is not a point of the curve.")
+        return packet_validator.reject(reject_unknown_device)
+
+    # Cheap checks first, then πG - σQd == R (verification.py, which prints nothing)
+    result = verify_proof(packet_bytes, context, packet_validator)
+    if result.commitment is None:
+        print(f"Error: Packet rejected ({len(packet_bytes)} bytes): {rejection_messages[result.reason]}")
+        return None
+    state.authenticated = result.ok
+
     # Extract the parts of the packet
-    shared_point = packet_bytes[0:64]
-    challenge_response = packet_bytes[64:96]
-    device_id = packet_bytes[96:97]
-    plaintext_message = packet_bytes[97:113]
-    
-    # Divide into 32 bytes for x and y coordinates of the shared point
-    x_bytes = shared_point[:32]  # First 32 bytes
-    y_bytes = shared_point[32:]  # Last 32 bytes
-    
+    split = len(packet_bytes) - packet_tail_size
+    shared_point_x_int, shared_point_y_int = result.commitment
+    plaintext_message_str = result.data.decode('utf-8', errors='ignore')
+
     # Print the X coordinate of point G in hexadecimal - commit value
-    print(f"Shared point X coordinate in hexadecimal for testing (Commit): {x_bytes.hex().upper()}")
-
-    # Convert parts to integers for calculations
-    shared_point_x_int = int(x_bytes.hex(), 16)
-    shared_point_y_int = int(y_bytes.hex(), 16)
-    challenge_response_int = int(challenge_response.hex(), 16)
-    device_id_int = int(device_id.hex(), 16)
-    plaintext_message_str = plaintext_message.decode('utf-8')
-    
-    print(f"Printing the hash value on the verifier side: ")
-    hash_int, x_hex = H(str(global_state.x_g1_hex), str(global_state.x_public_key), str(x_bytes.hex().upper()))
-    x_hex = x_hex.upper()
-    print(hash_int, "   ", x_hex)
-        
-    # Client's public coordinates (Qd)
-    Qd_x = global_state.Qd_x_int
-    Qd_y = global_state.Qd_y_int
-    Qd = ellipticcurve.Point(curve, Qd_x, Qd_y)
-    
-    # Call the function to calculate P
-    calculate_P(challenge_response_int, hash_int, generator, Qd, curve, p, shared_point_x_int, shared_point_y_int)
-    
+    print(f"Shared point X coordinate in hexadecimal for testing (Commit): {shared_point_x_int:064X}")
+
+    print("Printing the hash value on the verifier side: ")
+    print(result.challenge, "   ", f"{result.challenge:064X}")
+
+    print("Device authenticated correctly." if result.ok else "Device not authenticated.")
+
     # Print the parts of the packet
-    print("Shared point (hex):", shared_point.hex())
-    print("Challenge response (hex):", challenge_response.hex())
-    print("Device ID (hex):", device_id.hex())
+    print("Shared point (hex):", packet_bytes[:split].hex())
+    print("Challenge response (hex):", packet_bytes[split:split + 32].hex())
+    print("Device ID (hex):", bytes([result.device_id]).hex())
     print("Plaintext message:", plaintext_message_str)
 
     # Return processed data or whatever is needed
     return {
         "shared_point_x": shared_point_x_int,
         "shared_point_y": shared_point_y_int,
-        "challenge_response": challenge_response_int,
-        "device_id": device_id_int,
-        "plaintext_message": plaintext_message_str
+        "challenge_response": result.response,
+        "device_id": result.device_id,
+        "plaintext_message": plaintext_message_str,
+        "authenticated": result.ok
     }
+
+# Verification context of the device of a session, kept in the session while
+# the key, the ID and the challenge mode do not change (None if the key of the
+# device is missing or not on the curve)
+def device_context(state):
+    if state.Qd_x_int is None:
+        return None
+    backend = default_backend()
+    public_key = (state.Qd_x_int, state.Qd_y_int)
+    mode = challenge_mode(state)
+    context = state.device_context
+    if (context is not None and context.device_id == state.device_id and context.public_key == public_key
+            and context.challenge_mode == mode and context.backend is backend):
+        return context
+
+    # The native backend uses the shared cache of device tables
+    if type(backend) is NativeBackend:
+        Qd_key = device_tables.get(state.Qd_x_int, state.Qd_y_int, state.device_id)
+    else:
+        Qd_key = backend.prepare_public_key(*public_key)
+    if Qd_key is None:
+        return None
+    state.device_context = DeviceContext(state.device_id, public_key, mode, Qd_key,
+                                         challenges.midstate(state.Qd_x_int, mode), backend)
+    return state.device_context
+
+# What the prover hashes for the challenge: the hex digits of the coordinates,
+# or their bytes when the binary challenge (capability H) was negotiated
+def challenge_mode(state):
+    return hash_mode_binary if capability_binary_challenge in state.capabilities else hash_mode_hex
+
+# Proof tuple of a packet that passed check_packet
+def checked_to_proof(checked, state):
+    hash_int = challenges.challenge(state.Qd_x_int, checked.commitment_x, challenge_mode(state))
+    return Proof(checked.commitment, checked.response, hash_int, (state.Qd_x_int, state.Qd_y_int))
     
-def parse_received_packet(packet):
+def parse_received_packet(packet, state):
     # Convert the packet to a string
     packet_str = convert_packet_to_string(packet)
     
@@ -225,156 +294,611 @@ def parse_received_packet(packet):
         return None
     
     # Extract and process the components
-    return extract_and_process_packet_components(packet_bytes)
-
+    return extract_and_process_packet_components(packet_bytes, state)
 
-# This function will be responsible for calculating the hash on the verifier's side
-def H(*args):
-    concatenated = "".join(args)
-    hash_hex = hashlib.sha256(concatenated.encode('utf-8')).hexdigest()
-    return int(hash_hex, 16), hash_hex
-
-# This function will be responsible for calculating the shared point on the verifier's side
-def calculate_P(challenge_response_int, hash_int, generator, Qd, curve, p, shared_point_x_int, shared_point_y_int):
-    
-    # 1. Calculate πG
-    piG = generator * challenge_response_int
+# Same as parse_received_packet, but the elliptic-curve check runs in the
+# verification pool, so the event loop keeps servicing BLE notifications
+async def verify_received_packet(packet, pool, state):
+    packet_bytes = validate_and_convert_to_bytes(convert_packet_to_string(packet))
+    if packet_bytes is None:
+        return None
+    return await verify_packet_bytes(packet_bytes, pool, state)
 
-    # 2. Calculate σQd
-    sigmaQd = Qd * hash_int
-    
-    # 3. Invert σQd
-    sigmaQd_neg = Point(curve, sigmaQd.x(), (-sigmaQd.y()) % int(p))
+# Verifies the bytes of a proof packet in the verification pool
+async def verify_packet_bytes(packet_bytes, pool, state):
+    checked = check_packet(packet_bytes, state)
+    if checked is None:
+        return None
 
-    # 4. Add πG and -σQd
-    P = piG + sigmaQd_neg
-    
-    # Print the coordinates x and y of P
-    Px = P.x()
-    Py = P.y()
-    
-    # Compare the values
-    if Px == shared_point_x_int and Py == shared_point_y_int:
+    proof = checked_to_proof(checked, state)
+    device_id_int = checked.device_id
+    authenticated = await pool.verify(state.address, proof, device_id_int)
+    state.authenticated = authenticated
+    if authenticated:
         print("Device authenticated correctly.")
     else:
         print("Device not authenticated.")
 
-    print(f"Coordinate X of P: {Px}")
-    print(f"Coordinate Y of P: {Py}")
+    return {
+        "shared_point_x": proof.commitment[0],
+        "shared_point_y": proof.commitment[1],
+        "challenge_response": proof.response,
+        "device_id": device_id_int,
+        "plaintext_message": bytes(checked.data).decode('utf-8', errors='ignore'),
+        "authenticated": authenticated
+    }
 
-    return P
 
-# Class to encapsulate variables that need to be accessed globally
-# This approach helps in organizing and managing the state more effectively
-class GlobalState:
-    def __init__(self):
+# Class to encapsulate the variables of one authentication session. Every
+# connected prover gets its own instance, so sessions can run concurrently.
+class SessionContext:
+    def __init__(self, address, device_id=10, protocol=protocol_v2, capabilities=default_capabilities):
+        self.address = address    # BLE address of the prover
+        self.device_id = device_id  # ID assigned to the prover with the I command
+        self.protocol = protocol  # Wire format offered with R, then the one the prover accepted
+        self.capabilities = capabilities  # Features offered with R, then the ones the prover accepted
         self.x_g1_hex = None  # Holds the X coordinate value of point G
         self.Qd_x_int = None      # Holds the integer value of Qd X coordinate
         self.Qd_y_int = None      # Holds the integer value of Qd Y coordinate
         self.x_public_key = None  # Holds the public key's X coordinate as a string
+        self.authenticated = False  # Result of the proof of this session
+        self.device_context = None  # Key and challenge midstate of the prover (verification.py)
+        self.resumed = False  # Found in the registry: the session skips R, I and K
+        self.verifier_key_needed = True  # K has to be sent in this session
+        self.verifier_key_sent = False   # K was sent (and acknowledged, when the prover can)
+        self.verification_pool = None  # Pool that verifies the proof of the session
+        self.verification = None  # Task verifying the proof while the session goes on
+        self.overlap_verification = False  # Continuous mode: end the proof steps without waiting for the verdict
+        self.proofs = 0        # Proofs received in continuous mode, the first one included
+        self.valid_proofs = 0  # Of which were verified
+        self.continuous_time = 0.0  # Seconds of continuous mode, from the first request to the last verdict
+
+# Asynchronous function that returns the addresses of every device whose name matches
+async def scan_for_devices(name, scanner=None):
+    devices = await (scanner or ble_scanner()).discover()
+    addresses = []
+    for device in devices:
+        if device.name and name in device.name:
+            print(f"Device found: {device.name} ({device.address})")
+            addresses.append(device.address)
+    return addresses
+
+# Commands of the session. R offers the binary format and the capabilities
+# ("R2CFA"); provers that do not know them answer as usual and keep using
+# uncompressed hex.
+def registration_command(state):
+    if state.protocol >= protocol_v2 or state.capabilities:
+        registration_request = f"R{state.protocol}{state.capabilities}".encode()
+    else:
+        registration_request = b'R'
+    print(f"Message sent: {registration_request.decode()}\n")
+    return registration_request
+
+# The device ID along with the letter "I", with the fingerprint of the verifier
+# key when the prover can compare it
+def identification_command(state):
+    identification_request = f"I{state.device_id:02d}"
+    if capability_identity in state.capabilities:
+        identification_request += capability_identity + fingerprint(generate_server_public_key())
+    print(f"Message sent: {identification_request}\n")
+    return identification_request.encode()
+
+# "D", or "D" followed by the wire format of the session ("D2C") when the prover
+# is resumed without going through R
+def proof_command(state):
+    proof_request = resume_request(state) if state.resumed else b'D'
+    print(f"Message sent: {proof_request.decode()}\n")
+    return proof_request
+
+# Wire format of a resumed session, sent with D since R is skipped
+def resume_request(state):
+    if state.protocol >= protocol_v2 or state.capabilities:
+        return f"D{state.protocol}{state.capabilities}".encode()
+    return b'D'
+
+# Answers the session steps wait for
+def public_key_answer(state):
+    return frame_answer(frame_public_key) if state.protocol == protocol_v2 else text_answer(rb'RK')
+
+def proof_answer(state):
+    return frame_answer() if state.protocol == protocol_v2 else text_answer(rb'PA', nizkp_packet_trailer)
+
+# Handlers of the answers; each returns the name of the next step
+def on_registration(state, answer):
+    if answer:
+        print(f"Stored notification: {answer.decode('utf-8', errors='ignore')}\n")
+    state.protocol, state.capabilities = parse_registration_answer(answer)
+    print(f"Wire format: protocol v{state.protocol}, capabilities: {state.capabilities or 'none'}\n")
+    return "identify"
+
+def on_public_key(state, answer):
+    public_key = b""
+    if answer is None:
+        print("Timeout waiting for the public key.")
+    elif state.protocol == protocol_v2:
+        if answer.preamble.strip():
+            print(f"Stored notification (Key generation time): {answer.preamble.decode('utf-8', errors='ignore').strip()}")
+        print("End of public key detected.")
+        public_key = answer.payload
+    else:
+        print("End of public key detected.")
+        # Remove any extra end-of-line characters, then the message portion
+        public_key = filter_public_key_data(answer.replace(b'\r', b'').replace(b'\n', b'').strip())
+
+    # Retrieve the X coordinate of point G and store it in the session state
+    get_point_G_x_coordinate(state)
+
+    # Check if the public key was received correctly
+    if not public_key:
+        print("Failed to process the public key.\n")
+    elif state.protocol == protocol_v2:
+        process_public_key_bytes(public_key, state)
+    else:
+        process_public_key(public_key, state)
+    return "fingerprint" if capability_identity in state.capabilities else "proof"
+
+# K is only needed when the prover does not store this verifier key yet
+def on_fingerprint(state, answer):
+    state.verifier_key_needed = answer is None or b'RF1;' not in answer
+    print("The prover does not store the verifier key.\n" if state.verifier_key_needed
+          else "The prover already stores the verifier key.\n")
+    return "proof"
+
+# The proof is verified in the pool while the session goes on with the next steps
+def on_proof(state, answer):
+    if answer is None:
+        print("Timeout waiting for the proof packet.\n")
+    elif state.protocol == protocol_v1:
+        print(f"Stored notification: {answer.decode('utf-8', errors='ignore')}\n")
+        state.verification = asyncio.ensure_future(verify_received_packet(answer, state.verification_pool, state))
+    elif answer.type == frame_proof:
+        state.verification = asyncio.ensure_future(
+            verify_packet_bytes(answer.payload, state.verification_pool, state))
+    else:
+        print(f"Unexpected frame instead of the proof packet: {chr(answer.type)}\n")
+        packet_validator.reject(reject_framing)
+    if state.protocol == protocol_v2 and answer is not None:
+        return "proof_time"
+    return after_proof(state)
+
+def on_proof_time(state, answer):
+    if answer is not None:
+        print(f"Time to receive the packet from the prover: "
+              f"{int.from_bytes(answer.payload, 'big') / 1000:.3f}")
+    return after_proof(state)
+
+# K goes out after the proof (the proof does not depend on it), while the proof
+# is verified; provers that acknowledge K end the step as soon as it is stored
+def after_proof(state):
+    if not state.verifier_key_needed:
+        # In continuous mode the verdict is taken while the next proof arrives
+        return None if state.overlap_verification else "verdict"
+    return "verifier_key" if capability_key_ack in state.capabilities else "verifier_key_unacknowledged"
+
+def on_verifier_key(state, answer):
+    state.verifier_key_sent = answer is not None
+    print("The prover stored the verifier key.\n" if state.verifier_key_sent
+          else "The prover did not acknowledge the verifier key.\n")
+    return "verdict"
+
+def on_verifier_key_unacknowledged(state, answer):
+    state.verifier_key_sent = True
+    return "verdict"
+
+async def on_verdict(state, answer):
+    processed_data = await state.verification if state.verification is not None else None
+    state.verification = None
+    if processed_data:
+        print(f"Final processed packet: {processed_data}\n")
+        if processed_data["device_id"] != state.device_id:
+            print("The prover reports another ID.")
+            state.authenticated = False
+    else:
+        print("Error processing the packet.\n")
+    return None
 
-global_state = GlobalState()
-
-async def main(global_state):
-    device_address = await scan_for_device(target_name)
-    if device_address:
+# Steps of a session with the NIZKP prover. An enrollment goes through
+# register, identify, (fingerprint), proof, (proof_time), (verifier_key) and
+# verdict; a prover found in the registry starts at proof. The sketch reads
+# each command with readString(), which returns after one second without new
+# characters, so a command is only sent once the prover has answered the
+# previous one. The only pause left is after K for provers that do not
+# acknowledge it.
+session_steps = {step.name: step for step in (
+    Step("register", registration_command, lambda state: text_answer(rb'R[A1]'), registration_deadline,
+         on_registration),
+    Step("identify", identification_command, public_key_answer, public_key_deadline, on_public_key),
+    Step("fingerprint", None, lambda state: text_answer(rb'RF[01]'), registration_deadline, on_fingerprint),
+    Step("proof", proof_command, proof_answer, proof_deadline, on_proof),
+    Step("proof_time", None, lambda state: frame_answer(frame_time), registration_deadline, on_proof_time),
+    Step("verifier_key", verifier_key_command, lambda state: text_answer(rb'RS1'), registration_deadline,
+         on_verifier_key),
+    Step("verifier_key_unacknowledged", verifier_key_command, None, command_settle_time,
+         on_verifier_key_unacknowledged),
+    Step("verdict", None, None, 0, on_verdict),
+)}
+
+# Continuous authentication: the connection of a session stays open after its
+# first proof and a new proof is requested every `interval` seconds (0: as soon
+# as the previous one has been received), or at once when request() is called
+# (SIGUSR1 on the command line). count is the number of proofs per connection
+# (0: until the run is interrupted). One instance is shared by every session.
+class ContinuousMode:
+    def __init__(self, interval, count=0):
+        self.interval = interval
+        self.count = count
+        self._demand = asyncio.Event()
+
+    # Asks every continuous session for a proof now
+    def request(self):
+        demand, self._demand = self._demand, asyncio.Event()
+        demand.set()
+
+    # Waits until `when` (loop time), or until a proof is requested
+    async def wait_until(self, when):
+        delay = when - asyncio.get_running_loop().time()
+        if delay <= 0:
+            return
         try:
-            async with BleakClient(device_address) as client:
-                # Device Connection
-                print("# Device Connection")
-                print(f"Connecting to the device {device_address}...\n")
-
-                # Create an instance of MyDelegate, which will be used to handle notifications
-                delegate = MyDelegate()
-
-                # Add the callback function for notification
-                async def notification_handler(characteristic, data):
-                    delegate.handle_notification(characteristic, data)
-
-                # Register the characteristic for notifications
-                await client.start_notify(characteristic_uuid, notification_handler)
-
-                # Send the value 'R' to the characteristic
-                await client.write_gatt_char(characteristic_uuid, b'R')
-                print("Message sent: R\n")
-
-                # Wait for notifications
-                await asyncio.sleep(2.0)  # Wait for up to 2 seconds for notification
-                received_data1 = delegate.notification_data
-                if received_data1:
-                    print(f"Stored notification: {received_data1.decode('utf-8', errors='ignore')}\n")
-                                         
-                # Reset the notification buffer before sending the next command
-                delegate.notification_data = b""
-                
-                # Send the device ID along with the letter "I" to the BLE and Arduino device
-                await client.write_gatt_char(characteristic_uuid, b'I10')
-                print("Message sent: I + 10\n")
-
-                # Variable that holds the fully received public key after waiting for all parts to be received.
-                public_key = await wait_for_public_key(delegate)
-
-                # Store the cleaned public key data after filtering
-                public_key = filter_public_key_data(public_key)
-                
-                # Retrieve the X coordinate of point G and store it in the global state
-                global_state.x_coordinate = get_point_G_x_coordinate(generator)
-
-
-                # Check if the public key was initialized correctly
-                if public_key:
-                    # Process the public key and update the global state
-                    global_state.Qd_x_int, global_state.Qd_y_int = process_public_key(public_key)
-                else:
-                    print("Failed to process the public key.\n")
-
-                server_public_key_bytes = generate_server_public_key()
-
-                # Adding the character 'K' to the beginning of the public key for sending
-                data_to_send = b'K' + server_public_key_bytes
-                
-                # Redefinir o buffer de notificação antes de enviar a chave pública
-                delegate.notification_data = b""
-                
-                # Enviar a chave pública para o dispositivo BLE
-                await client.write_gatt_char(characteristic_uuid, data_to_send)
-                
-                print("K + Verifier's public key sent to the Prover.\n")
-                
-                # Aguardando notificação
-                await asyncio.sleep(5.0)  # Espera por até 5 segundos por notificações
-                received_data2 = delegate.notification_data
-                if received_data2:
-                    print(f"Notificação armazenada: {received_data2.decode('utf-8', errors='ignore')}\n")
-                
-                # Sends the value 'D' to the characteristic
-                await client.write_gatt_char(characteristic_uuid, b'D')
-                print("Message sent: D\n")
-                
-                # Reset the notification buffer before waiting for the last notification
-                delegate.notification_data = b""
-                      
-                # Waiting for notifications
-                await asyncio.sleep(11.0) 
-                received_data3 = delegate.notification_data
-                if received_data3:
-                    print(f"Stored notification: {received_data3.decode('utf-8', errors='ignore')}\n")
-                        
-                    # Process the received packet
-                    processed_data = parse_received_packet(received_data3)
-                    if processed_data:
-                        print(f"Final processed packet: {processed_data}\n")
-                    else:
-                        print("Error processing the packet.\n")
-                     
-                    
-                # Break notifications
-                await client.stop_notify(characteristic_uuid)
-                
-        except Exception as e:
-            print(f"Erro ao conectar ou comunicar com o dispositivo: {e}")
+            await asyncio.wait_for(self._demand.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+# Counts the verdict of a proof of continuous mode (processed_data is None when
+# the packet was rejected before the elliptic-curve math)
+def count_proof(state, processed_data):
+    state.proofs += 1
+    if processed_data is not None and processed_data["authenticated"]:
+        state.valid_proofs += 1
+    else:
+        print(f"Proof {state.proofs} of {state.address} rejected.\n")
+
+# Continuous mode of an authenticated session. Proof k is verified in the pool
+# while proof k + 1 is requested and received, so the connection is not idle
+# while a verdict is pending; proof k + 2 is only requested once proof k is
+# verified. Stops at the first rejected proof. The proof that authenticated the
+# session is the first of continuous.count.
+async def run_continuous(state, continuous, transport, delegate):
+    loop = asyncio.get_running_loop()
+    state.overlap_verification = True
+    state.verifier_key_needed = False
+    state.proofs = state.valid_proofs = 1
+    pending = collections.deque()
+    start = next_request = loop.time()
+    try:
+        while state.valid_proofs == state.proofs and (not continuous.count
+                                                      or state.proofs + len(pending) < continuous.count):
+            await continuous.wait_until(next_request)
+            next_request = loop.time() + continuous.interval
+            await run_steps(session_steps, "proof", transport, delegate, state)
+            if state.verification is None:
+                # No proof packet before the deadline
+                state.proofs += 1
+                break
+            pending.append(state.verification)
+            state.verification = None
+            if len(pending) > 1:
+                count_proof(state, await pending.popleft())
+        while pending:
+            count_proof(state, await pending.popleft())
+    finally:
+        state.continuous_time = loop.time() - start
+        state.overlap_verification = False
+    state.authenticated = state.valid_proofs == state.proofs
+    if not state.authenticated:
+        print(f"{state.address} is no longer authenticated.\n")
+    print(f"Continuous authentication of {state.address}: {continuous_report(state)}\n")
+
+# Proofs and sustained proofs per second of a session in continuous mode; the
+# rate only counts the proofs requested after the first one
+def continuous_report(state):
+    rate = (state.valid_proofs - 1) / state.continuous_time if state.continuous_time > 0 else 0.0
+    return (f"{state.valid_proofs} of {state.proofs} proofs valid "
+            f"({rate:.3f} proofs/s in the {state.continuous_time:.3f} s after the first)")
+
+# Runs the session with one prover and verifies its proof.
+# transport_factory(address) returns the transport to the prover (BleTransport by
+# default, SerialTransport for wired provers). Provers found in the registry skip
+# R/I/K and are enrolled again only if their proof is rejected. With a
+# ContinuousMode the connection stays open for more proofs once authenticated.
+async def run_session(state, verification_pool, transport_factory=BleTransport, registry=None,
+                      continuous=None):
+    device_address = state.address
+    record = registry.get(device_address) if registry is not None else None
+    offered_protocol, offered_capabilities = state.protocol, state.capabilities
+    state.verification_pool = verification_pool
+    try:
+        async with transport_factory(device_address) as transport:
+            # Device Connection
+            print("# Device Connection")
+            print(f"Connecting to the device {device_address}...\n")
+
+            # Create an instance of MyDelegate, which will be used to handle notifications
+            delegate = MyDelegate()
+
+            # Deliver everything the prover sends to the delegate
+            forwarder = asyncio.create_task(forward_notifications(transport, delegate.handle_notification))
+
+            timings = []
+            if record is not None:
+                # Known prover: straight to D, with the key and the wire format
+                # recorded when it was enrolled
+                state.resumed = True
+                state.device_id = record["device_id"]
+                state.protocol = record["protocol"]
+                state.capabilities = record["capabilities"]
+                state.Qd_x_int, state.Qd_y_int = DeviceRegistry.public_key(record)
+                state.x_public_key = record["public_key"][:64]
+                get_point_G_x_coordinate(state)
+                print(f"Resuming the session of device ID {state.device_id} (enrollment skipped)\n")
+
+                # The verifier key was rotated since the prover was enrolled
+                verifier_key = fingerprint(generate_server_public_key())
+                state.verifier_key_needed = record.get("verifier_key") != verifier_key
+
+                timings += await run_steps(session_steps, "proof", transport, delegate, state)
+                if state.authenticated and state.verifier_key_sent:
+                    registry.update(device_address, verifier_key=verifier_key)
+                    registry.save()
+                if not state.authenticated:
+                    # The prover changed (new key, new ID or new firmware): enroll it again
+                    print("Resumed proof rejected, enrolling the device again.\n")
+                    registry.forget(device_address)
+                    # Drop the table of the old key rather than keep it until it is evicted
+                    device_tables.invalidate(state.device_id)
+                    state.device_context = None
+                    state.protocol, state.capabilities = offered_protocol, offered_capabilities
+                    state.resumed = False
+                    state.verifier_key_needed = True
+
+            if not state.authenticated:
+                timings += await run_steps(session_steps, "register", transport, delegate, state)
+                if state.authenticated and registry is not None:
+                    registry.enroll(device_address, state.device_id, (state.Qd_x_int, state.Qd_y_int),
+                                    state.protocol, state.capabilities,
+                                    fingerprint(generate_server_public_key()))
+                    registry.save()
+
+            print("Session steps: " + ", ".join(f"{name} {seconds:.3f} s" for name, seconds in timings)
+                  + (f" ({delegate.skipped_frames} unexpected answers skipped)" if delegate.skipped_frames else ""))
+
+            if continuous is not None and state.authenticated:
+                await run_continuous(state, continuous, transport, delegate)
+
+            # Stop delivering notifications
+            forwarder.cancel()
+            
+    except Exception as e:
+        print(f"Error connecting or communicating with the device {device_address}: {e}")
+
+    return state.authenticated
+
+# Counters of the device tables (device_cache.py) of the pool workers
+def print_device_tables(verification_pool):
+    cache = verification_pool.cache_stats()
+    if cache["workers"]:
+        print(f"Device tables: {cache['entries']} devices, {cache['bytes'] / 1024:.1f} KiB in {cache['workers']} "
+              f"workers, {cache['hits']} hits, {cache['misses']} misses, {cache['evictions']} evictions")
+
+# Gateway mode: authenticates every matching prover, at most max_connections at a time
+# (addresses: serial ports of wired provers, which skip the BLE scan)
+async def run_gateway(verification_pool, max_connections, first_device_id=10,
+                      scanner=None, transport_factory=BleTransport, addresses=None,
+                      protocol=protocol_v2, capabilities=default_capabilities, registry=None,
+                      continuous=None):
+    device_addresses = addresses or await scan_for_devices(target_name, scanner)
+    if not device_addresses:
+        print("No device found.")
+        return
+
+    # IDs are sent as two decimal digits, so at most 100 provers per run
+    device_addresses = device_addresses[:100]
+    connection_slots = asyncio.Semaphore(max_connections)
+
+    async def limited_session(state):
+        async with connection_slots:
+            return await run_session(state, verification_pool, transport_factory, registry, continuous)
+
+    # Enrolled provers keep their IDs
+    if registry is not None:
+        device_ids = registry.assign_device_ids(device_addresses, first_device_id)
+    else:
+        device_ids = [(first_device_id + i) % 100 for i in range(len(device_addresses))]
+    sessions = [SessionContext(address, device_id, protocol, capabilities)
+                for address, device_id in zip(device_addresses, device_ids)]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await asyncio.gather(*(limited_session(state) for state in sessions))
+    elapsed = loop.time() - start
+
+    # Summary of the run
+    authenticated = sum(1 for result in results if result)
+    print("# Gateway summary")
+    for state in sessions:
+        print(f"{state.address} (ID {state.device_id}): {'authenticated' if state.authenticated else 'not authenticated'}"
+              + (f", {continuous_report(state)}" if continuous is not None and state.proofs else ""))
+    print(f"Authenticated devices: {authenticated} of {len(sessions)} in {elapsed:.3f} s "
+          f"({authenticated / elapsed if elapsed > 0 else 0.0:.3f} authentications/s)")
+    rejected = {reason: count for reason, count in packet_validator.rejections.items() if count}
+    if rejected:
+        print("Rejected packets: " + ", ".join(f"{reason} {count}" for reason, count in rejected.items()))
+    print_device_tables(verification_pool)
+
+# Connectionless mode: verifies the proofs the enrolled provers broadcast in
+# their advertisements (advertisement.py) for duration seconds, or until
+# interrupted when it is None. scanner_factory(callback) returns the scanner as
+# an async context manager (a passive BleakScanner by default).
+async def run_advertisement_gateway(verification_pool, registry, duration=None, scanner_factory=None):
+    if scanner_factory is None:
+        scanner_factory = lambda callback: ble_advertisement_scanner(callback, manufacturer_id)
+    verifier = AdvertisementVerifier(registry, verification_pool)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        async with scanner_factory(verifier.detection_callback):
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.Event().wait()
+        await verifier.drain()
+    finally:
+        elapsed = loop.time() - start
+        verifier.save_counters()
+        stats = verifier.stats()
+        print("# Advertisement summary")
+        print(f"Valid proofs: {stats['accepted']} from {stats['devices']} of {len(registry.devices)} enrolled devices "
+              f"in {elapsed:.3f} s ({stats['accepted'] / elapsed if elapsed > 0 else 0.0:.3f} proofs/s)")
+        print(f"Repeated advertisements dropped: {stats['duplicates']}")
+        rejected = {reason: count for reason, count in verifier.rejections.items() if count}
+        if rejected:
+            print("Rejected advertisements: " + ", ".join(f"{reason} {count}" for reason, count in rejected.items()))
+        print_device_tables(verification_pool)
+
+async def main(gateway=False, max_connections=default_max_connections, emulate=0, emulator_time_scale=0.0,
+               serial_ports=None, baudrate=default_baudrate, protocol=protocol_v2,
+               capabilities=default_capabilities, registry_file=registry_path, use_registry=True,
+               ec_backend=auto_backend, emulator_micro_ecc=False, proof_interval=None, proofs=0,
+               advertisements=None, emulator_advertising_interval=1.0):
+    # Odd multiples of G used by every verification
+    generator_wnaf_table()
+
+    # Key of the verifier, created on the first run and sent to provers that lack it
+    load_identity()
+
+    # Elliptic-curve backend: the fastest of the installed ones, or the one asked for
+    if ec_backend == auto_backend:
+        backend, timings = select_backend()
+        print(f"Elliptic-curve backend: {backend.name} (" + ", ".join(
+            f"{name} {seconds * 1000:.3f} ms" if seconds is not None else f"{name} failed"
+            for name, seconds in timings.items()) + " per verification)")
+    else:
+        backend = use_backend(ec_backend)
+        print(f"Elliptic-curve backend: {backend.name}")
+
+    # Worker processes that verify the proofs outside the event loop
+    verification_pool = VerificationPool(backend_name=backend.name)
+
+    # Enrolled provers, kept between runs (in memory only when registry_file is None)
+    registry = DeviceRegistry(registry_file) if use_registry else None
+
+    # Continuous authentication: more proofs per connection, and SIGUSR1 asks
+    # every session for one at once
+    continuous = None
+    if proof_interval is not None:
+        continuous = ContinuousMode(proof_interval, proofs)
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, continuous.request)
+
+    # Connectionless authentication: no connection at all, only advertisements
+    if advertisements is not None:
+        scanner_factory = None
+        if emulate:
+            from prover_emulator import AdvertisementFeed
+            feed = AdvertisementFeed(emulate, emulator_advertising_interval, name=target_name,
+                                     use_micro_ecc=emulator_micro_ecc)
+            registry = DeviceRegistry(None)
+            feed.enroll(registry)
+            scanner_factory = feed.scanner
+        elif registry is None:
+            registry = DeviceRegistry(None)
+        await run_advertisement_gateway(verification_pool, registry, advertisements or None, scanner_factory)
+        verification_pool.close()
+        return
+
+    # Emulated provers stand in for the BLE scanner and clients
+    scanner, transport_factory = None, BleTransport
+    if emulate:
+        from prover_emulator import EmulatedFleet
+        fleet = EmulatedFleet(emulate, target_name, emulator_time_scale, use_micro_ecc=emulator_micro_ecc)
+        scanner = fleet
+        transport_factory = lambda address: BleTransport(address, fleet.client)
+
+    if serial_ports:
+        # Wired provers: no scan, one session per serial port
+        transport_factory = lambda port: SerialTransport(port, baudrate)
+        await run_gateway(verification_pool, max_connections, transport_factory=transport_factory,
+                          addresses=serial_ports, protocol=protocol, capabilities=capabilities,
+                          registry=registry, continuous=continuous)
+    elif gateway:
+        await run_gateway(verification_pool, max_connections, scanner=scanner, transport_factory=transport_factory,
+                          protocol=protocol, capabilities=capabilities, registry=registry,
+                          continuous=continuous)
     else:
-        print("Dispositivo não encontrado.")
+        device_address = await scan_for_device(target_name, scanner)
+        if device_address:
+            await run_session(SessionContext(device_address, protocol=protocol, capabilities=capabilities),
+                              verification_pool, transport_factory, registry, continuous)
+        else:
+            print("Device not found.")
+
+    verification_pool.close()
         
 if __name__ == "__main__":
-    asyncio.run(main(global_state))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="NIZKP verifier for the BLE provers")
+    parser.add_argument("--gateway", action="store_true",
+                        help="authenticate every matching prover instead of only the first one")
+    parser.add_argument("--max-connections", type=int, default=default_max_connections,
+                        help="maximum number of simultaneous BLE sessions in gateway mode")
+    parser.add_argument("--emulate", type=int, default=0, metavar="N",
+                        help="run against N emulated provers instead of BLE devices")
+    parser.add_argument("--emulator-time-scale", type=float, default=0.0,
+                        help="1.0 reproduces the Arduino timings, 0.0 answers immediately")
+    parser.add_argument("--emulator-micro-ecc", action="store_true",
+                        help="emulated provers compute keys and proofs with micro-ecc built for 8-bit words")
+    parser.add_argument("--serial", nargs="+", metavar="PORT",
+                        help="authenticate provers wired to these serial ports instead of BLE devices")
+    parser.add_argument("--baudrate", type=int, default=default_baudrate,
+                        help="baud rate of the serial ports")
+    parser.add_argument("--protocol", type=int, choices=[protocol_v1, protocol_v2], default=protocol_v2,
+                        help="highest wire format to offer: 1 = ASCII hex, 2 = binary frames")
+    parser.add_argument("--uncompressed", action="store_true",
+                        help="do not offer SEC1 compressed public keys and commitments")
+    parser.add_argument("--registry", default=None, metavar="FILE",
+                        help=f"file of the enrolled provers (default: {os.path.basename(registry_path)}; "
+                             "emulated provers use a registry in memory)")
+    parser.add_argument("--no-registry", action="store_true",
+                        help="do not remember enrolled provers: every session goes through R, I and K")
+    parser.add_argument("--rotate-identity", action="store_true",
+                        help=f"replace the verifier key ({os.path.basename(identity_path)}) before the run; "
+                             "provers receive the new key with K")
+    parser.add_argument("--binary-challenge", action="store_true",
+                        help="offer the binary challenge: the prover hashes the coordinate bytes instead of their hex digits")
+    parser.add_argument("--replay-window", type=float, default=default_replay_window, metavar="SECONDS",
+                        help="remember proof commitments at least this long to reject replayed packets")
+    parser.add_argument("--replay-error-rate", type=float, default=default_replay_error_rate, metavar="RATE",
+                        help="probability that the replay filter rejects a fresh proof")
+    parser.add_argument("--ec-backend", choices=[auto_backend] + list(backend_classes), default=auto_backend,
+                        help="elliptic-curve arithmetic used to verify the proofs; auto measures the "
+                             "installed ones and uses the fastest")
+    parser.add_argument("--continuous", type=float, default=None, metavar="SECONDS",
+                        help="keep each connection open and request a new proof every SECONDS "
+                             "(0: as soon as the previous one arrives); SIGUSR1 requests one at once")
+    parser.add_argument("--proofs", type=int, default=0, metavar="N",
+                        help="proofs per connection in continuous mode, the one of the enrollment "
+                             "included (0: until interrupted)")
+    parser.add_argument("--advertisements", type=float, default=None, metavar="SECONDS",
+                        help="verify the proofs enrolled provers broadcast in their advertisements for "
+                             "SECONDS (0: until interrupted), without connecting to them")
+    parser.add_argument("--emulator-advertising-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="seconds between two proofs advertised by each emulated prover")
+    args = parser.parse_args()
+    # Advertised proofs are checked against the keys of the enrolled provers
+    if args.advertisements is not None and args.no_registry and not args.emulate:
+        parser.error("--advertisements needs the registry of the enrolled provers: drop --no-registry")
+    packet_validator.replay_filter = ReplayFilter(error_rate=args.replay_error_rate, window=args.replay_window)
+    capabilities = default_capabilities
+    if args.uncompressed:
+        capabilities = capabilities.replace(capability_compressed, "")
+    if args.binary_challenge:
+        capabilities += capability_binary_challenge
+    # Emulated provers get new keys on every run, so they are not remembered on disk
+    registry_file = args.registry or (None if args.emulate else registry_path)
+    if args.no_registry:
+        registry_file = None
+    if args.rotate_identity:
+        rotate_identity()
+        print(f"New verifier key: {fingerprint(generate_server_public_key())}")
+    asyncio.run(main(args.gateway, args.max_connections, args.emulate, args.emulator_time_scale,
+                     args.serial, args.baudrate, args.protocol, capabilities,
+                     registry_file, not args.no_registry, args.ec_backend, args.emulator_micro_ecc,
+                     args.continuous, args.proofs, args.advertisements, args.emulator_advertising_interval))
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import secrets
+import ec_jacobian
+from fixed_base import fixed_base_multiply
+
+# File with the private key of the verifier (64 hex digits). The key is created
+# on first use and kept until it is rotated.
+identity_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verifier_identity.key")
+
+# Bytes of SHA-256(public key) the prover compares to decide whether it already
+# stores the key of this verifier
+fingerprint_size = 8
+
+# Identity loaded in memory: (private key, 64-byte public key)
+_identity = None
+
+
+def public_key_of(private_key):
+    x, y = ec_jacobian.to_affine(fixed_base_multiply(private_key))
+    return x.to_bytes(32, "big") + y.to_bytes(32, "big")
+
+
+# Writes a new private key, readable only by the owner, and returns it
+def create_identity(path=identity_path):
+    private_key = secrets.randbelow(ec_jacobian.n - 1) + 1
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as identity_file:
+        identity_file.write(f"{private_key:064X}\n")
+    os.replace(tmp_path, path)
+    return private_key
+
+
+# Reads the private key; None if the file is missing or malformed
+def read_identity(path=identity_path):
+    try:
+        with open(path, "r") as identity_file:
+            private_key = int(identity_file.read().strip(), 16)
+    except (OSError, ValueError):
+        return None
+    if not 0 < private_key < ec_jacobian.n:
+        return None
+    return private_key
+
+
+# Returns (private key, public key) of the verifier, creating the key on the first run
+def load_identity(path=identity_path):
+    global _identity
+    if _identity is None:
+        private_key = read_identity(path)
+        if private_key is None:
+            private_key = create_identity(path)
+        _identity = (private_key, public_key_of(private_key))
+    return _identity
+
+
+# Replaces the key of the verifier. Provers notice the change through the
+# fingerprint and receive the new key with K on their next session.
+def rotate_identity(path=identity_path):
+    global _identity
+    private_key = create_identity(path)
+    _identity = (private_key, public_key_of(private_key))
+    return _identity
+
+
+# Fingerprint of a 64-byte public key, as uppercase hex
+def fingerprint(public_key):
+    return hashlib.sha256(public_key).digest()[:fingerprint_size].hex().upper()
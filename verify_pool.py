@@ -0,0 +1,136 @@
+# Pool of worker processes for proof verification. The elliptic-curve math runs
+# outside the asyncio/bleak event loop, which keeps servicing notifications and
+# other connections while proofs are being checked.
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import ec_jacobian
+from ec_backends import NativeBackend, default_backend, use_backend
+from fixed_base import generator_wnaf_table
+from device_cache import DeviceTableCache
+from verification import proof_holds
+
+# Maximum number of proofs submitted and not finished yet; submit() waits when
+# the pool is this far behind
+default_max_pending = 64
+
+# Keys prepared by a backend other than the native one, kept per worker
+prepared_key_count = 1024
+
+# Device tables of this worker process, created by _warm_worker
+_device_tables = None
+_prepared_keys = None
+
+
+# Runs once in every worker: selects the elliptic-curve backend (ec_backends.py)
+# and builds the wNAF table of G before the first proof arrives
+def _warm_worker(backend_name=None):
+    global _device_tables, _prepared_keys
+    if backend_name is not None:
+        use_backend(backend_name)
+    generator_wnaf_table()
+    _device_tables = DeviceTableCache()
+    _prepared_keys = OrderedDict()
+
+
+# Key of a device in the form of the backend; the native one uses the tables
+# of the DeviceTableCache
+def _prepared_key(backend, public_key, device_id):
+    if type(backend) is NativeBackend:
+        return _device_tables.get(public_key[0], public_key[1], device_id)
+    key = _prepared_keys.get(public_key)
+    if key is None:
+        key = backend.prepare_public_key(*public_key)
+        _prepared_keys[public_key] = key
+        if len(_prepared_keys) > prepared_key_count:
+            _prepared_keys.popitem(last=False)
+    else:
+        _prepared_keys.move_to_end(public_key)
+    return key
+
+
+# Runs in a worker: a proof is valid when πG - σQd is the commitment
+def verify_proof_in_worker(proof, device_id=None):
+    if _device_tables is None:
+        _warm_worker()
+
+    if not 0 < proof.response < ec_jacobian.n or not ec_jacobian.is_on_curve(*proof.commitment):
+        return False
+    backend = default_backend()
+    Qd_key = _prepared_key(backend, tuple(proof.public_key), device_id)
+    if Qd_key is None:
+        return False
+
+    return proof_holds(proof.response, proof.challenge, proof.commitment, Qd_key, backend)
+
+
+# Runs in a worker for the pool: the result together with the counters of the
+# device tables of this worker, which the pool keeps for reporting
+def _verify_and_report(proof, device_id=None):
+    ok = verify_proof_in_worker(proof, device_id)
+    return ok, os.getpid(), _device_tables.stats()
+
+
+class VerificationPool:
+    # backend_name: elliptic-curve backend of the workers (the native one if None)
+    def __init__(self, workers=None, max_pending=default_max_pending, backend_name=None):
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker,
+                                             initargs=(backend_name,))
+        self._slots = asyncio.Semaphore(max_pending)
+        # Last result of every session, so results come back in submission order
+        self._last_result = {}
+        # Last device table counters of every worker process, by PID
+        self._worker_stats = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Sends a proof to the pool. Waits while max_pending proofs are in flight
+    # (backpressure) and returns a future with the result (True / False).
+    # Within one session the futures complete in the order they were submitted.
+    async def submit(self, session_id, proof, device_id=None):
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            job = loop.run_in_executor(self._executor, _verify_and_report, proof, device_id)
+        except Exception:
+            self._slots.release()
+            raise
+        job.add_done_callback(lambda _: self._slots.release())
+
+        previous = self._last_result.get(session_id)
+        result = asyncio.ensure_future(self._in_order(previous, job))
+        self._last_result[session_id] = result
+        result.add_done_callback(lambda done: self._forget(session_id, done))
+        return result
+
+    # Submits a proof and waits for its result
+    async def verify(self, session_id, proof, device_id=None):
+        return await (await self.submit(session_id, proof, device_id))
+
+    # Waits for the previous result of the session before delivering this one
+    async def _in_order(self, previous, job):
+        if previous is not None:
+            await asyncio.wait([previous])
+        ok, pid, stats = await job
+        self._worker_stats[pid] = stats
+        return ok
+
+    def _forget(self, session_id, done):
+        if self._last_result.get(session_id) is done:
+            del self._last_result[session_id]
+
+    # Counters of the device tables of the workers, summed over the workers
+    def cache_stats(self):
+        total = {"workers": len(self._worker_stats)}
+        for stats in self._worker_stats.values():
+            for name, value in stats.items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)